@@ -1,2 +1,2 @@
 #!/bin/bash
-gunicorn wsgi:server --bind 0.0.0.0:80
\ No newline at end of file
+gunicorn wsgi:server -c gunicorn.conf.py --bind 0.0.0.0:80
\ No newline at end of file
@@ -0,0 +1,401 @@
+from typing import Callable, Dict, List, Tuple
+
+from collections.abc import Mapping, Sequence
+from itertools import chain
+
+import nltk
+import numpy as np
+import pandas as pd
+from nltk.corpus import stopwords
+
+from analysis import sketches, sparse, streaming
+
+TWEETS_FILE = "analyzed_tweets.json"
+MEDIA_FILE = "analyzed_media.json"
+SCORE_KEYS = ["key_phrases", "emotional_traits", "behavioral_traits"]
+# Name prefix of the vocabularies pack_all shares between the datasets
+VOCAB_PREFIX = "vocab"
+
+try:
+    nltk.data.find('corpora/stopwords')
+except LookupError:
+    nltk.download('stopwords')
+
+stop_words = set(stopwords.words('english'))
+
+
+class FrameImporter:
+    """
+    Collects analyzed rows chunk by chunk into the columns of a DataFrame.
+    """
+
+    def __init__(self):
+        self.data = {}
+
+    def add(self, chunk: List[dict]):
+        data = self.data
+        for d in chunk:
+            for (k, v) in d.items():
+                if k in ["bias", "stances", "created_at"]:
+                    continue
+                if k not in data.keys():
+                    data[k] = [v]
+                else:
+                    data[k].append(v)
+
+    def frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.data)
+
+
+def import_data(f_name: str, keep: Callable[[List[dict]], np.ndarray] = None):
+    """
+    Reads an analyzed file chunk by chunk. If given, keep flags which rows of each chunk are imported.
+    """
+    importer = FrameImporter()
+    for chunk in streaming.filtered_chunks(f_name, keep):
+        importer.add(chunk)
+    return importer.frame()
+
+
+def remove_outlier(df_in, col_name):
+    """Uses z-score"""
+    return df_in[((df_in[col_name] - df_in[col_name].mean()) / df_in[col_name].std()).abs() < 3]
+
+
+def df_by_date_loops(df_to_sort) -> Dict[str, Dict[str, any]]:
+    """
+    Reference implementation of df_by_date which walks every score dict in Python.
+    """
+    dict_by_date = {}
+    for d, g in df_to_sort.sort_values(['date']).groupby('date'):
+        if d == '2021-05-07':
+            continue
+        all_kps = {}
+        e_traits = {}
+        b_traits = {}
+        for kps in g['key_phrases']:
+            for k, v in kps.items():
+                if '@' in k or v in stop_words or len(k) < 4:
+                    continue
+                if k not in all_kps.keys():
+                    all_kps[k] = [v]
+                else:
+                    all_kps[k].append(v)
+        for k, v in all_kps.items():
+            all_kps[k] = np.mean(v)
+        for kps in g['emotional_traits']:
+            for k, v in kps.items():
+                if k not in e_traits.keys():
+                    e_traits[k] = [v]
+                else:
+                    e_traits[k].append(v)
+        for k, v in e_traits.items():
+            e_traits[k] = np.mean(v)
+        for kps in g['behavioral_traits']:
+            for k, v in kps.items():
+                if k not in b_traits.keys():
+                    b_traits[k] = [v]
+                else:
+                    b_traits[k].append(v)
+        for k, v in b_traits.items():
+            b_traits[k] = np.mean(v)
+
+        kp_entry = dict(sorted(all_kps.items(), key=lambda item: item[1], reverse=True))
+        e_entry = dict(sorted(e_traits.items(), key=lambda item: item[1], reverse=True))
+        b_entry = dict(sorted(b_traits.items(), key=lambda item: item[1], reverse=True))
+
+        dict_by_date[d] = {
+            "sentiment": g['sentiment'],
+            "key_phrases": kp_entry,
+            "emotional_traits": e_entry,
+            "behavioral_traits": b_entry
+        }
+    return dict_by_date
+
+
+def explode_scores(df, key: str) -> pd.DataFrame:
+    """
+    Explodes a column of item -> score dicts into a long-format (date, item, score) table, keeping row order. Dates
+    and items are returned as categorical columns and "row" holds the position of the source row.
+    """
+    col = df[key].tolist()
+    lengths = np.fromiter(map(len, col), dtype=np.int64, count=len(col))
+    date_codes, dates = pd.factorize(df['date'].to_numpy())
+    item_codes, items = pd.factorize(np.array(list(chain.from_iterable(col)), dtype=object))
+    return pd.DataFrame({
+        "date": pd.Categorical.from_codes(np.repeat(date_codes, lengths), pd.Index(dates, dtype=object)),
+        "item": pd.Categorical.from_codes(item_codes, pd.Index(items, dtype=object)),
+        "score": np.fromiter(chain.from_iterable(map(dict.values, col)), dtype=np.float64, count=lengths.sum()),
+        "row": np.repeat(np.arange(len(col)), lengths)
+    })
+
+
+def _codes(col: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        return col.cat.codes.to_numpy().astype(np.int64), col.cat.categories.to_numpy()
+    return pd.factorize(col.to_numpy())
+
+
+def top_k_mask(date_codes: np.ndarray, means: np.ndarray, k: int) -> np.ndarray:
+    """
+    Flags the k highest means of each date with a partial sort. The groups must be in order of first appearance, so
+    that ties at the cut keep the items a full sort would.
+    """
+    keep = np.zeros(len(means), dtype=bool)
+    for d in np.unique(date_codes):
+        idx = np.flatnonzero(date_codes == d)
+        keep[idx[sparse.top_k_positions(means[idx], k)]] = True
+    return keep
+
+
+def mean_by_date(long_df: pd.DataFrame, top_k: int = None) -> Dict[str, Dict[str, float]]:
+    """
+    Averages the scores of each (date, item) pair and orders each date's items by descending score. Ties keep the
+    order in which items first appear, as the dict based implementation does. If top_k is given only that many items
+    are kept per date, which spares fully sorting them.
+    """
+    if len(long_df) == 0:
+        return {}
+    date_codes, dates = _codes(long_df['date'])
+    item_codes, items = _codes(long_df['item'])
+    group, _ = pd.factorize(date_codes * len(items) + item_codes)
+    order = np.argsort(group, kind='stable')
+    sorted_group = group[order]
+    starts = np.flatnonzero(np.concatenate([[True], sorted_group[1:] != sorted_group[:-1]]))
+    # np.mean sums each list from a zero identity, so every group is summed in its original order behind a leading
+    # zero to give bit-for-bit the same means as the dict based implementation
+    padded = np.zeros(len(order) + len(starts))
+    padded[np.arange(len(order)) + sorted_group + 1] = long_df['score'].to_numpy()[order]
+    means = np.add.reduceat(padded, starts + np.arange(len(starts))) / np.diff(np.append(starts, len(order)))
+    first = order[starts]
+    if top_k is not None:
+        kept = top_k_mask(date_codes[first], means, top_k)
+        first, means = first[kept], means[kept]
+
+    # Groups are numbered by first appearance, so a stable sort on (date, -mean) keeps ties in that order
+    ranked = np.lexsort((-means, date_codes[first]))
+    first, means = first[ranked], means[ranked]
+    group_dates = date_codes[first]
+    bounds = np.flatnonzero(group_dates[1:] != group_dates[:-1]) + 1
+    return {dates[d]: dict(zip(i, m)) for d, i, m in
+            zip(group_dates[np.concatenate([[0], bounds])], np.split(items[item_codes[first]], bounds),
+                np.split(means, bounds))}
+
+
+def df_by_date(df_to_sort, top_k: int = None) -> Dict[str, Dict[str, any]]:
+    """
+    Groups the analyzed rows by date, averaging every key phrase and trait score per date and sorting them by
+    descending score. Gives the same output as df_by_date_loops using a single grouped mean per score column. If
+    top_k is given only the top_k items of each date and key are kept.
+    """
+    if isinstance(df_to_sort, sparse.SparseFrame):
+        return sparse.df_by_date(df_to_sort, top_k)
+    # Only the date column is sorted, with the same sort as the loop based version, so that ties keep the same order
+    order = df_to_sort['date'].reset_index(drop=True).sort_values().index.to_numpy()
+    order = order[df_to_sort['date'].to_numpy()[order] != '2021-05-07']
+
+    def in_date_order(long_df: pd.DataFrame) -> pd.DataFrame:
+        # The dicts are exploded in file order, which is much more cache friendly than walking them by date. Each
+        # row's items are contiguous, so the rows' blocks are simply laid out again in date order.
+        lengths = np.bincount(long_df['row'].to_numpy(), minlength=len(df_to_sort))
+        offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        block_lengths = lengths[order]
+        block_starts = np.cumsum(block_lengths) - block_lengths
+        positions = np.arange(block_lengths.sum()) + np.repeat(offsets[order] - block_starts, block_lengths)
+        return long_df.iloc[positions]
+
+    kps = explode_scores(df_to_sort, 'key_phrases')
+    # Filter on the distinct phrases only. The loop based version also compares the score against the stop words,
+    # which never matches.
+    codes, phrases = _codes(kps['item'])
+    keep = np.array([len(k) >= 4 and '@' not in k for k in phrases], dtype=bool)
+    entries = {
+        "key_phrases": mean_by_date(in_date_order(kps[keep[codes]]), top_k),
+        "emotional_traits": mean_by_date(in_date_order(explode_scores(df_to_sort, 'emotional_traits')), top_k),
+        "behavioral_traits": mean_by_date(in_date_order(explode_scores(df_to_sort, 'behavioral_traits')), top_k)
+    }
+
+    sentiment = df_to_sort['sentiment'].iloc[order]
+    dict_by_date = {}
+    for d, g in sentiment.groupby(df_to_sort['date'].to_numpy()[order]):
+        dict_by_date[d] = {"sentiment": sketches.SentimentSummary.of(g.to_numpy())}
+        for key, entry in entries.items():
+            dict_by_date[d][key] = entry.get(d, {})
+    return dict_by_date
+
+
+def encode_strings(xs: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Packs a list of strings into a single UTF-8 byte array and an array of boundary offsets.
+    """
+    encoded = [x.encode("utf-8") for x in xs]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(x) for x in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def decode_strings(blob: np.ndarray, offsets: np.ndarray) -> List[str]:
+    raw = blob.tobytes()
+    return [raw[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+
+
+def pack_vocab(vocab: Dict[str, int], name: str) -> Dict[str, np.ndarray]:
+    blob, offsets = encode_strings(list(vocab.keys()))
+    return {name + ".vocab.blob": blob, name + ".vocab.offsets": offsets}
+
+
+def pack_info(info: Dict[str, Dict[str, any]], prefix: str,
+              vocabs: Dict[str, Dict[str, int]] = None) -> Dict[str, np.ndarray]:
+    """
+    Flattens the output of df_by_date into named NumPy arrays so that it can be placed in shared memory or on disk.
+    Items are stored as ids into a per-key vocabulary and keep their per-date order. If vocabs are given, ids are taken
+    from and added to them and it is up to the caller to store them, otherwise the vocabularies are stored as well.
+    """
+    arrays = {}
+    dates = list(info.keys())
+    arrays["{}/dates.blob".format(prefix)], arrays["{}/dates.offsets".format(prefix)] = encode_strings(dates)
+
+    # Each date's summary is its [count, mean, M2] moments plus a run of sketch items with their levels
+    summaries = [x["sentiment"].to_arrays() for x in info.values()]
+    arrays["{}/sentiment.moments".format(prefix)] = np.stack([m for m, _, _ in summaries]) if summaries \
+        else np.zeros((0, 3))
+    arrays["{}/sentiment.items".format(prefix)] = np.concatenate([x for _, x, _ in summaries]) if summaries \
+        else np.zeros(0)
+    arrays["{}/sentiment.levels".format(prefix)] = np.concatenate([h for _, _, h in summaries]) if summaries \
+        else np.zeros(0, dtype=np.int8)
+    arrays["{}/sentiment.offsets".format(prefix)] = \
+        np.concatenate([[0], np.cumsum([len(x) for _, x, _ in summaries])]).astype(np.int64)
+
+    for key in SCORE_KEYS:
+        vocab = vocabs[key] if vocabs is not None else {}
+        ids, scores, offsets = [], [], [0]
+        for x in info.values():
+            for item, score in x[key].items():
+                ids.append(vocab.setdefault(item, len(vocab)))
+                scores.append(score)
+            offsets.append(len(ids))
+        name = "{}/{}".format(prefix, key)
+        if vocabs is None:
+            arrays.update(pack_vocab(vocab, name))
+        arrays[name + ".ids"] = np.asarray(ids, dtype=np.int32)
+        arrays[name + ".scores"] = np.asarray(scores, dtype=np.float64)
+        arrays[name + ".offsets"] = np.asarray(offsets, dtype=np.int64)
+    return arrays
+
+
+class StringTable(Sequence):
+    """
+    The strings packed by encode_strings, each decoded only when it is looked up.
+    """
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8")
+
+
+class PackedInfo(Mapping):
+    """
+    Read-only view of the arrays written by pack_info that looks like the output of df_by_date. Nothing is copied out
+    of the arrays up front: the entry of a date and key is decoded from its slice of the arrays whenever it is looked
+    up, so callers that look entries up repeatedly should cache them.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray], prefix: str, vocab_prefix: str = None):
+        self.vocab_prefix = vocab_prefix if vocab_prefix is not None else prefix
+        self.arrays = {name: a for name, a in arrays.items()
+                       if name.startswith(prefix + "/") or name.startswith(self.vocab_prefix + "/")}
+        self.prefix = prefix
+        dates = decode_strings(arrays["{}/dates.blob".format(prefix)], arrays["{}/dates.offsets".format(prefix)])
+        self.index = {d: i for i, d in enumerate(dates)}
+        self.vocabs = {key: StringTable(arrays["{}/{}.vocab.blob".format(self.vocab_prefix, key)],
+                                        arrays["{}/{}.vocab.offsets".format(self.vocab_prefix, key)])
+                       for key in SCORE_KEYS}
+
+    def shares_vocab(self, other: "PackedInfo") -> bool:
+        """
+        Whether the ids of both refer to the same vocabularies, so that their rows can be compared id by id.
+        """
+        return self.vocab_prefix == other.vocab_prefix
+
+    def array(self, key: str, name: str) -> np.ndarray:
+        return self.arrays["{}/{}.{}".format(self.prefix, key, name)]
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __getitem__(self, d: str) -> "PackedDate":
+        return PackedDate(self, self.index[d])
+
+    def sentiment(self, i: int) -> sketches.SentimentSummary:
+        offsets = self.array("sentiment", "offsets")
+        lo, hi = offsets[i], offsets[i + 1]
+        return sketches.SentimentSummary.from_arrays(self.array("sentiment", "moments")[i],
+                                                     self.array("sentiment", "items")[lo:hi],
+                                                     self.array("sentiment", "levels")[lo:hi])
+
+    def row(self, i: int, key: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Vocabulary ids and scores of the items of the i-th date under key, in their stored order. Both are views of
+        the packed arrays.
+        """
+        offsets = self.array(key, "offsets")
+        lo, hi = offsets[i], offsets[i + 1]
+        return self.array(key, "ids")[lo:hi], self.array(key, "scores")[lo:hi]
+
+    def scores(self, i: int, key: str) -> Dict[str, float]:
+        ids, scores = self.row(i, key)
+        vocab = self.vocabs[key]
+        return {vocab[j]: s for j, s in zip(ids.tolist(), scores.tolist())}
+
+
+class PackedDate(Mapping):
+    """
+    The entry of one date of a PackedInfo, with the sentiment summary and the score dict of every key.
+    """
+
+    def __init__(self, info: PackedInfo, i: int):
+        self.info = info
+        self.i = i
+
+    def __len__(self) -> int:
+        return len(SCORE_KEYS) + 1
+
+    def __iter__(self):
+        return iter(["sentiment"] + SCORE_KEYS)
+
+    def __getitem__(self, key: str):
+        if key == "sentiment":
+            return self.info.sentiment(self.i)
+        if key not in SCORE_KEYS:
+            raise KeyError(key)
+        return self.info.scores(self.i, key)
+
+
+def pack_all(twitter_info: Dict[str, Dict[str, any]], media_info: Dict[str, Dict[str, any]]) -> Dict[str, np.ndarray]:
+    """
+    Packs both datasets over vocabularies they share, stored under VOCAB_PREFIX, so that matching their items needs
+    no decoding. See unpack_all.
+    """
+    vocabs = {key: {} for key in SCORE_KEYS}
+    arrays = pack_info(twitter_info, "twitter", vocabs)
+    arrays.update(pack_info(media_info, "media", vocabs))
+    for key, vocab in vocabs.items():
+        arrays.update(pack_vocab(vocab, "{}/{}".format(VOCAB_PREFIX, key)))
+    return arrays
+
+
+def unpack_all(arrays: Dict[str, np.ndarray]) -> Tuple[PackedInfo, PackedInfo]:
+    return PackedInfo(arrays, "twitter", VOCAB_PREFIX), PackedInfo(arrays, "media", VOCAB_PREFIX)
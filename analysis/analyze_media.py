@@ -1,30 +1,26 @@
 from typing import Set
 
 import pandas as pd
-import json
 
 from analysis import expert_ai_api
+from scraping import jsonl
 
 
 def import_data():
     media = {}
-    with open("./media.json", "r") as f:
-        for line in f.readlines():
-            d = json.loads(line)
-            for (k, v) in d.items():
-                if k not in media.keys():
-                    media[k] = [v]
-                else:
-                    media[k].append(v)
+    for d in jsonl.read_file("./media.json"):
+        for (k, v) in d.items():
+            if k not in media.keys():
+                media[k] = [v]
+            else:
+                media[k].append(v)
     return pd.DataFrame(media)
 
 
 def get_existing_ids() -> Set[str]:
     out = set()
-    with open("./analyzed_media.json", "r+") as f:
-        for line in f.readlines():
-            d = json.loads(line)
-            out.add(d["url"])
+    for d in jsonl.read_file("./analyzed_media.json", fields=["url"]):
+        out.add(d["url"])
     return out
 
 
@@ -56,10 +52,5 @@ if __name__ == "__main__":
                     'behavioral_traits': b_traits
                 })
 
-    with open('./analyzed_media.json', 'a+') as f:
-        for date, results in results_by_date.items():
-            for r in results:
-                d = {'date': str(date)}
-                for k, v in r.items():
-                    d[k] = v
-                f.write(json.dumps(d) + "\n")
+    with open('./analyzed_media.json', 'ab') as f:
+        jsonl.write(f, ({'date': str(date), **r} for date, results in results_by_date.items() for r in results))
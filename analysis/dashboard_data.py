@@ -0,0 +1,67 @@
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+import config as conf
+from analysis import aggregate, range_index, sparse, streaming, timeline
+
+
+# The Twitter and media aggregates by date, the range index of the tweets and the sentiment timelines by name
+DashboardData = Tuple[Dict[str, Dict[str, any]], Dict[str, Dict[str, any]], range_index.RangeIndex,
+                      Dict[str, timeline.Timeline]]
+
+
+def load() -> DashboardData:
+    """
+    Builds everything the dashboard shows from the analyzed files. Every chunk of a file is handed to all the builders
+    that need it, so each file is parsed once. Only the dates and sentiments of the tweets are read once more
+    beforehand, to find the outliers.
+    """
+    top_k = conf.AGGREGATE_TOP_K if conf.AGGREGATE_TOP_K > 0 else None
+    step = pd.Timedelta(conf.TIMELINE_FREQ).value
+    if conf.SPARSE_SCORES:
+        # Both datasets share vocabularies so that their score matrices have aligned columns
+        media_importer = sparse.SparseImporter(aggregate.SCORE_KEYS)
+        twitter_importer = sparse.SparseImporter(aggregate.SCORE_KEYS, media_importer.vocabs)
+    else:
+        media_importer, twitter_importer = aggregate.FrameImporter(), aggregate.FrameImporter()
+
+    media_timeline = timeline.TimelineBuilder(step)
+    for chunk in streaming.iter_chunks(aggregate.MEDIA_FILE):
+        media_importer.add(chunk)
+        media_timeline.add(chunk)
+    media_info = aggregate.df_by_date(media_importer.frame(), top_k)
+    del media_importer
+
+    # Outlying tweets are dropped while streaming the file so that the unfiltered frame is never held in memory
+    keep = streaming.z_score_filter(aggregate.TWEETS_FILE, 'sentiment', per_date=conf.OUTLIER_PER_DATE)
+    twitter_timeline = timeline.TimelineBuilder(step)
+    index_builder = range_index.IndexBuilder()
+    for chunk in streaming.filtered_chunks(aggregate.TWEETS_FILE, keep):
+        twitter_importer.add(chunk)
+        twitter_timeline.add(chunk)
+        index_builder.add(chunk)
+    twitter_info = aggregate.df_by_date(twitter_importer.frame(), top_k)
+    del twitter_importer
+
+    return twitter_info, media_info, index_builder.index(), \
+        {"twitter": twitter_timeline.timeline(), "media": media_timeline.timeline()}
+
+
+def to_arrays(data: DashboardData) -> Dict[str, np.ndarray]:
+    twitter_info, media_info, range_idx, timelines = data
+    arrays = aggregate.pack_all(twitter_info, media_info)
+    arrays.update(range_idx.to_arrays(range_index.PREFIX))
+    arrays.update(timeline.timeline_arrays(timelines))
+    return arrays
+
+
+def from_arrays(arrays: Dict[str, np.ndarray]) -> DashboardData:
+    """
+    Inverse of to_arrays. The aggregates are read from the arrays as they are looked up rather than copied out.
+    """
+    twitter_info, media_info = aggregate.unpack_all(arrays)
+    return twitter_info, media_info, range_index.RangeIndex.from_arrays(arrays, range_index.PREFIX), \
+        {name: timeline.Timeline.from_arrays(arrays, "{}/{}".format(timeline.PREFIX, name))
+         for name in ["twitter", "media"]}
@@ -0,0 +1,159 @@
+from typing import Iterator, List
+
+from array import array
+
+import hashlib
+import os
+import pickle as pk
+
+import numpy as np
+
+from analysis import aggregate, range_index, sparse, streaming, timeline
+from analysis.dashboard_data import DashboardData
+from scraping import jsonl
+
+FINGERPRINT_BYTES = 4096
+# The tail of a file is read and parsed about this many bytes of lines at a time
+READ_BYTES = jsonl.BATCH_BYTES
+# Bump whenever the pickled state changes shape, older states are rebuilt from the files on load
+STATE_VERSION = 3
+
+
+class IncrementalData:
+    """
+    Maintains everything dashboard_data.load builds from the analyzed files, reading only the lines appended since the
+    last update. A byte offset into each file marks how far it has been read. Every tweet read is kept unfiltered, so
+    that each time the data is built the outliers are judged against the moments of the whole file as load judges
+    them, rather than against the moments of whatever had been read when a tweet came in.
+    """
+
+    def __init__(self, sparse_scores: bool, step: int, per_date: bool):
+        self.sparse_scores = sparse_scores
+        self.step = step
+        self.per_date = per_date
+        self.reset()
+
+    def reset(self):
+        self.version = STATE_VERSION
+        self.offsets = {f_name: 0 for f_name in [aggregate.TWEETS_FILE, aggregate.MEDIA_FILE]}
+        self.fingerprints = {f_name: None for f_name in self.offsets.keys()}
+        if self.sparse_scores:
+            # Both datasets share vocabularies so that their score matrices have aligned columns
+            self.media_importer = sparse.SparseImporter(aggregate.SCORE_KEYS)
+            self.twitter_importer = sparse.SparseImporter(aggregate.SCORE_KEYS, self.media_importer.vocabs)
+        else:
+            self.media_importer, self.twitter_importer = aggregate.FrameImporter(), aggregate.FrameImporter()
+        self.media_timeline = timeline.TimelineBuilder(self.step)
+        self.index_builder = range_index.IndexBuilder()
+        # What the outlier filter and the timeline need of every tweet
+        self.date_vocab = sparse.Vocabulary()
+        self.row_dates, self.row_times, self.row_sentiment = array('i'), array('q'), array('d')
+
+    def params(self) -> tuple:
+        return self.sparse_scores, self.step, self.per_date
+
+    def _fingerprint(self, f_name: str) -> str:
+        with open(f_name, "rb") as f:
+            head = f.read(min(self.offsets[f_name], FINGERPRINT_BYTES))
+        return hashlib.sha1(head).hexdigest()
+
+    def rewritten(self) -> bool:
+        """
+        Whether any file was truncated or rewritten since it was read, so that the offsets no longer apply.
+        """
+        for f_name, offset in self.offsets.items():
+            size = os.path.getsize(f_name) if os.path.isfile(f_name) else 0
+            if size < offset or (offset > 0 and self._fingerprint(f_name) != self.fingerprints[f_name]):
+                return True
+        return False
+
+    def read(self, f_name: str) -> Iterator[List[dict]]:
+        """
+        Parses the complete lines appended to f_name since it was last read, about READ_BYTES at a time, and advances
+        its offset past them.
+        """
+        if not os.path.isfile(f_name):
+            return
+        with open(f_name, "rb") as f:
+            f.seek(self.offsets[f_name])
+            while True:
+                lines = f.readlines(READ_BYTES)
+                if len(lines) == 0:
+                    break
+                partial = not lines[-1].endswith(b"\n")
+                if partial:
+                    # A trailing partial line is still being written and is picked up by the next update
+                    lines.pop()
+                self.offsets[f_name] += sum(len(line) for line in lines)
+                yield jsonl.decode(lines)
+                if partial:
+                    break
+        self.fingerprints[f_name] = self._fingerprint(f_name)
+
+    def update(self) -> int:
+        """
+        Reads the lines appended since the last update and returns how many were read. If a file was truncated or
+        rewritten everything is read again from scratch.
+        """
+        if self.rewritten():
+            self.reset()
+        n = 0
+        for chunk in self.read(aggregate.MEDIA_FILE):
+            self.media_importer.add(chunk)
+            self.media_timeline.add(chunk)
+            n += len(chunk)
+        for chunk in self.read(aggregate.TWEETS_FILE):
+            self.twitter_importer.add(chunk)
+            self.index_builder.add(chunk)
+            self.row_dates.extend([self.date_vocab.intern(d["date"]) for d in chunk])
+            self.row_times.frombytes(timeline.parse_times(chunk).astype(np.int64).tobytes())
+            self.row_sentiment.extend([d["sentiment"] for d in chunk])
+            n += len(chunk)
+        return n
+
+    def data(self, top_k: int = None) -> DashboardData:
+        """
+        Builds the dashboard data from everything read so far, as dashboard_data.load builds it from the files.
+        """
+        dates = np.array(self.date_vocab.terms, dtype=object)[np.frombuffer(self.row_dates, dtype=np.int32)]
+        sentiment = np.frombuffer(self.row_sentiment, dtype=np.float64)
+        keep = streaming.z_score_mask(sentiment, dates if self.per_date else None)
+
+        twitter_timeline = timeline.TimelineBuilder(self.step)
+        shown = keep & (dates != '2021-05-07')
+        twitter_timeline.add_rows(np.frombuffer(self.row_times, dtype=np.int64).view("datetime64[ns]")[shown],
+                                  sentiment[shown])
+        return aggregate.df_by_date(self.twitter_importer.frame()[keep], top_k), \
+            aggregate.df_by_date(self.media_importer.frame(), top_k), self.index_builder.index(keep), \
+            {"twitter": twitter_timeline.timeline(), "media": self.media_timeline.timeline()}
+
+    def generation(self) -> str:
+        """
+        Identifies how much of the files has been read.
+        """
+        return "-".join("{}:{}".format(self.offsets[f], self.fingerprints[f]) for f in sorted(self.offsets.keys()))
+
+    def save(self, path: str):
+        tmp_path = "{}.{}.tmp".format(path, os.getpid())
+        with open(tmp_path, "wb") as f:
+            pk.dump(self, f, protocol=pk.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def load(path: str, sparse_scores: bool, step: int, per_date: bool) -> 'IncrementalData':
+        """
+        Loads the state saved at path, or starts from scratch if there is none or it cannot be used.
+        """
+        state = None
+        if os.path.isfile(path):
+            try:
+                with open(path, "rb") as f:
+                    state = pk.load(f)
+            except (AttributeError, EOFError, ImportError, IndexError, pk.UnpicklingError, ValueError) as e:
+                # Truncated, or pickled by a version whose classes no longer exist
+                print("Warning, could not read the incremental state {} ({}), it is rebuilt".format(path, e))
+            # A state built with other parameters is rebuilt
+            if getattr(state, "version", None) != STATE_VERSION or \
+                    state.params() != (sparse_scores, step, per_date):
+                state = None
+        return state if state is not None else IncrementalData(sparse_scores, step, per_date)
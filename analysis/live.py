@@ -0,0 +1,113 @@
+from typing import Optional
+
+import argparse
+import atexit
+import contextlib
+import fcntl
+import os
+import subprocess
+import sys
+import time
+
+import pandas as pd
+
+import config as conf
+from analysis import dashboard_data, incremental, snapshot
+
+# Set for the processes started after the owner, which then do not start another one
+OWNER_ENV = "LIVE_REFRESH_OWNER"
+
+
+@contextlib.contextmanager
+def locked(path: str):
+    """
+    Holds an exclusive lock next to the incremental state, so that only one process updates it at a time.
+    """
+    with open(path + ".lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def saved_at(path: str) -> Optional[int]:
+    return os.stat(path).st_mtime_ns if os.path.isfile(path) else None
+
+
+class Refresher:
+    """
+    Keeps the snapshot up to date with the analyzed files. The incremental state is held in memory between refreshes
+    and only loaded again if another process saved it since.
+    """
+
+    def __init__(self, path: str = conf.LIVE_STATE_PATH):
+        self.path = path
+        self.state = None
+        self.saved = None
+
+    def refresh(self) -> bool:
+        """
+        Reads what was appended to the analyzed files and writes a new snapshot if anything was, or if the snapshot
+        is not of what has been read. Returns whether a snapshot was written.
+        """
+        with locked(self.path):
+            if self.state is None or saved_at(self.path) != self.saved:
+                self.state = incremental.IncrementalData.load(self.path, conf.SPARSE_SCORES,
+                                                              pd.Timedelta(conf.TIMELINE_FREQ).value,
+                                                              conf.OUTLIER_PER_DATE)
+            # Recorded before reading, so that anything appended meanwhile makes the snapshot stale for a full build
+            sources = snapshot.source_stats()
+            read = self.state.update()
+            generation = self.state.generation()
+            if read > 0:
+                self.state.save(self.path)
+            self.saved = saved_at(self.path)
+            manifest = snapshot.read_manifest(conf.SNAPSHOT_PATH) if snapshot.exists(conf.SNAPSHOT_PATH) else {}
+            if read == 0 and manifest.get("version") == snapshot.SNAPSHOT_VERSION and \
+                    manifest.get("generation") == generation:
+                return False
+            data = self.state.data(conf.AGGREGATE_TOP_K if conf.AGGREGATE_TOP_K > 0 else None)
+            snapshot.write(conf.SNAPSHOT_PATH, dashboard_data.to_arrays(data), snapshot.build_figures(data[0], data[1]),
+                           sources, generation)
+            return True
+
+
+def run(seconds: float):
+    refresher = Refresher()
+    while True:
+        try:
+            refresher.refresh()
+        except (OSError, ValueError) as e:
+            print("Warning, refreshing the dashboard data failed ({}), retrying in {} seconds".format(e, seconds))
+        time.sleep(seconds)
+
+
+def start() -> subprocess.Popen:
+    """
+    Refreshes the snapshot once, so that the dashboard has a current one to load, and then starts the process that
+    keeps refreshing it every REFRESH_SECONDS.
+    """
+    subprocess.run([sys.executable, "-m", "analysis.live", "--once"], check=True)
+    os.environ[OWNER_ENV] = "1"
+    return subprocess.Popen([sys.executable, "-m", "analysis.live"])
+
+
+def ensure_started():
+    """
+    Starts the refreshing process unless a parent process, such as the gunicorn master, already did.
+    """
+    if OWNER_ENV not in os.environ:
+        owner = start()
+        atexit.register(owner.terminate)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keeps the dashboard snapshot up to date with the analyzed files.")
+    parser.add_argument("--once", action="store_true", help="refresh once and exit")
+    parser.add_argument("--seconds", type=float, default=conf.REFRESH_SECONDS, help="seconds between refreshes")
+    args = parser.parse_args()
+    if args.once:
+        Refresher().refresh()
+    else:
+        run(max(args.seconds, 1))
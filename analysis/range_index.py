@@ -0,0 +1,295 @@
+from typing import Dict, List, Optional, Tuple
+
+from array import array
+
+import numpy as np
+
+from analysis import aggregate
+from analysis.sparse import Vocabulary
+from scraping import import_tweets, segments
+
+STANCES = ["n", "i", "p"]
+PREFIX = "range"
+
+
+def stance_mask(stances: List[str]) -> int:
+    """
+    Encodes a list of stances ("n", "i" and "p" as in the dashboard tags) as a bit mask.
+    """
+    return sum(1 << i for i, s in enumerate(STANCES) if s in stances)
+
+
+class RangeIndex:
+    """
+    Cumulative per-day sums and counts of every item score and of the sentiment, kept separately for each combination
+    of hashtag stances seen in the tweets. Any window of days is answered from the difference of two cumulative
+    values, so a query does not depend on how many tweets fall inside it.
+
+    Item scores are kept sparse, as most items are used on a few days by a few groups only. Every (group, item) pair
+    that occurs is a run of entries, one per day it occurs on, holding the sums and counts accumulated up to and
+    including that day. Entries are sorted by their key pair * #dates + day, so the value of a pair at any day is
+    found with a binary search. The sentiment is dense with shape (#groups, #dates + 1, 3), holding the running count,
+    sum and sum of squares.
+    """
+
+    def __init__(self, dates: List[str], masks: np.ndarray, terms: Dict[str, List[str]], pairs: Dict[str, np.ndarray],
+                 keys: Dict[str, np.ndarray], sums: Dict[str, np.ndarray], counts: Dict[str, np.ndarray],
+                 sentiment: np.ndarray):
+        self.dates = dates
+        self.masks = masks
+        self.terms = terms
+        self.pairs = pairs
+        self.keys = keys
+        self.sums = sums
+        self.counts = counts
+        self.sentiment = sentiment
+
+    def groups(self, stances: Optional[List[str]]) -> np.ndarray:
+        """
+        Selects the groups of tweets that use any of the given stances, or all tweets if none are given.
+        """
+        if not stances:
+            return np.ones(len(self.masks), dtype=bool)
+        return (self.masks & stance_mask(stances)) != 0
+
+    def has_stances(self) -> bool:
+        """
+        Whether the stances of any tweet are known, without which filtering on them selects nothing.
+        """
+        return bool((self.masks != 0).any())
+
+    def cumulative(self, key: str, pairs: np.ndarray, day: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        The sums and counts of the given pairs accumulated up to and including day, which may be -1.
+        """
+        n_dates = len(self.dates)
+        keys = self.keys[key]
+        if len(keys) == 0:
+            return np.zeros(len(pairs)), np.zeros(len(pairs), dtype=np.int32)
+        pos = np.searchsorted(keys, pairs * n_dates + day, side='right') - 1
+        # An entry before the pair's run belongs to another pair, which means the pair has no entry up to the day
+        found = pos >= 0
+        found[found] = keys[pos[found]] // n_dates == pairs[found]
+        pos = np.where(found, pos, 0)
+        return np.where(found, self.sums[key][pos], 0.0), np.where(found, self.counts[key][pos], 0)
+
+    def query(self, lo: int, hi: int, stances: Optional[List[str]] = None, top_n=25) -> Dict[str, any]:
+        """
+        Aggregates the dates lo..hi (inclusive indices into dates) over the selected stances. Returns the sentiment
+        count, mean and standard deviation and the top_n items of each key by descending mean score.
+        """
+        groups = self.groups(stances)
+        count, total, total_sq = (self.sentiment[groups, hi + 1] - self.sentiment[groups, lo]).sum(axis=0)
+        result = {
+            "count": int(count),
+            "mean": total / count if count > 0 else np.nan,
+            "std": np.sqrt(max((total_sq - total * total / count) / (count - 1), 0.0)) if count > 1 else np.nan
+        }
+        for key, terms in self.terms.items():
+            n_items = len(terms)
+            pairs = self.pairs[key]
+            pairs = pairs[groups[pairs // max(n_items, 1)]]
+            hi_sums, hi_counts = self.cumulative(key, pairs, hi)
+            lo_sums, lo_counts = self.cumulative(key, pairs, lo - 1)
+            # The groups of every item are added up into one dense row per key, which only lives during the query
+            items = pairs % max(n_items, 1)
+            sums = np.bincount(items, weights=hi_sums - lo_sums, minlength=n_items)
+            counts = np.bincount(items, weights=hi_counts - lo_counts, minlength=n_items)
+            ids = np.flatnonzero(counts)
+            means = sums[ids] / counts[ids]
+            if len(ids) > top_n:
+                top = np.argpartition(-means, top_n - 1)[:top_n]
+                ids, means = ids[top], means[top]
+            ranked = np.argsort(-means, kind='stable')
+            result[key] = {terms[i]: m for i, m in zip(ids[ranked].tolist(), means[ranked].tolist())}
+        return result
+
+    def to_arrays(self, prefix: str) -> Dict[str, np.ndarray]:
+        arrays = {}
+        arrays["{}/dates.blob".format(prefix)], arrays["{}/dates.offsets".format(prefix)] = \
+            aggregate.encode_strings(self.dates)
+        arrays["{}/masks".format(prefix)] = self.masks
+        arrays["{}/sentiment".format(prefix)] = self.sentiment
+        for key, terms in self.terms.items():
+            name = "{}/{}".format(prefix, key)
+            arrays[name + ".vocab.blob"], arrays[name + ".vocab.offsets"] = aggregate.encode_strings(terms)
+            arrays[name + ".pairs"] = self.pairs[key]
+            arrays[name + ".keys"] = self.keys[key]
+            arrays[name + ".sums"] = self.sums[key]
+            arrays[name + ".counts"] = self.counts[key]
+        return arrays
+
+    @staticmethod
+    def from_arrays(arrays: Dict[str, np.ndarray], prefix: str) -> 'RangeIndex':
+        terms, pairs, keys, sums, counts = {}, {}, {}, {}, {}
+        for key in aggregate.SCORE_KEYS:
+            name = "{}/{}".format(prefix, key)
+            terms[key] = aggregate.StringTable(arrays[name + ".vocab.blob"], arrays[name + ".vocab.offsets"])
+            pairs[key] = arrays[name + ".pairs"]
+            keys[key] = arrays[name + ".keys"]
+            sums[key] = arrays[name + ".sums"]
+            counts[key] = arrays[name + ".counts"]
+        dates = aggregate.decode_strings(arrays["{}/dates.blob".format(prefix)],
+                                         arrays["{}/dates.offsets".format(prefix)])
+        return RangeIndex(dates, arrays["{}/masks".format(prefix)], terms, pairs, keys, sums, counts,
+                          arrays["{}/sentiment".format(prefix)])
+
+
+def prefix_sums(flat: np.ndarray, weights: Optional[np.ndarray], shape: tuple, dtype) -> np.ndarray:
+    """
+    Bins the flat (group, date) cell ids into a dense (group, date) array and accumulates it over the dates, with a
+    leading row of zeros.
+    """
+    binned = np.bincount(flat, weights=weights, minlength=int(np.prod(shape))).reshape(shape).astype(dtype)
+    out = np.zeros((shape[0], shape[1] + 1) + tuple(shape[2:]), dtype=dtype)
+    np.cumsum(binned, axis=1, out=out[:, 1:])
+    return out
+
+
+def sparse_prefix_sums(keys: np.ndarray, values: np.ndarray, n_dates: int) -> Tuple[np.ndarray, ...]:
+    """
+    Sums the values of equal pair * n_dates + day keys and accumulates them over the days of every pair. Returns the
+    distinct pairs and, per distinct key in sorted order, the key, the running sum and the running count.
+    """
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]])) if len(keys) > 0 \
+        else np.zeros(0, dtype=np.int64)
+    sums = np.add.reduceat(values[order], starts) if len(starts) > 0 else np.zeros(0)
+    counts = np.diff(np.append(starts, len(keys))).astype(np.int64)
+    del order
+    keys = keys[starts]
+    pairs = keys // n_dates
+    # Running totals over all entries, less the total before each pair's run
+    first = np.flatnonzero(np.concatenate([[True], pairs[1:] != pairs[:-1]])) if len(pairs) > 0 \
+        else np.zeros(0, dtype=np.int64)
+    run = np.repeat(np.arange(len(first)), np.diff(np.append(first, len(pairs))))
+    np.cumsum(sums, out=sums)
+    np.cumsum(counts, out=counts)
+    sums -= np.concatenate([[0.0], sums[first[1:] - 1]])[run]
+    counts -= np.concatenate([[0], counts[first[1:] - 1]])[run]
+    return pairs[first], keys, sums, counts.astype(np.int32)
+
+
+def stored_masks(ids: np.ndarray) -> np.ndarray:
+    """
+    Stance masks of the tweets with the given sorted, distinct ids: the stances the puller stored or else those their
+    text matches with the same tags, or -1 for tweets that are not in the tweet store. This gives the tweets analyzed
+    before stances were recorded their stances without analyzing them again.
+    """
+    masks = np.full(len(ids), -1, dtype=np.int64)
+    if len(ids) == 0:
+        return masks
+    matcher = import_tweets.tag_matcher()
+    for batch in segments.iter_batches(import_tweets.TWEETS_FILE, import_tweets.TWEETS_STORE,
+                                       fields=["id", "text", "stances"]):
+        batch_ids = np.array([int(t["id"]) for t in batch], dtype=np.int64)
+        pos = np.minimum(np.searchsorted(ids, batch_ids), len(ids) - 1)
+        for i in np.flatnonzero(ids[pos] == batch_ids):
+            t = batch[i]
+            masks[pos[i]] = stance_mask(t["stances"] if "stances" in t.keys() else matcher.annotate(t)["stances"])
+    return masks
+
+
+class IndexBuilder:
+    """
+    Collects analyzed tweets chunk by chunk into a RangeIndex, applying the same date exclusion and key phrase filter
+    as df_by_date. Tweets analyzed before stances were recorded get them from the tweet store, see stored_masks, and
+    only count towards queries over all tweets if they are not found there. Tweets can still be added after an index
+    was built, and each index can leave out some of the tweets added so far.
+    """
+
+    def __init__(self):
+        self.date_vocab = Vocabulary()
+        self.vocabs = {key: Vocabulary() for key in aggregate.SCORE_KEYS}
+        self.group_ids = {}
+        # How many rows were passed to add, and the position among them of every row that was not excluded
+        self.added = 0
+        self.row_numbers = array('q')
+        self.row_dates, self.row_groups, self.row_sentiment = array('i'), array('i'), array('d')
+        self.unknown_rows, self.unknown_ids = array('i'), array('q')
+        self.cells = {key: (array('i'), array('i'), array('d')) for key in aggregate.SCORE_KEYS}
+
+    def add(self, chunk: List[dict]):
+        group_ids = self.group_ids
+        for d in chunk:
+            self.added += 1
+            if d["date"] == '2021-05-07':
+                continue
+            row = len(self.row_dates)
+            self.row_numbers.append(self.added - 1)
+            self.row_dates.append(self.date_vocab.intern(d["date"]))
+            self.row_groups.append(group_ids.setdefault(stance_mask(d.get("stances", [])), len(group_ids)))
+            if "stances" not in d.keys():
+                self.unknown_rows.append(row)
+                self.unknown_ids.append(int(d["id"]))
+            self.row_sentiment.append(d["sentiment"])
+            for key, (rows, ids, values) in self.cells.items():
+                intern = self.vocabs[key].intern
+                for k, v in d[key].items():
+                    if key == "key_phrases" and ('@' in k or len(k) < 4):
+                        continue
+                    rows.append(row)
+                    ids.append(intern(k))
+                    values.append(v)
+
+    def resolve_stances(self):
+        """
+        Moves the tweets added without stances to the groups of their stored stances. This is done once per tweet, as
+        the tweet store is read in full to find them.
+        """
+        if len(self.unknown_rows) > 0:
+            group_ids, row_groups = self.group_ids, self.row_groups
+            ids, inverse = np.unique(np.frombuffer(self.unknown_ids, dtype=np.int64), return_inverse=True)
+            masks = stored_masks(ids)[inverse]
+            for row, mask in zip(self.unknown_rows, masks.tolist()):
+                if mask >= 0:
+                    row_groups[row] = group_ids.setdefault(mask, len(group_ids))
+            self.unknown_rows, self.unknown_ids = array('i'), array('q')
+
+    def index(self, keep: np.ndarray = None) -> RangeIndex:
+        """
+        Builds the index of the tweets added so far. If given, keep flags which of the rows passed to add are indexed,
+        by their position among all of them.
+        """
+        self.resolve_stances()
+        row_dates = np.frombuffer(self.row_dates, dtype=np.int32)
+        row_group = np.frombuffer(self.row_groups, dtype=np.int32).astype(np.int64)
+        sentiment = np.frombuffer(self.row_sentiment, dtype=np.float64)
+        selected = np.ones(len(row_dates), dtype=bool) if keep is None \
+            else np.asarray(keep, dtype=bool)[np.frombuffer(self.row_numbers, dtype=np.int64)]
+
+        # Dates are interned in file order and ranked afterwards so that the prefix sums run in calendar order. Only
+        # the dates and stance groups of the indexed rows are kept.
+        date_ids = np.unique(row_dates[selected])
+        dates = sorted(self.date_vocab.terms[i] for i in date_ids.tolist())
+        position = {d: i for i, d in enumerate(dates)}
+        rank = np.full(len(self.date_vocab), -1, dtype=np.int64)
+        rank[date_ids] = [position[self.date_vocab.terms[i]] for i in date_ids.tolist()]
+        group_numbers = np.unique(row_group[selected])
+        renumber = np.full(len(self.group_ids), -1, dtype=np.int64)
+        renumber[group_numbers] = np.arange(len(group_numbers))
+        n_groups, n_dates = len(group_numbers), len(dates)
+        row_days, row_group = rank[row_dates], renumber[row_group]
+
+        shape = (n_groups, n_dates)
+        flat, sentiment = (row_group * n_dates + row_days)[selected], sentiment[selected]
+        moments = np.stack([prefix_sums(flat, w, shape, np.float64)
+                            for w in [None, sentiment, sentiment * sentiment]], axis=-1)
+
+        pairs, keys, sums, counts = {}, {}, {}, {}
+        for key, (rows, ids, values) in self.cells.items():
+            n_items = len(self.vocabs[key])
+            rows = np.frombuffer(rows, dtype=np.int32)
+            cells = selected[rows]
+            rows = rows[cells]
+            flat = (row_group[rows] * n_items + np.frombuffer(ids, dtype=np.int32)[cells]) * n_dates + row_days[rows]
+            pairs[key], keys[key], sums[key], counts[key] = \
+                sparse_prefix_sums(flat, np.frombuffer(values, dtype=np.float64)[cells], n_dates)
+
+        masks = np.zeros(n_groups, dtype=np.int64)
+        for mask, i in self.group_ids.items():
+            if renumber[i] >= 0:
+                masks[renumber[i]] = mask
+        return RangeIndex(dates, masks, {key: v.terms for key, v in self.vocabs.items()}, pairs, keys, sums, counts,
+                          moments)
@@ -0,0 +1,75 @@
+from typing import Dict, Optional
+
+import json
+import os
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+ENV_VAR = "PIT_SHARED_DATA"
+ALIGNMENT = 64
+
+# Keeps attached blocks mapped for the lifetime of the worker
+_attached = []
+# Names of the blocks published by this process, which forked workers inherit together with its resource tracker
+_published = set()
+
+
+def publish(arrays: Dict[str, np.ndarray]) -> SharedMemory:
+    """
+    Copies the given arrays into a single shared memory block and advertises its layout through an environment
+    variable so that forked gunicorn workers can attach to it with attach().
+    """
+    layout = {}
+    size = 0
+    for name, a in arrays.items():
+        size = (size + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+        layout[name] = [size, a.dtype.str, list(a.shape)]
+        size += a.nbytes
+
+    shm = SharedMemory(create=True, size=max(size, 1))
+    for name, a in arrays.items():
+        offset, dtype, shape = layout[name]
+        np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)[...] = a
+
+    _published.add(shm.name)
+    os.environ[ENV_VAR] = json.dumps({"name": shm.name, "arrays": layout})
+    return shm
+
+
+def attach() -> Optional[Dict[str, np.ndarray]]:
+    """
+    Attaches to the block published by the master process and returns read-only views of its arrays, or None when
+    no block has been published.
+    """
+    spec = os.environ.get(ENV_VAR)
+    if spec is None:
+        return None
+    spec = json.loads(spec)
+    try:
+        # Only the master unlinks the block, so it is not tracked here at all
+        shm = SharedMemory(name=spec["name"], track=False)
+    except TypeError:
+        # Before Python 3.13 attaching registers the block with the resource tracker. Workers forked from the master
+        # share its tracker, where the block is registered already. Any other process has a tracker of its own, which
+        # must not unlink the master's block when the process exits.
+        shm = SharedMemory(name=spec["name"])
+        if spec["name"] not in _published:
+            # The tracker knows the block by its POSIX name, which name gives without the leading slash
+            resource_tracker.unregister("/" + shm.name, "shared_memory")
+    _attached.append(shm)
+
+    arrays = {}
+    for name, (offset, dtype, shape) in spec["arrays"].items():
+        a = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+        a.flags.writeable = False
+        arrays[name] = a
+    return arrays
+
+
+def release(shm: SharedMemory):
+    os.environ.pop(ENV_VAR, None)
+    _published.discard(shm.name)
+    shm.close()
+    shm.unlink()
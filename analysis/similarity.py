@@ -0,0 +1,63 @@
+from typing import Dict, List, Tuple
+
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+
+KEYS = ["key_phrases", "emotional_traits", "behavioral_traits"]
+
+
+def long_scores(info: Dict[str, Dict[str, any]], groups: Dict[Tuple[str, str], int]) -> pd.DataFrame:
+    """
+    Flattens the (key, date) score dicts of a df_by_date result into one row per item, tagged with the group id and the
+    item's position within its dict. Groups missing from groups are left out.
+    """
+    entries = [(g, info[d][key]) for (key, d), g in groups.items() if d in info.keys()]
+    lengths = np.array([len(x) for _, x in entries], dtype=np.int64)
+    return pd.DataFrame({
+        "group": np.repeat(np.array([g for g, _ in entries], dtype=np.int64), lengths),
+        "item": np.fromiter(chain.from_iterable(x.keys() for _, x in entries), dtype=object, count=lengths.sum()),
+        "score": np.fromiter(chain.from_iterable(x.values() for _, x in entries), dtype=np.float64,
+                             count=lengths.sum()),
+        "pos": np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    })
+
+
+def similarity_table(twitter_info: Dict[str, Dict[str, any]], media_info: Dict[str, Dict[str, any]],
+                     keys: List[str] = None) -> Dict[Tuple[str, str], Dict[str, float]]:
+    """
+    Computes create_similarity_dict for every date and key in one pass. The items of both datasets are hash-joined on
+    (key, date, item) and the absolute score differences are min-max normalized per group, so the cost is linear in
+    the number of items instead of quadratic per date. Results are keyed by (key, date), ordered by descending score
+    with ties in Twitter order, and match create_similarity_dict exactly.
+    """
+    if keys is None:
+        keys = KEYS
+    groups = {(key, d): i for i, (key, d) in enumerate((key, d) for key in keys for d in twitter_info.keys())}
+    result = {kd: {} for kd in groups.keys()}
+    matches = long_scores(twitter_info, groups).merge(long_scores(media_info, groups), on=["group", "item"],
+                                                      suffixes=("_x", "_y"))
+    if len(matches) == 0:
+        return result
+
+    group = matches["group"].to_numpy()
+    pos = matches["pos_x"].to_numpy()
+    order = np.lexsort((pos, group))
+    group, pos, items = group[order], pos[order], matches["item"].to_numpy()[order]
+    sim = np.abs(matches["score_x"].to_numpy()[order] - matches["score_y"].to_numpy()[order])
+
+    starts = np.concatenate([[0], np.flatnonzero(group[1:] != group[:-1]) + 1])
+    lengths = np.diff(np.concatenate([starts, [len(group)]]))
+    a = np.repeat(np.minimum.reduceat(sim, starts), lengths)
+    b = np.repeat(np.maximum.reduceat(sim, starts), lengths)
+    # Flip the match and make it from 0-100, groups whose differences are all equal become nan as before
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sim = (1.0 - ((sim - a) / (b - a))) * 100
+
+    ranked = np.lexsort((pos, -sim, group))
+    names = list(groups.keys())
+    items, sim = items[ranked].tolist(), sim[ranked].tolist()
+    for lo, hi in zip(starts.tolist(), (starts + lengths).tolist()):
+        result[names[group[ranked[lo]]]] = dict(zip(items[lo:hi], sim[lo:hi]))
+    return result
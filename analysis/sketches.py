@@ -0,0 +1,152 @@
+from typing import Tuple
+
+import numpy as np
+
+from analysis.streaming import RunningStats
+
+KLL_K = 200
+
+
+class KLLSketch:
+    """
+    KLL quantile sketch (Karnin, Lang and Liberty). Values live in levels of compactors where an item at level h stands
+    for 2^h values; a full level is sorted and every other item, from a random offset, is promoted to the next level.
+    Memory stays around 3k items whatever the number of values, and sketches of separate shards merge into a sketch of
+    their union. Quantiles are exact until the first compaction.
+    """
+
+    def __init__(self, k=KLL_K, seed=0):
+        self.k = k
+        self.n = 0
+        self.levels = [np.zeros(0)]
+        self.buffer = []
+        self.rng = np.random.default_rng(seed)
+
+    def capacity(self, h: int) -> int:
+        # Lower levels get geometrically smaller compactors, the top level holds k items
+        return max(int(np.ceil(self.k * (2.0 / 3.0) ** (len(self.levels) - h - 1))), 2)
+
+    def add(self, x: float):
+        self.buffer.append(x)
+        if len(self.buffer) >= self.k:
+            self.flush()
+
+    def flush(self):
+        if len(self.buffer) > 0:
+            values, self.buffer = self.buffer, []
+            self.update(np.asarray(values, dtype=np.float64))
+
+    def update(self, values: np.ndarray):
+        values = np.asarray(values, dtype=np.float64)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self.n += len(values)
+        self.compress()
+
+    def merge(self, other: 'KLLSketch'):
+        self.flush()
+        other.flush()
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.zeros(0))
+        for h, level in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], level])
+        self.n += other.n
+        self.compress()
+
+    def compress(self):
+        while sum(len(x) for x in self.levels) > sum(self.capacity(h) for h in range(len(self.levels))):
+            for h, level in enumerate(self.levels):
+                if len(level) < self.capacity(h):
+                    continue
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.zeros(0))
+                level = np.sort(level)
+                # An odd item out stays behind so that the total weight is preserved exactly
+                keep = level[:len(level) % 2]
+                pairs = level[len(level) % 2:]
+                promoted = pairs[self.rng.integers(2)::2]
+                self.levels[h] = keep
+                self.levels[h + 1] = np.concatenate([self.levels[h + 1], promoted])
+                break
+
+    def weighted(self) -> Tuple[np.ndarray, np.ndarray]:
+        self.flush()
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(x), 2.0 ** h) for h, x in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        return items[order], weights[order]
+
+    def quantile(self, q):
+        """
+        Returns the q-quantile(s) of the values seen, or nan if there were none.
+        """
+        self.flush()
+        if self.n == 0:
+            return np.full(np.shape(q), np.nan) if np.ndim(q) > 0 else np.nan
+        if len(self.levels) == 1:
+            return np.quantile(self.levels[0], q)
+        items, weights = self.weighted()
+        cumulative = np.cumsum(weights)
+        idx = np.searchsorted(cumulative, np.asarray(q) * cumulative[-1], side='left')
+        return items[np.minimum(idx, len(items) - 1)]
+
+
+class SentimentSummary:
+    """
+    Constant size, mergeable summary of the sentiment of one date: count, mean and M2 moments for mean() and std() plus
+    a KLL sketch for quantiles. Exposes mean() and std() like the Series it replaces so that the components take
+    either.
+    """
+
+    def __init__(self, k=KLL_K):
+        self.moments = RunningStats()
+        self.sketch = KLLSketch(k)
+
+    @staticmethod
+    def of(values) -> 'SentimentSummary':
+        summary = SentimentSummary()
+        summary.update(values)
+        return summary
+
+    def add(self, x: float):
+        self.moments.add(x)
+        self.sketch.add(x)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        self.moments.update(values)
+        self.sketch.update(values)
+
+    def merge(self, other: 'SentimentSummary'):
+        self.moments.merge(other.moments)
+        self.sketch.merge(other.sketch)
+
+    def __len__(self):
+        return self.moments.count
+
+    def mean(self) -> float:
+        return self.moments.mean()
+
+    def std(self) -> float:
+        return self.moments.std()
+
+    def quantile(self, q):
+        return self.sketch.quantile(q)
+
+    def to_arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Returns the moments as [count, mean, M2], the sketch's items and the level of each item.
+        """
+        self.sketch.flush()
+        moments = np.array([self.moments.count, self.moments.avg, self.moments.m2], dtype=np.float64)
+        levels = np.concatenate([np.full(len(x), h, dtype=np.int8) for h, x in enumerate(self.sketch.levels)])
+        return moments, np.concatenate(self.sketch.levels), levels
+
+    @staticmethod
+    def from_arrays(moments: np.ndarray, items: np.ndarray, levels: np.ndarray) -> 'SentimentSummary':
+        summary = SentimentSummary()
+        summary.moments = RunningStats(int(moments[0]), float(moments[1]), float(moments[2]))
+        depth = int(levels.max()) + 1 if len(levels) > 0 else 1
+        summary.sketch.levels = [np.array(items[levels == h], dtype=np.float64) for h in range(depth)]
+        summary.sketch.n = summary.moments.count
+        return summary
+
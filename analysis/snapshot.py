@@ -0,0 +1,160 @@
+from typing import Dict, List, Optional, Tuple
+
+import argparse
+import datetime as dt
+import json
+import os
+import shutil
+
+import numpy as np
+import plotly
+
+import config as conf
+from analysis import aggregate, dashboard_data, similarity
+
+SNAPSHOT_VERSION = 8
+MANIFEST = "manifest.json"
+
+
+def exists(path: str) -> bool:
+    return os.path.isfile(os.path.join(path, MANIFEST))
+
+
+def file_stats(f_name: str) -> Optional[Dict[str, float]]:
+    return {"size": os.path.getsize(f_name), "mtime": os.path.getmtime(f_name)} if os.path.isfile(f_name) else None
+
+
+def source_stats() -> Dict[str, Optional[Dict[str, float]]]:
+    return {f: file_stats(f) for f in [aggregate.TWEETS_FILE, aggregate.MEDIA_FILE]}
+
+
+def stale_sources(manifest: dict) -> List[str]:
+    """
+    The analyzed files that changed, or are gone, since the snapshot was built from them.
+    """
+    return [f for f, recorded in manifest["sources"].items() if file_stats(f) != recorded]
+
+
+def read_manifest(path: str) -> dict:
+    with open(os.path.join(path, MANIFEST), "r") as f:
+        return json.load(f)
+
+
+def generation(path: str) -> Optional[str]:
+    """
+    Identifies what the snapshot at path was built from when it is kept up to date by analysis.live, else None.
+    """
+    return read_manifest(path).get("generation")
+
+
+def current(path: str) -> bool:
+    """
+    Whether a snapshot exists at path that can be served: it has the required version and was built from the
+    analyzed files as they are now. Otherwise says why not, so that the caller builds from the files instead.
+    """
+    if not exists(path):
+        return False
+    manifest = read_manifest(path)
+    if manifest["version"] != SNAPSHOT_VERSION:
+        print("Warning, snapshot {} has version {} but version {} is required and is not used, rebuild it with "
+              "`python -m analysis.snapshot`".format(path, manifest["version"], SNAPSHOT_VERSION))
+        return False
+    stale = stale_sources(manifest)
+    if len(stale) > 0:
+        print("Warning, {} changed since snapshot {} was built and it is not used, rebuild it with "
+              "`python -m analysis.snapshot`".format(", ".join(stale), path))
+        return False
+    return True
+
+
+def build_figures(twitter_info: dict, media_info: dict) -> Dict[str, str]:
+    """
+    Pre-serializes every figure and tab list shown on the dashboard.
+    """
+    import components
+    figures = {
+        "sentiment-graph": components.sentiment_figure(twitter_info, media_info).to_json(),
+        "sim-graph": components.similarity_figure(twitter_info, media_info).to_json(),
+    }
+    matches = similarity.similarity_table(twitter_info, media_info, aggregate.SCORE_KEYS)
+    for key in aggregate.SCORE_KEYS:
+        for d in twitter_info.keys():
+            figures["word-lists/{}/{}".format(key, d)] = json.dumps(
+                components.create_word_list_content(twitter_info, media_info, key, d, matches[(key, d)],
+                                                    page_size=conf.LIST_PAGE_SIZE),
+                cls=plotly.utils.PlotlyJSONEncoder)
+    return figures
+
+
+def write(path: str, arrays: Dict[str, np.ndarray], figures: Dict[str, str], sources: Dict[str, dict] = None,
+          generation: str = None):
+    """
+    Writes the snapshot to a temporary directory first and then swaps it in place so that a running dashboard never
+    sees a partially written snapshot. Unless given, the sources are recorded as the analyzed files are now.
+    """
+    tmp_path = path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    manifest = {
+        "version": SNAPSHOT_VERSION,
+        "created": dt.datetime.now().astimezone().isoformat(),
+        "sources": sources if sources is not None else source_stats(),
+        "generation": generation,
+        "arrays": {},
+        "figures": {}
+    }
+    for name, a in arrays.items():
+        f_name = "{}.npy".format(name.replace("/", "."))
+        np.save(os.path.join(tmp_path, f_name), a)
+        manifest["arrays"][name] = f_name
+    for name, fig in figures.items():
+        f_name = "{}.json".format(name.replace("/", "."))
+        with open(os.path.join(tmp_path, f_name), "w") as f:
+            f.write(fig)
+        manifest["figures"][name] = f_name
+    with open(os.path.join(tmp_path, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    old_path = path + ".old"
+    if os.path.isdir(path):
+        os.rename(path, old_path)
+    os.rename(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+
+def load(path: str, check_sources=True) -> Tuple[Dict[str, np.ndarray], Dict[str, any]]:
+    """
+    Memory-maps the arrays of a snapshot and loads its pre-serialized figures. A snapshot of another version is
+    refused, and so is one of analyzed files that changed since unless check_sources is False, as for a snapshot that
+    analysis.live keeps catching up with the files.
+    """
+    manifest = read_manifest(path)
+    if manifest["version"] != SNAPSHOT_VERSION:
+        raise ValueError("Snapshot {} has version {} but version {} is required, rebuild it with "
+                         "`python -m analysis.snapshot`".format(path, manifest["version"], SNAPSHOT_VERSION))
+    stale = stale_sources(manifest) if check_sources else []
+    if len(stale) > 0:
+        raise ValueError("{} changed since snapshot {} was built, rebuild it with `python -m analysis.snapshot`"
+                         .format(", ".join(stale), path))
+    arrays = {name: np.load(os.path.join(path, f_name), mmap_mode="r")
+              for name, f_name in manifest["arrays"].items()}
+    figures = {}
+    for name, f_name in manifest["figures"].items():
+        with open(os.path.join(path, f_name), "r") as f:
+            figures[name] = json.load(f)
+    return arrays, figures
+
+
+def build(path: str):
+    data = dashboard_data.load()
+    write(path, dashboard_data.to_arrays(data), build_figures(data[0], data[1]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precomputes the dashboard aggregates and figures.")
+    parser.add_argument("--out", default=conf.SNAPSHOT_PATH, help="snapshot directory to write")
+    args = parser.parse_args()
+    print("Building snapshot {}... ".format(args.out), end="")
+    build(args.out)
+    print("Success!")
@@ -0,0 +1,160 @@
+from typing import Dict, List, Tuple
+
+from array import array
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from analysis import sketches
+
+
+class Vocabulary:
+    """
+    Interns phrases or traits to dense integer ids. The same vocabulary is shared between datasets so that their
+    matrices have aligned columns.
+    """
+
+    def __init__(self):
+        self.ids = {}
+        self.terms = []
+
+    def intern(self, term: str) -> int:
+        i = self.ids.get(term)
+        if i is None:
+            i = self.ids[term] = len(self.terms)
+            self.terms.append(term)
+        return i
+
+    def __len__(self):
+        return len(self.terms)
+
+
+class SparseFrame:
+    """
+    Keeps the scalar columns of the analyzed rows in a DataFrame and every score column as a CSR matrix with one row
+    per tweet or article, one column per vocabulary id and float32 scores. Indexing by column name returns the scalar
+    column and indexing by a boolean mask filters the rows, so it can be used wherever the frame is only selected from.
+    """
+
+    def __init__(self, df: pd.DataFrame, matrices: Dict[str, sp.csr_matrix], vocabs: Dict[str, Vocabulary]):
+        self.df = df
+        self.matrices = matrices
+        self.vocabs = vocabs
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.df[key]
+        mask = np.asarray(key, dtype=bool)
+        return SparseFrame(self.df[mask], {k: m[mask] for k, m in self.matrices.items()}, self.vocabs)
+
+    def __len__(self):
+        return len(self.df)
+
+    def memory_usage(self) -> int:
+        return int(self.df.memory_usage(deep=True).sum()) + \
+            sum(m.data.nbytes + m.indices.nbytes + m.indptr.nbytes for m in self.matrices.values())
+
+
+class SparseImporter:
+    """
+    Collects analyzed rows chunk by chunk into a SparseFrame without keeping any of the per-row score dicts.
+    """
+
+    def __init__(self, keys: List[str], vocabs: Dict[str, Vocabulary] = None):
+        self.vocabs = vocabs if vocabs is not None else {key: Vocabulary() for key in keys}
+        self.data = {}
+        self.parts = {key: (array('i'), array('f'), array('q', [0])) for key in keys}
+
+    def add(self, chunk: List[dict]):
+        data, parts = self.data, self.parts
+        for d in chunk:
+            for (k, v) in d.items():
+                if k in ["bias", "stances", "created_at"]:
+                    continue
+                if k in parts.keys():
+                    indices, values, indptr = parts[k]
+                    intern = self.vocabs[k].intern
+                    indices.extend([intern(x) for x in v.keys()])
+                    values.extend(v.values())
+                    indptr.append(len(indices))
+                elif k not in data.keys():
+                    data[k] = [v]
+                else:
+                    data[k].append(v)
+
+    def frame(self) -> SparseFrame:
+        df = pd.DataFrame(self.data)
+        df['date'] = df['date'].astype('category')
+        matrices = {}
+        for key, (indices, values, indptr) in self.parts.items():
+            matrices[key] = sp.csr_matrix(
+                (np.frombuffer(values, dtype=np.float32), np.frombuffer(indices, dtype=np.int32),
+                 np.frombuffer(indptr, dtype=np.int64)),
+                shape=(len(indptr) - 1, len(self.vocabs[key])))
+        return SparseFrame(df, matrices, self.vocabs)
+
+
+def top_k_positions(values: np.ndarray, k: int) -> np.ndarray:
+    """
+    Returns the positions of the k largest values in ascending order using a partial sort. Ties at the cut keep the
+    earliest positions, so the result agrees with a stable descending sort.
+    """
+    if len(values) <= k:
+        return np.arange(len(values))
+    cut = -np.partition(-values, k - 1)[k - 1]
+    above = np.flatnonzero(values > cut)
+    ties = np.flatnonzero(values == cut)[:k - len(above)]
+    return np.sort(np.concatenate([above, ties]))
+
+
+def mean_by_rows(matrix: sp.csr_matrix, lo: int, hi: int, top_k: int = None,
+                 allowed: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Averages the stored scores of rows lo..hi per column and returns the column ids and means by descending mean,
+    optionally only the top_k of them. If given, allowed flags which column ids may be returned.
+    """
+    start, end = matrix.indptr[lo], matrix.indptr[hi]
+    indices = matrix.indices[start:end]
+    sums = np.bincount(indices, weights=matrix.data[start:end].astype(np.float64), minlength=matrix.shape[1])
+    counts = np.bincount(indices, minlength=matrix.shape[1])
+    ids = np.flatnonzero(counts)
+    if allowed is not None:
+        ids = ids[allowed[ids]]
+    means = sums[ids] / counts[ids]
+    if top_k is not None:
+        top = top_k_positions(means, top_k)
+        ids, means = ids[top], means[top]
+    ranked = np.argsort(-means, kind='stable')
+    return ids[ranked], means[ranked]
+
+
+def df_by_date(sf: SparseFrame, top_k: int = None) -> Dict[str, Dict[str, any]]:
+    """
+    Sparse counterpart of aggregate.df_by_date. Scores are averaged with one bincount per date, ties are ordered by
+    vocabulary id and the means carry the float32 precision of the stored scores.
+    """
+    order = np.argsort(sf.df['date'].cat.codes.to_numpy(), kind='stable')
+    dates = sf.df['date'].to_numpy()[order]
+    keep = dates != '2021-05-07'
+    order, dates = order[keep], dates[keep]
+    if len(dates) == 0:
+        return {}
+    bounds = np.concatenate([[0], np.flatnonzero(dates[1:] != dates[:-1]) + 1, [len(dates)]])
+    sentiment = sf.df['sentiment'].to_numpy()[order]
+
+    filters = {}
+    if "key_phrases" in sf.vocabs.keys():
+        filters["key_phrases"] = np.array([len(k) >= 4 and '@' not in k for k in sf.vocabs["key_phrases"].terms],
+                                          dtype=bool)
+
+    matrices = {key: m[order] for key, m in sf.matrices.items()}
+    dict_by_date = {}
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        entry = {"sentiment": sketches.SentimentSummary.of(sentiment[lo:hi])}
+        for key, matrix in matrices.items():
+            ids, means = mean_by_rows(matrix, lo, hi, top_k, filters.get(key))
+            terms = sf.vocabs[key].terms
+            entry[key] = dict(zip([terms[i] for i in ids.tolist()], means.tolist()))
+        dict_by_date[dates[lo]] = entry
+    return dict_by_date
@@ -0,0 +1,127 @@
+from typing import Callable, Dict, Iterator, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+from scraping import jsonl
+
+CHUNK_SIZE = 100000
+
+
+class RunningStats:
+    """
+    Count, mean and sum of squared deviations (M2) maintained with Welford's algorithm. Batches and other instances
+    are merged with Chan et al.'s parallel update, so summaries of separate chunks can be combined.
+    """
+
+    def __init__(self, count=0, mean=0.0, m2=0.0):
+        self.count = count
+        self.avg = mean
+        self.m2 = m2
+
+    def merge(self, other: 'RunningStats'):
+        if other.count == 0:
+            return
+        count = self.count + other.count
+        delta = other.avg - self.avg
+        self.avg += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+
+    def add(self, x: float):
+        self.count += 1
+        delta = x - self.avg
+        self.avg += delta / self.count
+        self.m2 += delta * (x - self.avg)
+
+    def update(self, values: np.ndarray):
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) > 0:
+            mean = values.mean()
+            self.merge(RunningStats(len(values), mean, float(((values - mean) ** 2).sum())))
+
+    def mean(self) -> float:
+        return self.avg if self.count > 0 else np.nan
+
+    def std(self) -> float:
+        """Sample standard deviation, as pandas computes it."""
+        return float(np.sqrt(self.m2 / (self.count - 1))) if self.count > 1 else np.nan
+
+
+def z_score_mask(values: np.ndarray, groups: np.ndarray = None, z=3.0) -> np.ndarray:
+    """
+    z_score_filter for values already in memory: flags the values within z sample standard deviations of the mean of
+    all values, or of their group if groups are given. Values whose group has no spread are dropped.
+    """
+    values = pd.Series(np.asarray(values, dtype=np.float64))
+    if groups is None:
+        mean, std = values.mean(), values.std()
+    else:
+        grouped = values.groupby(np.asarray(groups))
+        mean, std = grouped.transform("mean"), grouped.transform("std")
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # nan scores compare as False
+        return ((values - mean) / std).abs().to_numpy() < z
+
+
+def iter_chunks(f_name: str, chunk_size=CHUNK_SIZE, fields: Sequence[str] = None) -> Iterator[List[dict]]:
+    """
+    Parses a JSONL file and yields its rows in lists of at most chunk_size. If fields are given only those keys are
+    decoded.
+    """
+    chunk = []
+    with open(f_name, "rb") as f:
+        for batch in jsonl.read_batches(f, fields):
+            chunk.extend(batch)
+            while len(chunk) >= chunk_size:
+                yield chunk[:chunk_size]
+                chunk = chunk[chunk_size:]
+    if len(chunk) > 0:
+        yield chunk
+
+
+def filtered_chunks(f_name: str, keep: Callable[[List[dict]], np.ndarray] = None, chunk_size=CHUNK_SIZE,
+                    fields: Sequence[str] = None) -> Iterator[List[dict]]:
+    """
+    Like iter_chunks, leaving out the rows keep rejects if it is given.
+    """
+    for chunk in iter_chunks(f_name, chunk_size, fields):
+        if keep is not None:
+            chunk = [d for d, k in zip(chunk, keep(chunk)) if k]
+        yield chunk
+
+
+def z_score_filter(f_name: str, col_name: str, z=3.0, per_date=False,
+                   chunk_size=CHUNK_SIZE) -> Callable[[List[dict]], np.ndarray]:
+    """
+    First pass of the streaming outlier filter. Computes the moments of col_name chunk by chunk, either over the whole
+    file or per date, and returns a function that flags which rows of a chunk lie within z standard deviations. Rows
+    whose group has no spread, i.e. a single row or only equal values, have no z-score and are dropped, as
+    remove_outlier drops them.
+    """
+    overall = RunningStats()
+    by_date = {}
+    for chunk in iter_chunks(f_name, chunk_size, ["date", col_name]):
+        values = np.array([d[col_name] for d in chunk], dtype=np.float64)
+        if per_date:
+            dates = np.array([d["date"] for d in chunk], dtype=object)
+            for date in set(dates):
+                by_date.setdefault(date, RunningStats()).update(values[dates == date])
+        else:
+            overall.update(values)
+
+    def stats_for(chunk: List[dict]) -> Dict[str, np.ndarray]:
+        if not per_date:
+            return {"mean": np.full(len(chunk), overall.mean()), "std": np.full(len(chunk), overall.std())}
+        stats = [by_date.get(d["date"], RunningStats()) for d in chunk]
+        return {"mean": np.array([s.mean() for s in stats]), "std": np.array([s.std() for s in stats])}
+
+    def keep(chunk: List[dict]) -> np.ndarray:
+        stats = stats_for(chunk)
+        values = np.array([d[col_name] for d in chunk], dtype=np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scores = np.abs((values - stats["mean"]) / stats["std"])
+        # nan scores compare as False
+        return scores < z
+
+    return keep
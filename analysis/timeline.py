@@ -0,0 +1,147 @@
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+PREFIX = "timeline"
+
+
+def parse_times(chunk: List[dict]) -> np.ndarray:
+    """
+    Timestamps of the rows as UTC datetime64[ns]. Rows analyzed before created_at was written, and media articles,
+    only carry their date and fall at midnight.
+    """
+    raw = [d.get("created_at") or d["date"] for d in chunk]
+    return np.array([x.rstrip("Z").replace(" ", "T") for x in raw], dtype="datetime64[ns]")
+
+
+class Timeline:
+    """
+    Sentiment count, mean and M2 of every non-empty time bucket in time order, each bucket labelled by its start.
+    """
+
+    def __init__(self, times: np.ndarray, moments: np.ndarray):
+        self.times = times
+        self.moments = moments
+
+    def __len__(self):
+        return len(self.times)
+
+    def counts(self) -> np.ndarray:
+        return self.moments[:, 0]
+
+    def means(self) -> np.ndarray:
+        return self.moments[:, 1]
+
+    def stds(self) -> np.ndarray:
+        counts = self.moments[:, 0]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(counts > 1, np.sqrt(self.moments[:, 2] / (counts - 1)), np.nan)
+
+    def window(self, lo=None, hi=None) -> slice:
+        """
+        The buckets starting within [lo, hi], either bound may be left open.
+        """
+        start = 0 if lo is None else np.searchsorted(self.times, np.datetime64(lo, 'ns'), side='left')
+        stop = len(self.times) if hi is None else np.searchsorted(self.times, np.datetime64(hi, 'ns'), side='right')
+        return slice(int(start), int(stop))
+
+    def to_arrays(self, prefix: str) -> Dict[str, np.ndarray]:
+        return {
+            "{}/times".format(prefix): self.times.astype(np.int64),
+            "{}/moments".format(prefix): self.moments
+        }
+
+    @staticmethod
+    def from_arrays(arrays: Dict[str, np.ndarray], prefix: str) -> 'Timeline':
+        return Timeline(arrays["{}/times".format(prefix)].view("datetime64[ns]"), arrays["{}/moments".format(prefix)])
+
+
+def bucket_moments(times: np.ndarray, values: np.ndarray, step: int) -> pd.DataFrame:
+    """
+    Count, mean and M2 of the values per bucket of step nanoseconds, indexed by the bucket start in nanoseconds.
+    """
+    buckets = times.astype(np.int64) // step * step
+    grouped = pd.Series(values).groupby(buckets)
+    stats = pd.DataFrame({"count": grouped.count(), "mean": grouped.mean(), "m2": grouped.var(ddof=0)})
+    stats["m2"] *= stats["count"]
+    return stats
+
+
+def merge_moments(parts: List[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Combines per-chunk bucket moments with Chan et al.'s parallel update, vectorized over the buckets.
+    """
+    parts = pd.concat(parts)
+    parts["total"] = parts["count"] * parts["mean"]
+    grouped = parts.groupby(level=0)
+    count = grouped["count"].sum()
+    mean = grouped["total"].sum() / count
+    parts["m2"] += parts["count"] * (parts["mean"] - mean.reindex(parts.index).to_numpy()) ** 2
+    return pd.DataFrame({"count": count, "mean": mean, "m2": parts.groupby(level=0)["m2"].sum()})
+
+
+class TimelineBuilder:
+    """
+    Collects the sentiment of analyzed rows chunk by chunk into moments per bucket of step nanoseconds. Like
+    df_by_date it leaves out 2021-05-07.
+    """
+
+    def __init__(self, step: int):
+        self.step = step
+        self.parts = []
+
+    def add(self, chunk: List[dict]):
+        chunk = [d for d in chunk if d["date"] != '2021-05-07']
+        if len(chunk) > 0:
+            self.add_rows(parse_times(chunk), np.array([d["sentiment"] for d in chunk], dtype=np.float64))
+
+    def add_rows(self, times: np.ndarray, values: np.ndarray):
+        """
+        Adds rows already parsed into timestamps and sentiments, which are taken as they are.
+        """
+        if len(times) > 0:
+            self.parts.append(bucket_moments(times, values, self.step))
+
+    def timeline(self) -> Timeline:
+        if len(self.parts) == 0:
+            return Timeline(np.zeros(0, dtype="datetime64[ns]"), np.zeros((0, 3)))
+        stats = merge_moments(self.parts)
+        return Timeline(stats.index.to_numpy().astype(np.int64).view("datetime64[ns]"),
+                        np.ascontiguousarray(stats[["count", "mean", "m2"]].to_numpy(dtype=np.float64)))
+
+
+def timeline_arrays(timelines: Dict[str, Timeline]) -> Dict[str, np.ndarray]:
+    arrays = {}
+    for name, timeline in timelines.items():
+        arrays.update(timeline.to_arrays("{}/{}".format(PREFIX, name)))
+    return arrays
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-triangle-three-buckets downsampling (Steinarsson, 2013). Keeps the first and last point and, from each of
+    threshold - 2 equal buckets in between, the point forming the largest triangle with the point kept from the
+    previous bucket and the average of the next one. Returns the indices of the kept points.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64) - x[0]
+    y = np.asarray(y, dtype=np.float64)
+    edges = (np.arange(threshold - 1) * ((n - 2) / (threshold - 2))).astype(np.int64) + 1
+    edges[-1] = n - 1
+    # Average point of every bucket, with the last point standing in for the bucket after the last
+    sizes = np.diff(edges)
+    avg_x = np.append(np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / sizes, x[-1])
+    avg_y = np.append(np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / sizes, y[-1])
+
+    kept = np.zeros(threshold, dtype=np.int64)
+    kept[-1] = n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs((x[a] - avg_x[i + 1]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y[i + 1] - y[a]))
+        a = lo + int(np.argmax(area))
+        kept[i + 1] = a
+    return kept
@@ -1,109 +1,33 @@
+import functools
+import json
 import random
-from typing import Dict
+import threading
 
 import dash
+import pandas as pd
+import dash_core_components as dcc
 import dash_html_components as html
 import dash_bootstrap_components as dbc
-import numpy as np
-import pandas as pd
-import json
-import nltk
-from nltk.corpus import stopwords
+from dash.dependencies import Input, Output, State, MATCH
+from dash.exceptions import PreventUpdate
 import config as conf
 
 import components
 import config
+from analysis import aggregate, dashboard_data, live, shared_data, snapshot
+from components import figure_cache
 from scraping import import_tweets
 import text
 
 app = dash.Dash(__name__, external_stylesheets=[dbc.themes.UNITED])
 EXPERT_AI_FAVICON = "https://developer.expert.ai/ui/faviconExpert.ico"
 
-
-def import_data(f_name: str):
-    data = {}
-    with open(f_name, "r") as f:
-        for line in f.readlines():
-            d = json.loads(line)
-            for (k, v) in d.items():
-                if k == "bias":
-                    continue
-                if k not in data.keys():
-                    data[k] = [v]
-                else:
-                    data[k].append(v)
-    return pd.DataFrame(data)
-
-
-def remove_outlier(df_in, col_name):
-    """Uses z-score"""
-    return df_in[((df_in[col_name] - df_in[col_name].mean()) / df_in[col_name].std()).abs() < 3]
-
-
-media_df = import_data("analyzed_media.json")
-twitter_df = remove_outlier(import_data("analyzed_tweets.json"), 'sentiment')
-
 tags = []
 tags.extend([("n", x) for x in import_tweets.get_hashtags(conf.NEUTRAL_HASHTAGS)])
 tags.extend([("i", x) for x in import_tweets.get_hashtags(conf.PRO_ISRAEL_HASHTAGS)])
 tags.extend([("p", x) for x in import_tweets.get_hashtags(conf.PRO_PALESTINE_HASHTAGS)])
 random.shuffle(tags)
 
-try:
-    nltk.data.find('corpora/stopwords')
-except LookupError:
-    nltk.download('stopwords')
-
-stop_words = set(stopwords.words('english'))
-
-
-def df_by_date(df_to_sort) -> Dict[str, Dict[str, any]]:
-    dict_by_date = {}
-    for d, g in df_to_sort.sort_values(['date']).groupby('date'):
-        if d == '2021-05-07':
-            continue
-        all_kps = {}
-        e_traits = {}
-        b_traits = {}
-        for kps in g['key_phrases']:
-            for k, v in kps.items():
-                if '@' in k or v in stop_words or len(k) < 4:
-                    continue
-                if k not in all_kps.keys():
-                    all_kps[k] = [v]
-                else:
-                    all_kps[k].append(v)
-        for k, v in all_kps.items():
-            all_kps[k] = np.mean(v)
-        for kps in g['emotional_traits']:
-            for k, v in kps.items():
-                if k not in e_traits.keys():
-                    e_traits[k] = [v]
-                else:
-                    e_traits[k].append(v)
-        for k, v in e_traits.items():
-            e_traits[k] = np.mean(v)
-        for kps in g['behavioral_traits']:
-            for k, v in kps.items():
-                if k not in b_traits.keys():
-                    b_traits[k] = [v]
-                else:
-                    b_traits[k].append(v)
-        for k, v in b_traits.items():
-            b_traits[k] = np.mean(v)
-
-        kp_entry = dict(sorted(all_kps.items(), key=lambda item: item[1], reverse=True))
-        e_entry = dict(sorted(e_traits.items(), key=lambda item: item[1], reverse=True))
-        b_entry = dict(sorted(b_traits.items(), key=lambda item: item[1], reverse=True))
-
-        dict_by_date[d] = {
-            "sentiment": g['sentiment'],
-            "key_phrases": kp_entry,
-            "emotional_traits": e_entry,
-            "behavioral_traits": b_entry
-        }
-    return dict_by_date
-
 
 def make_tag_item(af, tag):
     body = dbc.CardBody(html.P(tag, className="card-text"))
@@ -115,8 +39,149 @@ def make_tag_item(af, tag):
         return dbc.Card(body, color="info", className="mb-2", inverse=True)
 
 
-twitter_info = df_by_date(twitter_df)
-media_info = df_by_date(media_df)
+figures = {}
+served_generation = None
+if conf.REFRESH_SECONDS > 0:
+    # A single process keeps the snapshot up to date with the analyzed files and every worker reloads it when it changes
+    live.ensure_started()
+    served_generation = snapshot.generation(conf.SNAPSHOT_PATH)
+    shared_arrays, figures = snapshot.load(conf.SNAPSHOT_PATH, check_sources=False)
+elif snapshot.current(conf.SNAPSHOT_PATH):
+    shared_arrays, figures = snapshot.load(conf.SNAPSHOT_PATH)
+else:
+    shared_arrays = shared_data.attach()
+if shared_arrays is not None:
+    twitter_info, media_info, range_idx, timelines = dashboard_data.from_arrays(shared_arrays)
+else:
+    twitter_info, media_info, range_idx, timelines = dashboard_data.load()
+if conf.FIGURE_CACHE_PATH:
+    # Figures are rebuilt only when the aggregates they are drawn from changed since any worker last built them
+    cache = figure_cache.FigureCache(conf.FIGURE_CACHE_PATH, conf.FIGURE_CACHE_BYTES)
+    digest = figure_cache.digest_info(twitter_info) + figure_cache.digest_info(media_info)
+    for name, build in [("sentiment-graph", components.sentiment_figure),
+                        ("sim-graph", components.similarity_figure)]:
+        if name not in figures.keys():
+            figures[name] = cache.get(name, digest, functools.partial(build, twitter_info, media_info))
+
+live_lock = threading.Lock()
+
+
+def sync_live():
+    """
+    Swaps in the latest snapshot if the live refresh wrote one since this worker loaded it. A snapshot that cannot be
+    read, e.g. while it is being swapped, is picked up on a later call.
+    """
+    global twitter_info, media_info, range_idx, timelines, figures, served_generation
+    if conf.REFRESH_SECONDS <= 0:
+        return
+    with live_lock:
+        try:
+            generation = snapshot.generation(conf.SNAPSHOT_PATH)
+            if generation == served_generation:
+                return
+            arrays, new_figures = snapshot.load(conf.SNAPSHOT_PATH, check_sources=False)
+        except (OSError, ValueError) as e:
+            print("Warning, could not reload snapshot {} ({}), retrying later".format(conf.SNAPSHOT_PATH, e))
+            return
+        twitter_info, media_info, range_idx, timelines = dashboard_data.from_arrays(arrays)
+        figures, served_generation = new_figures, generation
+        render_word_list.cache_clear()
+        word_list_items.cache_clear()
+
+
+if conf.REFRESH_SECONDS > 0:
+    @app.callback([Output('sentiment-graph', 'figure'), Output('sim-graph', 'figure'),
+                   Output('refresh-generation', 'data')],
+                  [Input('refresh-interval', 'n_intervals')], [State('refresh-generation', 'data')])
+    def refresh_figures(n_intervals, shown_generation):
+        # Each page remembers the generation it shows, so that every open page picks up an update and not only the
+        # first one to poll a worker after it reloaded
+        sync_live()
+        if served_generation == shown_generation:
+            raise PreventUpdate
+        return figures["sentiment-graph"], figures["sim-graph"], served_generation
+
+
+@functools.lru_cache(maxsize=conf.TAB_CACHE_SIZE)
+def render_word_list(key: str, d: str):
+    if "word-lists/{}/{}".format(key, d) in figures:
+        return figures["word-lists/{}/{}".format(key, d)]
+    return components.create_word_list_content(twitter_info, media_info, key, d, page_size=conf.LIST_PAGE_SIZE)
+
+
+@functools.lru_cache(maxsize=conf.TAB_CACHE_SIZE)
+def word_list_items(key: str, d: str, name: str) -> list:
+    if name == "twitter":
+        return list(twitter_info[d][key].items())
+    elif name == "media":
+        return list(media_info[d][key].items())
+    return list(components.date_similarity_dict(twitter_info, media_info, key, d).items())
+
+
+def register_word_list_callback(key: str):
+    @app.callback(Output('{}-content'.format(key), 'children'),
+                  [Input('{}-tabs'.format(key), 'active_tab'), Input('refresh-generation', 'data')])
+    def render_active_tab(d, generation):
+        if d is None:
+            raise PreventUpdate
+        sync_live()
+        return render_word_list(key, d)
+
+
+for score_key in aggregate.SCORE_KEYS:
+    register_word_list_callback(score_key)
+
+
+def word_list_id(kind: str) -> dict:
+    return {"type": kind, "key": MATCH, "date": MATCH, "list": MATCH}
+
+
+@app.callback([Output(word_list_id('word-list-page'), 'children'), Output(word_list_id('word-list-label'), 'children'),
+               Output(word_list_id('word-list-store'), 'data')],
+              [Input(word_list_id('word-list-prev'), 'n_clicks'), Input(word_list_id('word-list-next'), 'n_clicks')],
+              [State(word_list_id('word-list-store'), 'data')])
+def turn_word_list_page(prev_clicks, next_clicks, page):
+    triggered = dash.callback_context.triggered[0]
+    if triggered["value"] is None:
+        raise PreventUpdate
+    list_id = json.loads(triggered["prop_id"].rsplit(".", 1)[0])
+    items = word_list_items(list_id["key"], list_id["date"], list_id["list"])
+    step = 1 if list_id["type"] == "word-list-next" else -1
+    page = min(max((page or 0) + step, 0), components.page_count(len(items), conf.LIST_PAGE_SIZE) - 1)
+    return components.create_list_page(items, page, conf.LIST_PAGE_SIZE), \
+        components.page_label(page, len(items), conf.LIST_PAGE_SIZE), page
+
+
+@app.callback(Output('range-content', 'children'),
+              [Input('range-slider', 'value'), Input('range-stances', 'value'), Input('refresh-generation', 'data')])
+def render_range(window, stances, generation):
+    sync_live()
+    if window is None or len(range_idx.dates) == 0:
+        raise PreventUpdate
+    if stances and not range_idx.has_stances():
+        return html.P("No stance data: none of the analyzed tweets could be matched to the hashtags above.",
+                      className="text-center mt-2")
+    return components.create_range_content(range_idx.query(window[0], window[1], stances, conf.RANGE_TOP_N))
+
+
+@app.callback(Output('timeline-graph', 'figure'),
+              [Input('timeline-graph', 'relayoutData'), Input('refresh-generation', 'data')])
+def zoom_timeline(relayout, generation):
+    # Downsamples again for the visible range so that zooming in reveals the full resolution, and redraws it when the
+    # data was refreshed
+    refreshed = dash.callback_context.triggered[0]["prop_id"] == "refresh-generation.data"
+    relayout = relayout or {}
+    if "xaxis.range[0]" in relayout.keys():
+        lo, hi = pd.Timestamp(relayout["xaxis.range[0]"]), pd.Timestamp(relayout["xaxis.range[1]"])
+    elif "xaxis.range" in relayout.keys():
+        lo, hi = pd.Timestamp(relayout["xaxis.range"][0]), pd.Timestamp(relayout["xaxis.range"][1])
+    elif relayout.get("xaxis.autorange") or refreshed:
+        lo, hi = None, None
+    else:
+        raise PreventUpdate
+    sync_live()
+    return components.timeline_figure(timelines, lo, hi, conf.TIMELINE_MAX_POINTS)
+
 
 app.layout = html.Div(children=[
     dbc.NavbarSimple(
@@ -190,7 +255,11 @@ app.layout = html.Div(children=[
         *[html.P(children=x) for x in text.results_summary],
         html.H3(children='Sentiment Analysis'),
         *[html.P(children=x) for x in text.sentiment_paragraph],
-        components.create_sentiment_graph(twitter_info, media_info),
+        components.create_sentiment_graph(twitter_info, media_info, figures.get("sentiment-graph")),
+        html.P(
+            """The same sentiment at a finer granularity. Zooming in shows the full resolution of the selected range.
+            """),
+        components.create_timeline_graph(timelines, conf.TIMELINE_MAX_POINTS),
         html.H3(children='Key Phrases and Traits'),
         *[html.P(children=x) for x in text.phrases_trait_summary],
         html.Span("Legend", className="h5"),
@@ -207,16 +276,26 @@ app.layout = html.Div(children=[
         ], horizontal=True, className="mb-2"),
         dbc.Row(className="p-2"),
         *[html.P(children=x) for x in text.key_phrases_paragraph],
-        dbc.Tabs(components.create_word_lists(twitter_info, media_info, 'key_phrases')),
+        components.create_lazy_word_lists(list(twitter_info.keys()), 'key_phrases'),
         dbc.Row(className="p-2"),
         *[html.P(children=x) for x in text.e_traits_paragraph],
-        dbc.Tabs(components.create_word_lists(twitter_info, media_info, 'emotional_traits')),
+        components.create_lazy_word_lists(list(twitter_info.keys()), 'emotional_traits'),
         dbc.Row(className="p-2"),
         *[html.P(children=x) for x in text.b_traits_paragraph],
-        dbc.Tabs(components.create_word_lists(twitter_info, media_info, 'behavioral_traits')),
+        components.create_lazy_word_lists(list(twitter_info.keys()), 'behavioral_traits'),
+        dbc.Row(className="p-2"),
+        html.Span("Custom Range", className="h5"),
+        html.P(
+            """Aggregates the tweets of any range of days, optionally only those using the neutral, pro-Israel or 
+            pro-Palestine hashtags shown above.
+            """),
+        components.create_range_explorer(range_idx.dates),
+        *([html.P("The figures and lists follow newly analyzed tweets and articles, but days first analyzed after the "
+                  "dashboard started get their tabs and slider marks only once it is restarted.",
+                  className="text-muted small")] if conf.REFRESH_SECONDS > 0 else []),
         dbc.Row(className="p-2"),
         *[html.P(children=x) for x in text.sim_paragraph],
-        components.create_similarity_graph(twitter_info, media_info),
+        components.create_similarity_graph(twitter_info, media_info, figures.get("sim-graph")),
         html.H2(children='Conclusion'),
         *[html.P(children=x) for x in text.conclusion],
         html.H2(children='Future Work'),
@@ -236,7 +315,10 @@ app.layout = html.Div(children=[
             color="info",
             style={'margin': '2em 0em 1em 0em'}
         ),
-    ])
+    ]),
+    dcc.Interval(id='refresh-interval', interval=max(conf.REFRESH_SECONDS, 1) * 1000,
+                 disabled=conf.REFRESH_SECONDS <= 0),
+    dcc.Store(id='refresh-generation', data=served_generation),
 ])
 
 if __name__ == '__main__':
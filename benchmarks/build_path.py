@@ -0,0 +1,114 @@
+"""
+Times the stages of the dashboard build path on a directory of analyzed files, e.g. one written by
+benchmarks.generate_data, and reports the wall time and peak memory of each stage as JSON. Peak memory is measured with
+tracemalloc, which slows the stages down, so --no-trace can be given to only time them. Given a baseline report, stages
+that got slower or use more memory by more than the tolerance are listed and the exit code is 1.
+
+Usage: python -m benchmarks.build_path benchmarks/data/1000000 --out report.json --baseline old.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+
+import components
+from analysis import aggregate
+
+
+class Harness:
+
+    def __init__(self, trace=True):
+        self.trace = trace
+        self.stages = []
+
+    def run(self, name: str, f, *args):
+        if self.trace:
+            tracemalloc.start()
+        start = time.perf_counter()
+        out = f(*args)
+        seconds = time.perf_counter() - start
+        peak = None
+        if self.trace:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        self.stages.append({
+            "name": name,
+            "seconds": seconds,
+            "peak_bytes": peak,
+            # ru_maxrss is in kilobytes on Linux
+            "max_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        })
+        print("{:>36}: {:8.2f}s".format(name, seconds), file=sys.stderr)
+        return out
+
+
+def word_clouds(info: dict):
+    return [components.plotly_wordcloud(x[key]) for x in info.values() for key in aggregate.SCORE_KEYS
+            if len(x[key]) > 0]
+
+
+def run(path: str, trace=True) -> dict:
+    harness = Harness(trace)
+    tweets_file = os.path.join(path, aggregate.TWEETS_FILE)
+    media_file = os.path.join(path, aggregate.MEDIA_FILE)
+
+    twitter_df = harness.run("import_data/twitter", aggregate.import_data, tweets_file)
+    rows = len(twitter_df)
+    twitter_df = harness.run("remove_outlier", aggregate.remove_outlier, twitter_df, "sentiment")
+    twitter_info = harness.run("df_by_date/twitter", aggregate.df_by_date, twitter_df)
+    del twitter_df
+    media_df = harness.run("import_data/media", aggregate.import_data, media_file)
+    media_info = harness.run("df_by_date/media", aggregate.df_by_date, media_df)
+    del media_df
+    harness.run("create_similarity_graph", components.create_similarity_graph, twitter_info, media_info)
+    for key in aggregate.SCORE_KEYS:
+        harness.run("create_word_lists/{}".format(key), components.create_word_lists, twitter_info, media_info, key)
+    harness.run("plotly_wordcloud", word_clouds, twitter_info)
+
+    return {
+        "data": os.path.abspath(path),
+        "rows": rows,
+        "traced": trace,
+        "python": platform.python_version(),
+        "created": time.time(),
+        "stages": harness.stages
+    }
+
+
+def regressions(report: dict, baseline: dict, tolerance: float):
+    before = {s["name"]: s for s in baseline["stages"]}
+    for stage in report["stages"]:
+        old = before.get(stage["name"])
+        if old is None:
+            continue
+        for metric in ["seconds", "peak_bytes"]:
+            if stage[metric] is not None and old[metric] and stage[metric] > old[metric] * (1 + tolerance):
+                yield stage["name"], metric, old[metric], stage[metric]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("data", help="directory holding analyzed_tweets.json and analyzed_media.json")
+    parser.add_argument("--out", help="file to write the report to, defaults to stdout")
+    parser.add_argument("--no-trace", action="store_true", help="skip measuring peak memory with tracemalloc")
+    parser.add_argument("--baseline", help="earlier report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown or growth")
+    args = parser.parse_args()
+
+    report = run(args.data, trace=not args.no_trace)
+    if args.out is not None:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.baseline is not None:
+        with open(args.baseline, "r") as f:
+            found = list(regressions(report, json.load(f), args.tolerance))
+        for name, metric, old, new in found:
+            print("Regression in {} {}: {:.4g} -> {:.4g}".format(name, metric, old, new), file=sys.stderr)
+        sys.exit(1 if len(found) > 0 else 0)
@@ -0,0 +1,66 @@
+"""
+Compares deduplicating synthetic tweets in a dict, as dedup_datasets used to, with the external sort of
+scraping/dedup.py, reporting the wall time and peak traced memory of both and whether their output is identical.
+
+Usage: python -m benchmarks.dedup --records 1000000 --duplicates 0.3 --run-records 200000
+"""
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+from scraping import dedup
+
+
+def synthetic_tweets(records: int, duplicates: float, seed=0):
+    rng = np.random.default_rng(seed)
+    # Every record repeats an earlier id with the given probability, like overlapping hashtag queries
+    ids = np.arange(records)
+    repeat = rng.random(records) < duplicates
+    ids[repeat] = rng.integers(0, np.maximum(ids[repeat], 1))
+    for i, tweet_id in enumerate(ids.tolist()):
+        yield {"id": str(tweet_id), "author_id": str(tweet_id % 1000), "lang": "en",
+               "created_at": "2021-05-{:02d}T12:00:00.000Z".format(7 + tweet_id % 15),
+               "text": "tweet {} pulled as record {} #FreePalestine #IsraelUnderAttack".format(tweet_id, i)}
+
+
+def in_memory(records):
+    l = {}
+    for j in records:
+        l[j["id"]] = j
+    return list(l.values())
+
+
+def measure(f):
+    tracemalloc.start()
+    start = time.perf_counter()
+    out = f()
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return out, seconds, peak
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=1000000)
+    parser.add_argument("--duplicates", type=float, default=0.3, help="share of records repeating an earlier id")
+    parser.add_argument("--run-records", type=int, default=dedup.RUN_RECORDS)
+    args = parser.parse_args()
+
+    expected, seconds, peak = measure(lambda: in_memory(synthetic_tweets(args.records, args.duplicates)))
+    print("{:<10} {:>9} {:>12} {:>10}".format("method", "seconds", "peak MB", "records"))
+    print("{:<10} {:>9.2f} {:>12.1f} {:>10}".format("dict", seconds, peak / 2 ** 20, len(expected)))
+
+    # The output is compared record by record rather than kept, which would count against the external peak
+    def external():
+        same, n = True, 0
+        for n, (a, b) in enumerate(zip(dedup.dedup(synthetic_tweets(args.records, args.duplicates),
+                                                   run_records=args.run_records), expected), 1):
+            same = same and a == b
+        return same and n == len(expected), n
+
+    (same, n), seconds, peak = measure(external)
+    print("{:<10} {:>9.2f} {:>12.1f} {:>10}".format("external", seconds, peak / 2 ** 20, n))
+    print("Identical output: {}".format(same))
@@ -0,0 +1,64 @@
+"""
+Compares the loop based and vectorized df_by_date on synthetic frames.
+
+Usage: python -m benchmarks.df_by_date --rows 1000000 10000000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from analysis import aggregate
+
+
+def synthetic_frame(rows: int, vocab_size=200000, seed=0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    phrases = np.array(["phrase {}".format(i) for i in range(vocab_size)], dtype=object)
+    traits = np.array(["Anger", "Fear", "Joy", "Sadness", "Trust", "Disgust", "Surprise"], dtype=object)
+    # Key phrases follow Zipf's law over the vocabulary
+    zipf_p = 1.0 / np.arange(1, vocab_size + 1)
+    zipf_p /= zipf_p.sum()
+
+    def score_dicts(vocab, max_items, zipf):
+        lengths = rng.integers(0, max_items + 1, rows)
+        if zipf:
+            ids = rng.choice(len(vocab), lengths.sum(), p=zipf_p)
+        else:
+            ids = rng.integers(0, len(vocab), lengths.sum())
+        keys = np.split(vocab[ids], np.cumsum(lengths)[:-1])
+        values = np.split(np.round(rng.uniform(1, 100, lengths.sum()), 1), np.cumsum(lengths)[:-1])
+        return [dict(zip(k, v.tolist())) for k, v in zip(keys, values)]
+
+    return pd.DataFrame({
+        "date": np.array(["2021-05-{:02d}".format(d) for d in range(7, 22)], dtype=object)[rng.integers(0, 15, rows)],
+        "sentiment": rng.normal(0, 5, rows),
+        "key_phrases": score_dicts(phrases, 6, True),
+        "emotional_traits": score_dicts(traits, 3, False),
+        "behavioral_traits": score_dicts(traits, 3, False)
+    })
+
+
+def timed(f, *args):
+    start = time.perf_counter()
+    out = f(*args)
+    return out, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000000, 10000000])
+    parser.add_argument("--skip-loops", action="store_true", help="only time the vectorized implementation")
+    args = parser.parse_args()
+
+    for n in args.rows:
+        df = synthetic_frame(n)
+        vectorized, t_vec = timed(aggregate.df_by_date, df)
+        if args.skip_loops:
+            print("{:>10} rows: vectorized {:.2f}s".format(n, t_vec))
+            continue
+        loops, t_loops = timed(aggregate.df_by_date_loops, df)
+        same = all(list(loops[d][k].items()) == list(vectorized[d][k].items())
+                   for d in loops for k in aggregate.SCORE_KEYS) and list(loops) == list(vectorized)
+        print("{:>10} rows: loops {:.2f}s, vectorized {:.2f}s, speedup {:.1f}x, identical output: {}"
+              .format(n, t_loops, t_vec, t_loops / t_vec, same))
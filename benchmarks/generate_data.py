@@ -0,0 +1,107 @@
+"""
+Writes synthetic analyzed_tweets.json and analyzed_media.json files shaped like the output of analyze_tweets and
+analyze_media. Key phrases follow Zipf's law over the vocabulary and a small share of the tweets are sentiment outliers.
+Each size is written to <out>/<rows>/.
+
+Usage: python -m benchmarks.generate_data --rows 10000 1000000 10000000 --out benchmarks/data
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+
+from analysis import aggregate
+
+CHUNK_SIZE = 100000
+DATES = np.array(["2021-05-{:02d}".format(d) for d in range(7, 22)], dtype=object)
+EMOTIONAL_TRAITS = np.array(["Anger", "Fear", "Disgust", "Sadness", "Happiness", "Excitement", "Joy", "Love",
+                             "Hatred", "Trust", "Surprise", "Repulsion", "Anxiety"], dtype=object)
+BEHAVIORAL_TRAITS = np.array(["Violence", "Compassion", "Initiative", "Trust", "Sociality", "Courage", "Rationality",
+                              "Hostility", "Fairness", "Solidarity", "Protection", "Dishonesty"], dtype=object)
+STANCES = [[], ["n"], ["i"], ["p"], ["n", "i"], ["n", "p"]]
+
+
+def vocabulary(size: int) -> np.ndarray:
+    """
+    Phrases of one to three words plus some mentions and short words, which df_by_date filters out.
+    """
+    rng = np.random.default_rng(1)
+    words = np.array(["w{}".format(i) for i in range(max(size // 10, 10))], dtype=object)
+    phrases = [" ".join(words[rng.integers(0, len(words), rng.integers(1, 4))]) for _ in range(size)]
+    for i in range(0, size, 50):
+        phrases[i] = "@user{}".format(i)
+    for i in range(25, size, 100):
+        phrases[i] = "w{}".format(i % 10)
+    return np.array(phrases, dtype=object)
+
+
+class Generator:
+
+    def __init__(self, vocab_size=200000, seed=0):
+        self.rng = np.random.default_rng(seed)
+        self.phrases = vocabulary(vocab_size)
+        zipf = 1.0 / np.arange(1, vocab_size + 1)
+        self.cdf = np.cumsum(zipf / zipf.sum())
+
+    def score_dicts(self, n: int, vocab: np.ndarray, max_items: int, zipf: bool):
+        lengths = self.rng.integers(0, max_items + 1, n)
+        total = int(lengths.sum())
+        if zipf:
+            ids = np.minimum(np.searchsorted(self.cdf, self.rng.random(total)), len(vocab) - 1)
+        else:
+            ids = self.rng.integers(0, len(vocab), total)
+        splits = np.cumsum(lengths)[:-1]
+        keys = np.split(vocab[ids], splits)
+        values = np.split(np.round(self.rng.uniform(0.1, 100, total), 1), splits)
+        return [dict(zip(k, v.tolist())) for k, v in zip(keys, values)]
+
+    def rows(self, n: int, first_id: int, media: bool):
+        sentiment = self.rng.normal(0, 5, n)
+        outliers = self.rng.random(n) < 0.005
+        sentiment[outliers] = self.rng.choice([-1, 1], outliers.sum()) * self.rng.uniform(30, 100, outliers.sum())
+        columns = {
+            "date": DATES[self.rng.integers(0, len(DATES), n)],
+            "sentiment": np.round(sentiment, 2).tolist(),
+            "key_phrases": self.score_dicts(n, self.phrases, 12 if media else 6, True),
+            "emotional_traits": self.score_dicts(n, EMOTIONAL_TRAITS, 4, False),
+            "behavioral_traits": self.score_dicts(n, BEHAVIORAL_TRAITS, 4, False),
+        }
+        if media:
+            columns["url"] = ["https://news.example/{}".format(i) for i in range(first_id, first_id + n)]
+            columns["bias"] = self.rng.integers(-2, 3, n).tolist()
+        else:
+            columns["author_id"] = [str(x) for x in self.rng.integers(0, max(n // 5, 1), n)]
+            columns["id"] = [str(i) for i in range(first_id, first_id + n)]
+            columns["stances"] = [STANCES[i] for i in self.rng.integers(0, len(STANCES), n)]
+        keys = list(columns.keys())
+        return [dict(zip(keys, values)) for values in zip(*columns.values())]
+
+    def write(self, f_name: str, n: int, media=False):
+        with open(f_name, "w") as f:
+            for start in range(0, n, CHUNK_SIZE):
+                rows = self.rows(min(CHUNK_SIZE, n - start), start, media)
+                f.write("".join(json.dumps(d) + "\n" for d in rows))
+
+
+def generate(out: str, rows: int, media_rows: int, vocab_size=200000, seed=0):
+    os.makedirs(out, exist_ok=True)
+    generator = Generator(vocab_size, seed)
+    generator.write(os.path.join(out, aggregate.TWEETS_FILE), rows)
+    generator.write(os.path.join(out, aggregate.MEDIA_FILE), media_rows, media=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 1000000, 10000000])
+    parser.add_argument("--media-ratio", type=float, default=0.01, help="media articles per tweet")
+    parser.add_argument("--vocab", type=int, default=200000, help="number of distinct key phrases")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=os.path.join("benchmarks", "data"))
+    args = parser.parse_args()
+
+    for n in args.rows:
+        path = os.path.join(args.out, str(n))
+        print("Writing {} tweets to {}... ".format(n, path), end="", flush=True)
+        generate(path, n, max(int(n * args.media_ratio), 1), args.vocab, args.seed)
+        print("Success!")
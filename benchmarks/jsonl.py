@@ -0,0 +1,74 @@
+"""
+Measures the throughput in MB/s of reading and writing an analyzed tweets file through scraping/jsonl.py with every
+installed backend and the "auto" mix of them, for the stages of the pipeline: writing, full reads as import_data does,
+the date and sentiment projection of the outlier filter and the id projection of get_existing_ids. The first row is the
+line by line json.loads over readlines() the modules used before.
+
+Usage: python -m benchmarks.jsonl --rows 200000
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.df_by_date import synthetic_frame
+from scraping import jsonl
+
+
+def mb_per_second(f, n_bytes: int, repeat: int):
+    best, out = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = f()
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return n_bytes / 2 ** 20 / best, out
+
+
+def legacy_read(f_name: str):
+    with open(f_name, "r") as f:
+        return [json.loads(line) for line in f.readlines()]
+
+
+def projected(rows, fields):
+    return [{k: d[k] for k in fields} for d in rows]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rows = synthetic_frame(args.rows).to_dict("records")
+    for i, d in enumerate(rows):
+        d["id"] = str(1392000000000000000 + i)
+    stages = [("read all", None), ("read date,sentiment", ["date", "sentiment"]), ("read id", ["id"])]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        f_name = os.path.join(tmp, "analyzed_tweets.json")
+        with open(f_name, "w") as f:
+            for d in rows:
+                f.write(json.dumps(d) + "\n")
+        n_bytes = os.path.getsize(f_name)
+        print("{:.1f} MB, {} rows".format(n_bytes / 2 ** 20, len(rows)))
+        print("{:<10} {:<20} {:>8} {:>9}".format("backend", "stage", "MB/s", "correct"))
+        speed, out = mb_per_second(lambda: legacy_read(f_name), n_bytes, args.repeat)
+        print("{:<10} {:<20} {:>8.1f} {:>9}".format("readlines", "read all", speed, str(out == rows)))
+
+        for backend in jsonl.available() + ["auto"]:
+            jsonl.use(backend)
+            out_name = os.path.join(tmp, "{}.json".format(backend))
+
+            def write():
+                with open(out_name, "wb") as f:
+                    jsonl.write(f, rows)
+
+            speed, _ = mb_per_second(write, n_bytes, args.repeat)
+            print("{:<10} {:<20} {:>8.1f} {:>9}".format(backend, "write", speed,
+                                                        str(list(jsonl.read_file(out_name)) == rows)))
+            for stage, fields in stages:
+                speed, out = mb_per_second(lambda: list(jsonl.read_file(f_name, fields)), n_bytes, args.repeat)
+                expected = rows if fields is None else projected(rows, fields)
+                print("{:<10} {:<20} {:>8.1f} {:>9}".format(backend, stage, speed, str(out == expected)))
@@ -0,0 +1,50 @@
+"""
+Measures the payload size and throughput of /_dash-layout against a running server, e.g. one started with
+`gunicorn wsgi:server -c gunicorn.conf.py --bind 127.0.0.1:8050`.
+
+Usage: python -m benchmarks.layout --url http://127.0.0.1:8050 --requests 500 --threads 8
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+CASES = {
+    "identity": {"Accept-Encoding": "identity"},
+    "gzip": {"Accept-Encoding": "gzip"},
+    "br": {"Accept-Encoding": "br, gzip"},
+}
+
+
+def fetch(session: requests.Session, url: str, headers: dict):
+    # stream=True keeps requests from decoding the body, so the bytes on the wire are counted
+    r = session.get(url, headers=headers, stream=True)
+    body = r.raw.read(decode_content=False)
+    return r.status_code, len(body), r.headers.get("Content-Encoding", "identity"), r.headers.get("ETag")
+
+
+def run(url: str, headers: dict, n: int, threads: int):
+    sessions = [requests.Session() for _ in range(threads)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        results = list(pool.map(lambda i: fetch(sessions[i % threads], url, headers), range(n)))
+    return results, n / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8050")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+    url = "{}/_dash-layout".format(args.url.rstrip("/"))
+
+    for name, headers in CASES.items():
+        results, rps = run(url, headers, args.requests, args.threads)
+        status, size, encoding, etag = results[0]
+        print("{:>10}: {} {:>9} bytes ({}) {:8.1f} req/s".format(name, status, size, encoding, rps))
+        if etag is not None:
+            results, rps = run(url, {**headers, "If-None-Match": etag}, args.requests, args.threads)
+            status, size, _, _ = results[0]
+            print("{:>10}: {} {:>9} bytes (revalidated) {:8.1f} req/s".format(name, status, size, rps))
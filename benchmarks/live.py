@@ -0,0 +1,98 @@
+"""
+Checks that the live refresh arrives at the same dashboard data as a full build. Synthetic analyzed files are written
+in parts, with the last line of every part but the final one cut off as if it were still being written, and read
+incrementally after each part. The data built from what was read incrementally is compared with dashboard_data.load on
+the complete files, for both score layouts and both outlier filters, and the time of each update is reported.
+
+Usage: python -m benchmarks.live --rows 100000 --parts 4
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import config as conf
+from analysis import aggregate, dashboard_data, incremental
+from benchmarks import generate_data
+
+
+def same_scores(a: dict, b: dict) -> bool:
+    # Vocabulary ids are interned in another order when reading incrementally, so equal scores may be ordered
+    # differently and a cut through them may keep other items
+    return np.allclose(list(a.values()), list(b.values())) and \
+        all(np.isclose(a[k], b[k]) for k in a.keys() & b.keys())
+
+
+def same_info(a: dict, b: dict) -> bool:
+    if list(a.keys()) != list(b.keys()):
+        return False
+    for d in a.keys():
+        if len(a[d]["sentiment"]) != len(b[d]["sentiment"]) or \
+                not np.isclose(a[d]["sentiment"].mean(), b[d]["sentiment"].mean()):
+            return False
+        if not all(a[d][key].keys() == b[d][key].keys() and same_scores(a[d][key], b[d][key])
+                   for key in aggregate.SCORE_KEYS):
+            return False
+    return True
+
+
+def same_data(a: dashboard_data.DashboardData, b: dashboard_data.DashboardData) -> bool:
+    ok = same_info(a[0], b[0]) and same_info(a[1], b[1]) and a[2].dates == b[2].dates
+    for stances in [None, ["i"], ["n", "p"]]:
+        x, y = a[2].query(0, len(a[2].dates) - 1, stances), b[2].query(0, len(b[2].dates) - 1, stances)
+        ok = ok and x["count"] == y["count"] and np.isclose(x["mean"], y["mean"]) and \
+            all(same_scores(x[key], y[key]) for key in aggregate.SCORE_KEYS)
+    for name in ["twitter", "media"]:
+        ok = ok and np.array_equal(a[3][name].times, b[3][name].times) and \
+            np.allclose(a[3][name].moments, b[3][name].moments)
+    return ok
+
+
+def write_parts(f_name: str, rows: list, parts: int):
+    """
+    Appends the rows in parts, cut anywhere in a line, yielding after each part.
+    """
+    lines = "".join(json.dumps(d) + "\n" for d in rows)
+    cuts = [len(lines) * i // parts for i in range(1, parts)] + [len(lines)]
+    start = 0
+    for cut in cuts:
+        with open(f_name, "a") as f:
+            f.write(lines[start:cut])
+        start = cut
+        yield
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--parts", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    generator = generate_data.Generator(20000, args.seed)
+    tweets = generator.rows(args.rows, 0, media=False)
+    media = generator.rows(max(args.rows // 100, 1), 0, media=True)
+    step = pd.Timedelta(conf.TIMELINE_FREQ).value
+    print("{:<8} {:<9} {:>12} {:>9}".format("sparse", "per_date", "update secs", "correct"))
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        for sparse_scores in [False, True]:
+            for per_date in [False, True]:
+                conf.SPARSE_SCORES, conf.OUTLIER_PER_DATE = sparse_scores, per_date
+                for f_name in [aggregate.TWEETS_FILE, aggregate.MEDIA_FILE]:
+                    if os.path.isfile(f_name):
+                        os.remove(f_name)
+                state = incremental.IncrementalData(sparse_scores, step, per_date)
+                seconds = []
+                for _ in zip(write_parts(aggregate.TWEETS_FILE, tweets, args.parts),
+                             write_parts(aggregate.MEDIA_FILE, media, args.parts)):
+                    start = time.perf_counter()
+                    state.update()
+                    seconds.append(time.perf_counter() - start)
+                correct = same_data(state.data(), dashboard_data.load())
+                print("{:<8} {:<9} {:>12.3f} {:>9}".format(str(sparse_scores), str(per_date), np.mean(seconds),
+                                                            str(correct)))
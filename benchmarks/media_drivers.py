@@ -0,0 +1,118 @@
+"""
+Scrapes the date and text of the saved AP News pages in benchmarks/fixtures/apnews, served by a local HTTP server, the
+way import_media does, and compares starting a headless Firefox per page load as before with the DriverPool with one
+and with several drivers. Every case must find the expected date and paragraphs on every page. With --crash-every the
+pool's browser is killed before every so many loads and the load retried, which the pool has to recover from.
+
+Needs selenium, Firefox and geckodriver.
+Usage: python -m benchmarks.media_drivers --pages 30 --drivers 3 --max-pages 10
+"""
+import argparse
+import datetime as dt
+import functools
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from scraping import import_media
+from scraping.driver_pool import DriverPool
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "apnews")
+# Date shown on every fixture page
+EXPECTED = {
+    "israel-gaza-airstrikes.html": dt.datetime(2021, 5, 15),
+    "ceasefire-talks.html": dt.datetime(2021, 5, 19),
+    "sheikh-jarrah-protests.html": dt.datetime(2021, 5, 8),
+}
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def serve(port: int) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", port), functools.partial(QuietHandler, directory=FIXTURES))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def check(name: str, date: dt.datetime, text: str) -> bool:
+    with open(os.path.join(FIXTURES, name), "r") as f:
+        paragraphs = re.findall(r"<p>(.*?)</p>", f.read())
+    return date == EXPECTED[name] and text == "".join(" {}".format(p) for p in paragraphs)
+
+
+def fresh_drivers(pages):
+    # As before, a new browser for the date and another for the text
+    correct = True
+    for name, url in pages:
+        found = []
+        for scrape in [import_media.ap_date, import_media.ap_text]:
+            driver = import_media.configure_firefox_driver()
+            try:
+                found.append(scrape(driver, url))
+            finally:
+                driver.quit()
+        correct = correct and check(name, found[0], found[1])
+    return correct, len(pages) * 2
+
+
+def pooled(pages, drivers: int, max_pages: int, crash_every: int):
+    pool = DriverPool(import_media.configure_firefox_driver, drivers, max_pages)
+    counter = iter(range(len(pages) * 2))
+    lock = threading.Lock()
+
+    def load(scrape, url):
+        for attempt in range(2):
+            with lock:
+                i = next(counter, 0)
+            try:
+                with pool.driver() as driver:
+                    if crash_every > 0 and attempt == 0 and i % crash_every == crash_every - 1:
+                        driver.service.process.kill()
+                    return scrape(driver, url)
+            except Exception as e:
+                if attempt == 1:
+                    raise
+                print("Retrying {} after {}".format(url, type(e).__name__))
+
+    def scrape_page(page):
+        name, url = page
+        return check(name, load(import_media.ap_date, url), load(import_media.ap_text, url))
+
+    with pool, ThreadPoolExecutor(drivers) as executor:
+        correct = all(executor.map(scrape_page, pages))
+    return correct, pool.started
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--pages", type=int, default=30)
+    parser.add_argument("--drivers", type=int, default=3)
+    parser.add_argument("--max-pages", type=int, default=10, help="page loads after which a driver is replaced")
+    parser.add_argument("--crash-every", type=int, default=0, help="kill the browser before every so many loads")
+    args = parser.parse_args()
+
+    server = serve(args.port)
+    names = sorted(EXPECTED.keys())
+    pages = [(names[i % len(names)], "http://127.0.0.1:{}/{}?page={}".format(args.port, names[i % len(names)], i))
+             for i in range(args.pages)]
+    cases = [
+        ("new driver per load", lambda: fresh_drivers(pages)),
+        ("pool, 1 driver", lambda: pooled(pages, 1, args.max_pages, args.crash_every)),
+        ("pool, {} drivers".format(args.drivers), lambda: pooled(pages, args.drivers, args.max_pages,
+                                                                 args.crash_every)),
+    ]
+    try:
+        print("{:<22} {:>9} {:>9} {:>9}".format("case", "seconds", "browsers", "correct"))
+        for name, run in cases:
+            start = time.perf_counter()
+            correct, browsers = run()
+            print("{:<22} {:>9.2f} {:>9} {:>9}".format(name, time.perf_counter() - start, browsers, str(correct)))
+    finally:
+        server.shutdown()
@@ -0,0 +1,137 @@
+"""
+Local stand-in for the Twitter v2 full-archive search endpoint, /2/tweets/search/all. Every query matches a fixed
+number of synthetic tweets spread over SPAN, most of them in bursts of an hour or so, which are filtered by
+start_time (inclusive) and end_time (exclusive) and paginated newest first with next_token like the real API, after a
+configurable latency. Each bearer token has its own fixed rate limit window reported through the x-rate-limit-*
+headers, and requests over the limit get a 429.
+
+Usage: python -m benchmarks.mock_twitter --port 8081 --tweets 10000 --limit 300 --window 900
+Then point the puller at it with base_url="http://127.0.0.1:8081/2".
+"""
+import argparse
+import asyncio
+import bisect
+import random
+import time
+import zlib
+
+from aiohttp import web
+
+from scraping.import_tweets import MAX_RESULTS, REQUEST_CAP, REQUEST_WINDOW
+from scraping.puller import format_time, parse_time
+
+# Window within which the tweets of every query were posted, pass it to the puller as its window
+SPAN = ("2021-05-08T00:00:00Z", "2021-05-22T00:00:00Z")
+BURSTS = 5
+BURST_SHARE = 0.7
+BURST_SECONDS = 3600
+
+
+class MockTwitter:
+
+    def __init__(self, tweets_per_query=10000, limit=REQUEST_CAP, window=REQUEST_WINDOW, latency=0.2):
+        self.tweets_per_query = tweets_per_query
+        self.limit = limit
+        self.window = window
+        self.latency = latency
+        self.windows = {}
+        self.requests = 0
+        self.throttled = 0
+        self.times = {}
+
+    def rate_limit(self, token: str, now: float):
+        """
+        Counts a request against the token's current window. Returns whether it is allowed and the headers to send.
+        """
+        start, count = self.windows.get(token, (now, 0))
+        if now >= start + self.window:
+            start, count = now, 0
+        allowed = count < self.limit
+        if allowed:
+            count += 1
+        self.windows[token] = (start, count)
+        return allowed, {
+            "x-rate-limit-limit": str(self.limit),
+            "x-rate-limit-remaining": str(self.limit - count),
+            "x-rate-limit-reset": str(int(start + self.window) + 1)
+        }
+
+    def timeline(self, query: str):
+        """
+        Sorted posting times of the query's tweets, the ith of which is tweet i.
+        """
+        if query not in self.times.keys():
+            rng = random.Random(zlib.crc32(query.encode("utf-8")))
+            start, end = parse_time(SPAN[0]), parse_time(SPAN[1])
+            bursts = [rng.uniform(start, end) for _ in range(BURSTS)]
+            times = []
+            for _ in range(self.tweets_per_query):
+                if rng.random() < BURST_SHARE:
+                    t = rng.gauss(rng.choice(bursts), BURST_SECONDS)
+                else:
+                    t = rng.uniform(start, end)
+                times.append(min(max(int(t), start), end - 1))
+            self.times[query] = sorted(times)
+        return self.times[query]
+
+    def tweets(self, query: str, indices):
+        seed = zlib.crc32(query.encode("utf-8"))
+        times = self.timeline(query)
+        return [{
+            "id": "{}{:08d}".format(seed, i),
+            "author_id": str((seed + i) % 997),
+            "created_at": format_time(times[i]).replace("Z", ".000Z"),
+            "lang": "en",
+            "text": "tweet {} about {}".format(i, query)
+        } for i in indices]
+
+    async def search(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        token = request.headers.get("Authorization", "")[len("Bearer "):]
+        allowed, headers = self.rate_limit(token, time.time())
+        if not allowed:
+            self.throttled += 1
+            return web.json_response({"title": "Too Many Requests"}, status=429, headers=headers)
+        await asyncio.sleep(self.latency)
+        query = request.query["query"]
+        size = int(request.query.get("max_results", MAX_RESULTS))
+        times = self.timeline(query)
+        first = bisect.bisect_left(times, parse_time(request.query.get("start_time", SPAN[0])))
+        last = bisect.bisect_left(times, parse_time(request.query.get("end_time", SPAN[1])))
+        # Tweets come newest first and next_token is the number of matches already returned
+        lo = int(request.query.get("next_token", 0))
+        hi = min(lo + size, last - first)
+        data = self.tweets(query, range(last - 1 - lo, last - 1 - hi, -1))
+        meta = {"result_count": len(data)}
+        if hi < last - first:
+            meta["next_token"] = str(hi)
+        body = {
+            "data": data,
+            "includes": {"users": [{"id": d["author_id"], "verified": False} for d in data]},
+            "meta": meta
+        }
+        return web.json_response(body, headers=headers)
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/2/tweets/search/all", self.search)
+        return app
+
+
+async def start(mock: MockTwitter, port: int) -> web.AppRunner:
+    runner = web.AppRunner(mock.app())
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--tweets", type=int, default=10000, help="tweets matched by every query")
+    parser.add_argument("--limit", type=int, default=REQUEST_CAP, help="requests per token and window")
+    parser.add_argument("--window", type=float, default=REQUEST_WINDOW, help="rate limit window in seconds")
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds before each page is returned")
+    args = parser.parse_args()
+    web.run_app(MockTwitter(args.tweets, args.limit, args.window, args.latency).app(), host="127.0.0.1",
+                port=args.port)
@@ -0,0 +1,71 @@
+"""
+Pulls a set of queries from an in-process mock of the search endpoint (see benchmarks/mock_twitter.py) with different
+puller settings and reports the wall time, requests, 429s and whether every tweet arrived exactly once. The rate limit
+window is scaled down so that a run takes seconds; the fixed case paces requests like the blocking pull_data does and
+the sliced case also paginates time slices of each query in parallel, which pays off for few, dense queries.
+
+Usage: python -m benchmarks.puller --queries 6 --tweets 10000 --limit 30 --window 3
+       python -m benchmarks.puller --queries 1 --tweets 100000 --limit 300
+"""
+import argparse
+import asyncio
+import time
+from collections import Counter
+
+from benchmarks import mock_twitter
+from scraping import puller
+
+
+async def run_case(mock: mock_twitter.MockTwitter, port: int, queries, tokens, concurrency: int, min_interval: float,
+                   slices: int, slice_pages: int):
+    seen = Counter()
+
+    def count_page(query: str, res: dict):
+        seen.update(d["id"] for d in res.get("data", []))
+
+    p = puller.Puller(tokens, concurrency, base_url="http://127.0.0.1:{}/2".format(port), min_interval=min_interval,
+                      on_page=count_page, slices=slices, slice_pages=slice_pages, window=mock_twitter.SPAN)
+    mock.windows, mock.requests, mock.throttled = {}, 0, 0
+    start = time.perf_counter()
+    await p.run(queries)
+    seconds = time.perf_counter() - start
+    complete = len(seen) == len(queries) * mock.tweets_per_query and max(seen.values()) == 1
+    return seconds, mock.requests, mock.throttled, complete
+
+
+async def main(args):
+    mock = mock_twitter.MockTwitter(args.tweets, args.limit, args.window, args.latency)
+    runner = await mock_twitter.start(mock, args.port)
+    queries = ["#tag{}".format(i) for i in range(args.queries)]
+    tokens = [chr(ord("a") + i) for i in range(args.tokens)]
+    cases = [
+        ("fixed pacing, 1 token", ["a"], 1, args.window / args.limit, 1, 0),
+        ("async, 1 token", ["a"], args.concurrency, args.min_interval, 1, 0),
+        ("async, {} tokens".format(args.tokens), tokens, args.concurrency, args.min_interval, 1, 0),
+        ("sliced, {} tokens".format(args.tokens), tokens, args.concurrency, args.min_interval, args.slices,
+         args.slice_pages),
+    ]
+    try:
+        print("{:<24} {:>9} {:>9} {:>6} {:>9}".format("case", "seconds", "requests", "429s", "complete"))
+        for name, tokens, concurrency, min_interval, slices, slice_pages in cases:
+            seconds, requests, throttled, complete = await run_case(mock, args.port, queries, tokens, concurrency,
+                                                                    min_interval, slices, slice_pages)
+            print("{:<24} {:>9.2f} {:>9} {:>6} {:>9}".format(name, seconds, requests, throttled, str(complete)))
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--queries", type=int, default=6)
+    parser.add_argument("--tweets", type=int, default=10000, help="tweets matched by every query")
+    parser.add_argument("--limit", type=int, default=30, help="requests per token and window")
+    parser.add_argument("--window", type=float, default=3.0, help="rate limit window in seconds")
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds before each page is returned")
+    parser.add_argument("--min-interval", type=float, default=0.02, help="seconds between requests of one token")
+    parser.add_argument("--concurrency", type=int, default=6)
+    parser.add_argument("--tokens", type=int, default=3)
+    parser.add_argument("--slices", type=int, default=8, help="initial time slices per query in the sliced case")
+    parser.add_argument("--slice-pages", type=int, default=4, help="pages above which a slice is split")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,66 @@
+"""
+Reports how many queries the hashtag files are packed into, and compares the Aho-Corasick TagMatcher with a regex
+search per tag on synthetic tweets, in tweets/s, checking that both find the same tags.
+
+Usage: python -m benchmarks.tags --tweets 100000
+"""
+import argparse
+import random
+import re
+import time
+
+import config as conf
+from scraping.import_tweets import get_hashtags
+from scraping.tags import TagMatcher, batch_queries
+
+WORDS = ["the", "people", "of", "are", "under", "attack", "peace", "now", "stop", "war", "children", "news", "rt",
+         "today", "we", "stand", "with", "pray", "for", "and"]
+
+
+def synthetic_texts(tags, n: int, seed=0):
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(n):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(8, 30))]
+        for _ in range(rng.randint(0, 4)):
+            tag = rng.choice(tags)
+            words.insert(rng.randint(0, len(words)), "#" + (tag.upper() if rng.random() < 0.3 else tag))
+        texts.append(" ".join(words))
+    return texts
+
+
+def regex_match(patterns, text: str):
+    text = text.lower()
+    hits = sorted((m.end(), tag) for tag, p in patterns for m in p.finditer(text))
+    found = []
+    for _, tag in hits:
+        if tag not in found:
+            found.append(tag)
+    return found
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tweets", type=int, default=100000)
+    args = parser.parse_args()
+
+    files = {"n": conf.NEUTRAL_HASHTAGS, "i": conf.PRO_ISRAEL_HASHTAGS, "p": conf.PRO_PALESTINE_HASHTAGS}
+    tags = [tag for f_name in files.values() for tag in get_hashtags(f_name)]
+    for max_length in [512, 1024]:
+        print("{} hashtags in {} queries of at most {} characters".format(
+            len(tags), len(batch_queries(tags, max_length)), max_length))
+
+    matcher = TagMatcher.of_files({stance: "./assets/{}".format(f_name) for stance, f_name in files.items()})
+    patterns = [(tag, re.compile(r"(?<!\w){}(?!\w)".format(re.escape(tag)))) for tag in matcher.stances.keys()]
+    texts = synthetic_texts(tags, args.tweets)
+
+    start = time.perf_counter()
+    expected = [regex_match(patterns, t) for t in texts]
+    regex_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    found = [matcher.match(t) for t in texts]
+    matcher_seconds = time.perf_counter() - start
+    print("{:<14} {:>12}".format("method", "tweets/s"))
+    print("{:<14} {:>12.0f}".format("regex per tag", len(texts) / regex_seconds))
+    print("{:<14} {:>12.0f}".format("aho-corasick", len(texts) / matcher_seconds))
+    print("Identical tags: {}".format(found == expected))
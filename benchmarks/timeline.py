@@ -0,0 +1,64 @@
+"""
+Builds timeline figures from synthetic hourly sentiment, both from a freshly built Timeline and from one read back from
+its arrays as a snapshot or shared memory gives it, and reports the time and size of the serialized figure at full
+range and zoomed in. Every figure must serialize to a date x axis with ISO timestamps, the zoomed one with its range in
+the same representation, and never more than --max-points points per trace.
+
+Usage: python -m benchmarks.timeline --days 14 --rows 1000000 --freq 1min --max-points 2000
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+import components
+from analysis import timeline
+
+
+def synthetic(days: int, rows: int, freq: str, seed: int) -> timeline.Timeline:
+    rng = np.random.default_rng(seed)
+    start = np.datetime64("2021-05-08T00:00:00", "ns")
+    times = start + rng.integers(0, days * 86400, rows).astype("timedelta64[s]")
+    chunk = [{"date": str(t)[:10], "created_at": str(t)[:19] + "Z", "sentiment": float(v)}
+             for t, v in zip(times.astype("datetime64[s]"), rng.normal(0, 10, rows))]
+    builder = timeline.TimelineBuilder(pd.Timedelta(freq).value)
+    builder.add(chunk)
+    return builder.timeline()
+
+
+def check(figure: dict, lo, hi, max_points: int) -> bool:
+    xaxis = figure["layout"].get("xaxis", {})
+    ok = xaxis.get("type") == "date"
+    for trace in figure["data"]:
+        ok = ok and len(trace["x"]) <= max_points and all(isinstance(x, str) for x in trace["x"])
+    if lo is not None:
+        # Buckets are labelled by their start, so the first one may start up to a second before lo
+        ok = ok and all(lo.floor("s") <= pd.Timestamp(x) <= hi for trace in figure["data"] for x in trace["x"])
+        ok = ok and [pd.Timestamp(x) for x in xaxis.get("range", [])] == [lo, hi]
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=14)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--freq", default="1min")
+    parser.add_argument("--max-points", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    built = synthetic(args.days, args.rows, args.freq, args.seed)
+    arrays = timeline.timeline_arrays({"twitter": built, "media": built})
+    snapshot = {name: timeline.Timeline.from_arrays(arrays, "{}/{}".format(timeline.PREFIX, name))
+                for name in ["twitter", "media"]}
+    zoom = (pd.Timestamp("2021-05-10 06:00:00.250"), pd.Timestamp("2021-05-10 18:00:00"))
+    print("{:<10} {:<6} {:>9} {:>9} {:>9}".format("source", "range", "seconds", "bytes", "correct"))
+    for source, timelines in [("built", {"twitter": built, "media": built}), ("snapshot", snapshot)]:
+        for name, (lo, hi) in [("full", (None, None)), ("zoomed", zoom)]:
+            start = time.perf_counter()
+            serialized = components.timeline_figure(timelines, lo, hi, args.max_points).to_json()
+            seconds = time.perf_counter() - start
+            correct = check(json.loads(serialized), lo, hi, args.max_points)
+            print("{:<10} {:<6} {:>9.3f} {:>9} {:>9}".format(source, name, seconds, len(serialized), str(correct)))
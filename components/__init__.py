@@ -1,86 +1,92 @@
 import numpy as np
-import plotly as py
 import plotly.graph_objs as go
-import random
+import scipy.sparse as sp
 import dash_core_components as dcc
 import dash_html_components as html
 import dash_bootstrap_components as dbc
 import datetime as dt
 
-from typing import Dict
+from itertools import chain
+from typing import Dict, List
 
+from analysis import similarity, timeline
+from components import figure_cache, wordcloud
 
-def plotly_wordcloud(words: Dict[str, int]):
-    lower, upper = 15, 45
-    frequency = [((x - min(words.values())) / (max(words.values()) - min(words.values()))) * (upper - lower) + lower
-                 for x in words.values()]
 
-    if np.isnan(np.sum(frequency)):
-        frequency = [100]
+def plotly_wordcloud(words: Dict[str, float], k=wordcloud.TOP_K):
+    """
+    Creates a word cloud of the k highest scoring words. See wordcloud.wordcloud_figure.
+    """
+    return wordcloud.wordcloud_figure(words, k)
 
-    percent = list(map(lambda x: x / sum(frequency), frequency))
 
-    length = len(words.keys())
-    colors = [py.colors.DEFAULT_PLOTLY_COLORS[random.randrange(1, 10)] for _ in range(length)]
+def bin_edges(no_bins=6.0) -> np.ndarray:
+    """
+    Splits 0-100 into no_bins equal bins and returns their edges, stepping through them as the bins always have.
+    """
+    interval = 100.0 / float(no_bins)
+    edges = [0.0]
+    while edges[-1] < 100:
+        edges.append(edges[-1] + interval)
+    return np.array(edges)
 
-    xs = list(range(length))
-    ys = random.choices(range(length), k=length)
 
-    data = go.Scatter(
-        x=xs,
-        y=ys,
-        mode='text',
-        text=list(words.keys()),
-        hovertext=['{0} ({1})'.format(w, format(p, '.2%')) for w, _, p in zip(words, frequency, percent)],
-        hoverinfo='text',
-        textfont={'size': frequency, 'color': colors}
-    )
-    layout = go.Layout({
-        'xaxis': {'showgrid': False, 'showticklabels': False, 'zeroline': False},
-        'yaxis': {'showgrid': False, 'showticklabels': False, 'zeroline': False}
-    },
-        paper_bgcolor='rgba(0,0,0,0)',
-        plot_bgcolor='rgba(0,0,0,0)',
-        autosize=True,
-        margin={'t': 0.5, 'b': 0.5, 'l': 0, 'r': 0},
-    )
-    padding = 0.3
-    fig = go.Figure(
-        data=[data],
-        layout=layout,
-        layout_yaxis_range=[min(ys) - padding, max(ys) + padding],
-        layout_xaxis_range=[min(xs) - padding, max(xs) + padding]
-    )
+def bin_scores(info: dict, key: str, edges: np.ndarray = None) -> Dict[str, np.ndarray]:
+    """
+    Assigns the items of every date to the bins (edges[j], edges[j + 1]] in a single digitize pass. Returns the
+    dates, the items of all dates concatenated, the offsets of each date's items and the bin of every item, which is
+    -1 for scores outside all bins.
+    """
+    if edges is None:
+        edges = bin_edges()
+    edges = np.asarray(edges, dtype=np.float64)
+    lengths = np.array([len(x[key]) for x in info.values()], dtype=np.int64)
+    scores = np.fromiter(chain.from_iterable(x[key].values() for x in info.values()), dtype=np.float64,
+                         count=lengths.sum())
+    bins = np.digitize(scores, edges, right=True) - 1
+    bins[bins >= len(edges) - 1] = -1
+    return {
+        "dates": np.array(list(info.keys()), dtype=object),
+        "items": np.fromiter(chain.from_iterable(x[key].keys() for x in info.values()), dtype=object,
+                             count=lengths.sum()),
+        "offsets": np.concatenate([[0], np.cumsum(lengths)]),
+        "bins": bins.astype(np.int16),
+        "edges": edges
+    }
 
-    return fig
 
+def binned_lists(binned: Dict[str, np.ndarray], i: int) -> Dict[float, List[str]]:
+    """
+    Expands the bins of the i-th date of bin_scores into item lists keyed by the lower edge of each bin.
+    """
+    lo, hi = binned["offsets"][i], binned["offsets"][i + 1]
+    bins, items = binned["bins"][lo:hi], binned["items"][lo:hi]
+    lowers = binned["edges"][:-1].tolist()
+    order = np.argsort(bins, kind='stable')
+    counts = np.bincount(bins[bins >= 0], minlength=len(lowers))
+    # Items outside all bins sort first and are skipped
+    split = np.split(items[order][(bins < 0).sum():], np.cumsum(counts)[:-1])
+    return {lower: x.tolist() for lower, x in zip(lowers, split)}
 
-def bin_by_date(twitter_info: dict, key: str):
-    bins = {}
-    for d, x in twitter_info.items():
-        bins[d] = create_binned_lists(x[key])
-    return bins
+
+def bin_by_date(twitter_info: dict, key: str, edges: np.ndarray = None):
+    binned = bin_scores(twitter_info, key, edges)
+    return {d: binned_lists(binned, i) for i, d in enumerate(binned["dates"])}
 
 
 def create_binned_lists(info: dict, no_bins=6.0):
-    interval = 100.0 / float(no_bins)
-    bins = {}
-    i = 0
-    while i < 100:
-        bins[i] = []
-        for x, y in info.items():
-            if i + interval >= y > i:
-                bins[i].append(x)
-        i += interval
-    return bins
-
-
-def create_similarity_dict(xs, ys) -> Dict[str, float]:
-    sim = {}
-    for x, fx in xs:
-        for y, fy in ys:
-            if x == y:
-                sim[x] = np.abs(fx - fy)
+    return binned_lists(bin_scores({None: {"scores": info}}, "scores", bin_edges(no_bins)), 0)
+
+
+def create_similarity_dict(xs, ys, terms: List[str] = None) -> Dict[str, float]:
+    """
+    Scores the items found in both xs and ys by how close their scores are. Either takes iterables of (item, score)
+    pairs or two 1 x n sparse rows over a shared vocabulary, in which case terms maps column ids back to items.
+    """
+    if sp.issparse(xs):
+        return sparse_similarity_dict(xs, ys, terms)
+    ys = dict(ys)
+    sim = {x: np.abs(fx - ys[x]) for x, fx in xs if x in ys}
     # At this point, the lower the score the higher the match
     if len(sim) == 0:
         return sim
@@ -92,143 +98,369 @@ def create_similarity_dict(xs, ys) -> Dict[str, float]:
     return dict(sorted(sim.items(), key=lambda i: i[1], reverse=True))
 
 
-def create_sentiment_graph(twitter_info: dict, media_info: dict):
+def quartile_traces(name: str, info: dict, color: str, fill: str) -> List[go.Scatter]:
+    """
+    The median of each date as a dashed line over a band from the lower to the upper quartile.
+    """
+    dates = list(info.keys())
+    quartiles = np.array([np.asarray(x['sentiment'].quantile([0.25, 0.5, 0.75])) for x in info.values()]) \
+        .reshape(-1, 3)
+    return [
+        go.Scatter(name='{} Q1'.format(name), x=dates, y=quartiles[:, 0], mode='lines', line=dict(width=0),
+                   legendgroup=name, showlegend=False, hoverinfo='skip'),
+        go.Scatter(name='{} Interquartile Range'.format(name), x=dates, y=quartiles[:, 2], mode='lines',
+                   line=dict(width=0), fill='tonexty', fillcolor=fill, legendgroup=name),
+        go.Scatter(name='{} Median'.format(name), x=dates, y=quartiles[:, 1], mode='lines',
+                   line=dict(color=color, dash='dash'), legendgroup=name)
+    ]
+
+
+def sentiment_figure(twitter_info: dict, media_info: dict) -> go.Figure:
+    return go.Figure(
+        layout={
+            'title': 'Twitter vs Media Sentiment',
+            'xaxis_title': "Date",
+            'yaxis_title': "Sentiment",
+        },
+        data=[
+            *quartile_traces('Twitter', twitter_info, 'rgb(31, 119, 180)', 'rgba(31, 119, 180, 0.15)'),
+            *quartile_traces('Media', media_info, 'rgb(255, 127, 14)', 'rgba(255, 127, 14, 0.15)'),
+            go.Scatter(
+                name='Twitter Sentiment',
+                x=list(twitter_info.keys()),
+                y=[x['sentiment'].mean() for x in twitter_info.values()],
+                line=dict(color='rgb(31, 119, 180)'),
+                error_y=dict(
+                    array=[x['sentiment'].std() for x in twitter_info.values()],
+                    visible=True)
+            ),
+            go.Scatter(
+                name='Media Sentiment',
+                x=list(media_info.keys()),
+                y=[x['sentiment'].mean() for x in media_info.values()],
+                line=dict(color='rgb(255, 127, 14)'),
+                error_y=dict(
+                    array=[x['sentiment'].std() for x in media_info.values()],
+                    visible=True)
+            )
+        ]
+    )
+
+
+def sparse_similarity_dict(xs: sp.csr_matrix, ys: sp.csr_matrix, terms: List[str]) -> Dict[str, float]:
+    """
+    create_similarity_dict of two sparse rows. Ties are kept in the order of the items in xs, as with dicts.
+    """
+    common, xi, yi = np.intersect1d(xs.indices, ys.indices, assume_unique=True, return_indices=True)
+    if len(common) == 0:
+        return {}
+    order = np.argsort(xi, kind='stable')
+    common, xi, yi = common[order], xi[order], yi[order]
+    sim = np.abs(xs.data[xi].astype(np.float64) - ys.data[yi])
+    a, b = sim.min(), sim.max()
+    # Flip the match and make it from 0-100, all equal differences give nan as with dicts
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sim = (1.0 - ((sim - a) / (b - a))) * 100
+    return {terms[common[i]]: sim[i] for i in np.argsort(-sim, kind='stable')}
+
+
+def date_similarity_dict(twitter_info: dict, media_info: dict, key: str, d: str) -> Dict[str, float]:
+    """
+    create_similarity_dict of one date and key. Aggregates read from packed arrays over shared vocabularies are matched
+    as sparse rows on their ids, so only the matched items are decoded.
+    """
+    if hasattr(twitter_info, "shares_vocab") and hasattr(media_info, "shares_vocab") \
+            and twitter_info.shares_vocab(media_info):
+        terms = twitter_info.vocabs[key]
+        rows = []
+        for info in [twitter_info, media_info]:
+            ids, scores = info.row(info.index[d], key)
+            rows.append(sp.csr_matrix((scores, ids, [0, len(ids)]), shape=(1, len(terms))))
+        return create_similarity_dict(rows[0], rows[1], terms)
+    return create_similarity_dict(twitter_info[d][key].items(), media_info[d][key].items())
+
+
+def create_sentiment_graph(twitter_info: dict, media_info: dict, figure=None):
+    """
+    Creates the sentiment graph. A pre-built figure (e.g. from a snapshot) can be given to skip building it.
+    """
     return dcc.Graph(
         id='sentiment-graph',
-        figure=go.Figure(
-            layout={
-                'title': 'Twitter vs Media Sentiment',
-                'xaxis_title': "Date",
-                'yaxis_title': "Sentiment",
-            },
-            data=[
-                go.Scatter(
-                    name='Twitter Sentiment',
-                    x=list(twitter_info.keys()),
-                    y=[x['sentiment'].mean() for x in twitter_info.values()],
-                    error_y=dict(
-                        array=[x['sentiment'].std() for x in twitter_info.values()],
-                        visible=True)
-                ),
-                go.Scatter(
-                    name='Media Sentiment',
-                    x=list(media_info.keys()),
-                    y=[x['sentiment'].mean() for x in media_info.values()],
-                    error_y=dict(
-                        array=[x['sentiment'].std() for x in media_info.values()],
-                        visible=True)
-                )
-            ]
-        )
+        figure=figure if figure is not None else sentiment_figure(twitter_info, media_info)
     )
 
 
-def create_similarity_graph(twitter_info: dict, media_info: dict):
+def timeline_figure(timelines: Dict[str, timeline.Timeline], lo=None, hi=None, max_points=2000) -> go.Figure:
+    """
+    Plots the mean sentiment per time bucket of each timeline between lo and hi with WebGL, downsampled with LTTB to
+    at most max_points per trace so that the browser gets the same amount of data at any zoom level.
+    """
+    data = []
+    for name, color in [("Twitter", 'rgb(31, 119, 180)'), ("Media", 'rgb(255, 127, 14)')]:
+        t = timelines[name.lower()]
+        window = t.window(lo, hi)
+        times, means, counts = t.times[window], t.means()[window], t.counts()[window]
+        kept = timeline.lttb(times.astype(np.int64), means, max_points)
+        data.append(go.Scattergl(
+            name='{} Sentiment'.format(name),
+            # plotly serializes datetime64 as integer nanoseconds, which would not make a date axis
+            x=np.datetime_as_string(times[kept], unit='s'),
+            y=means[kept],
+            customdata=counts[kept],
+            mode='lines',
+            line=dict(color=color),
+            hovertemplate='%{y:.2f} (%{customdata:d} items)'
+        ))
+    layout = {
+        'title': 'Sentiment Timeline',
+        'xaxis_title': "Time (UTC)",
+        'yaxis_title': "Mean Sentiment",
+        'xaxis_type': 'date',
+        # Keeps the zoom when the downsampled figure for the visible range replaces the current one
+        'uirevision': 'timeline'
+    }
+    if lo is not None and hi is not None:
+        layout['xaxis_range'] = [np.datetime_as_string(np.datetime64(x, 'ns'), unit='ms') for x in [lo, hi]]
+    return go.Figure(layout=layout, data=data)
+
+
+def create_timeline_graph(timelines: Dict[str, timeline.Timeline], max_points=2000):
+    return dcc.Graph(
+        id='timeline-graph',
+        figure=timeline_figure(timelines, max_points=max_points)
+    )
+
+
+def similarity_figure(twitter_info: dict, media_info: dict) -> go.Figure:
     similarity_info = {
         'key_phrases': [],
         'emotional_traits': [],
         'behavioral_traits': []
     }
+    if hasattr(twitter_info, "shares_vocab"):
+        matches = {(key, d): date_similarity_dict(twitter_info, media_info, key, d)
+                   for key in similarity_info.keys() for d in twitter_info.keys()}
+    else:
+        matches = similarity.similarity_table(twitter_info, media_info, list(similarity_info.keys()))
     for key in similarity_info.keys():
         for d in twitter_info.keys():
-            sims = np.nanmean(
-                list(create_similarity_dict(twitter_info[d][key].items(), media_info[d][key].items()).values()))
+            sims = np.nanmean(list(matches[(key, d)].values()))
             similarity_info[key].append(np.nan_to_num(sims))
+    return go.Figure(
+        layout={
+            'title': 'Key Phrases and Trait Similarity',
+            'xaxis_title': "Date",
+            'yaxis_title': "Similarity",
+        },
+        data=[
+            go.Scatter(
+                name='Key Phrases',
+                x=list(twitter_info.keys()),
+                y=similarity_info['key_phrases']
+            ),
+            go.Scatter(
+                name='Emotional Traits',
+                x=list(twitter_info.keys()),
+                y=similarity_info['emotional_traits']
+            ),
+            go.Scatter(
+                name='Behavioral Traits',
+                x=list(twitter_info.keys()),
+                y=similarity_info['behavioral_traits']
+            )
+        ]
+    )
+
+
+def create_similarity_graph(twitter_info: dict, media_info: dict, figure=None):
     return dcc.Graph(
         id='sim-graph',
-        figure=go.Figure(
-            layout={
-                'title': 'Key Phrases and Trait Similarity',
-                'xaxis_title': "Date",
-                'yaxis_title': "Similarity",
-            },
-            data=[
-                go.Scatter(
-                    name='Key Phrases',
-                    x=list(twitter_info.keys()),
-                    y=similarity_info['key_phrases']
-                ),
-                go.Scatter(
-                    name='Emotional Traits',
-                    x=list(twitter_info.keys()),
-                    y=similarity_info['emotional_traits']
-                ),
-                go.Scatter(
-                    name='Behavioral Traits',
-                    x=list(twitter_info.keys()),
-                    y=similarity_info['behavioral_traits']
-                )
-            ]
-        )
+        figure=figure if figure is not None else similarity_figure(twitter_info, media_info)
     )
 
 
-def create_word_lists(twitter_info: dict, media_info: dict, key: str):
-    iter_obj = []
-    for d in twitter_info.keys():
-        iter_obj.append((d, twitter_info[d][key].items(), media_info[d][key].items()))
-
-    def make_list_item(text: str, freq: float):
-        if freq > 80:
-            col = "danger"
-        elif 80 >= freq > 60:
-            col = "warning"
-        elif 60 >= freq > 40:
-            col = "success"
-        elif 40 >= freq > 20:
-            col = "info"
-        else:
-            col = "secondary"
-        return dbc.ListGroupItem(text, color=col)
+def make_list_item(text: str, freq: float):
+    if freq > 80:
+        col = "danger"
+    elif 80 >= freq > 60:
+        col = "warning"
+    elif 60 >= freq > 40:
+        col = "success"
+    elif 40 >= freq > 20:
+        col = "info"
+    else:
+        col = "secondary"
+    return dbc.ListGroupItem(text, color=col)
+
 
+def word_list_title(key: str) -> str:
     if key == "key_phrases":
-        title = "Key Phrases"
+        return "Key Phrases"
     elif key == "emotional_traits":
-        title = "Emotional Traits"
+        return "Emotional Traits"
     else:
-        title = "Behavioral Traits"
+        return "Behavioral Traits"
+
+
+def tab_label(d: str) -> str:
+    return "{}-05".format(dt.datetime.fromisoformat(d).day)
 
+
+def page_count(total: int, page_size: int) -> int:
+    return max((total + page_size - 1) // page_size, 1)
+
+
+def create_list_page(items: list, page: int, page_size: int):
+    return dbc.ListGroup([make_list_item(x, f) for x, f in items[page * page_size:(page + 1) * page_size]],
+                         flush=True)
+
+
+def page_label(page: int, total: int, page_size: int) -> str:
+    return "{} / {}".format(page + 1, page_count(total, page_size))
+
+
+def create_word_list_column(key: str, d: str, name: str, items, page_size: int = None):
+    """
+    Creates one titled list. With a page_size only the first page is rendered, together with buttons whose callback
+    fetches further pages from the server. The pattern-matching ids of the parts carry the key, date and list name.
+    """
+    items = list(items)
+    if page_size is None:
+        return [html.H5(name, className="text-center"),
+                dbc.ListGroup([make_list_item(x, f) for x, f in items], flush=True)]
+    list_id = {"key": key, "date": d, "list": name.lower()}
+    return [
+        html.H5(name, className="text-center"),
+        html.Div(create_list_page(items, 0, page_size), id={"type": "word-list-page", **list_id}),
+        html.Div([
+            dbc.Button("‹", id={"type": "word-list-prev", **list_id}, size="sm", color="primary", outline=True),
+            html.Span(page_label(0, len(items), page_size), id={"type": "word-list-label", **list_id},
+                      className="mx-2"),
+            dbc.Button("›", id={"type": "word-list-next", **list_id}, size="sm", color="primary", outline=True),
+        ], className="text-center mt-2"),
+        dcc.Store(id={"type": "word-list-store", **list_id}, data=0)
+    ]
+
+
+def create_word_list_content(twitter_info: dict, media_info: dict, key: str, d: str, matches: dict = None,
+                             page_size: int = None):
+    """
+    Creates the Twitter, matches and media lists of a single date. The matches can be given if they were already
+    computed, e.g. by similarity.similarity_table. With a page_size the lists are paginated.
+    """
+    xs, ys = twitter_info[d][key].items(), media_info[d][key].items()
+    if matches is None:
+        matches = date_similarity_dict(twitter_info, media_info, key, d)
+    return dbc.Card([
+        dbc.CardBody([
+            html.H4(word_list_title(key), className="card-title text-center"),
+            dbc.Row([
+                dbc.Col(width="4", children=create_word_list_column(key, d, "Twitter", xs, page_size)),
+                dbc.Col(width="4", children=create_word_list_column(key, d, "Matches", matches.items(), page_size)),
+                dbc.Col(width="4", children=create_word_list_column(key, d, "Media", ys, page_size)),
+            ], justify="center", )
+        ], style={"maxHeight": "400px", "overflow": "scroll"}
+        ),
+    ])
+
+
+def create_word_lists(twitter_info: dict, media_info: dict, key: str):
+    matches = similarity.similarity_table(twitter_info, media_info, [key])
     return [
         dbc.Tab(
-            label="{}-05".format(dt.datetime.fromisoformat(d).day),
-            children=[
-                dbc.Card([
-                    dbc.CardBody([
-                        html.H4(title, className="card-title text-center"),
-                        dbc.Row([
-                            dbc.Col(width="4",
-                                    children=[html.H5("Twitter", className="text-center"),
-                                              dbc.ListGroup([make_list_item(x, f) for x, f in xs], flush=True)]
-                                    ),
-                            dbc.Col(width="4",
-                                    children=[html.H5("Matches", className="text-center"),
-                                              dbc.ListGroup([make_list_item(z, f)
-                                                             for z, f in create_similarity_dict(xs, ys).items()],
-                                                            flush=True)]
-                                    ),
-                            dbc.Col(width="4",
-                                    children=[html.H5("Media", className="text-center"),
-                                              dbc.ListGroup([make_list_item(y, f) for y, f in ys], flush=True)]
-                                    ),
-                        ], justify="center", )
-                    ], style={"maxHeight": "400px", "overflow": "scroll"}
-                    ),
-                ]),
-            ]
+            label=tab_label(d),
+            children=[create_word_list_content(twitter_info, media_info, key, d, matches[(key, d)])]
         )
-        for d, xs, ys in iter_obj
+        for d in twitter_info.keys()
     ]
 
 
-def create_wordcloud_tabs(twitter_info: dict, media_info: dict, key: str):
+def create_lazy_word_lists(dates: List[str], key: str):
+    """
+    Creates empty tabs for the given dates. The content of the active tab is rendered on demand by a callback that
+    outputs to '<key>-content'.
+    """
+    return html.Div([
+        dbc.Tabs(
+            [dbc.Tab(label=tab_label(d), tab_id=d) for d in dates],
+            id='{}-tabs'.format(key),
+            active_tab=dates[0] if len(dates) > 0 else None
+        ),
+        html.Div(id='{}-content'.format(key))
+    ])
+
+
+def create_range_explorer(dates: List[str]):
+    """
+    Creates the date range slider and stance filter. The aggregates of the selection are rendered by a callback that
+    outputs to 'range-content'.
+    """
+    return dbc.Card([
+        dbc.CardBody([
+            dcc.RangeSlider(
+                id='range-slider',
+                min=0,
+                max=max(len(dates) - 1, 0),
+                value=[0, max(len(dates) - 1, 0)],
+                marks={i: tab_label(d) for i, d in enumerate(dates)},
+                allowCross=False
+            ),
+            dbc.Checklist(
+                id='range-stances',
+                options=[
+                    {"label": "Neutral", "value": "n"},
+                    {"label": "Pro-Israel", "value": "i"},
+                    {"label": "Pro-Palestine", "value": "p"},
+                ],
+                value=[],
+                inline=True,
+                className="mt-4 text-center"
+            ),
+            html.Div(id='range-content')
+        ])
+    ], className="mb-2")
+
+
+def create_range_content(result: dict):
+    """
+    Shows the sentiment and top items of a RangeIndex query.
+    """
+    if result["count"] == 0:
+        return html.P("No tweets match this selection.", className="text-center mt-2")
+    return [
+        html.P("{} tweets, sentiment {:.2f} ± {:.2f}".format(result["count"], result["mean"],
+                                                            np.nan_to_num(result["std"])),
+               className="text-center mt-2"),
+        dbc.Row([
+            dbc.Col(width="4",
+                    children=[html.H5(word_list_title(key), className="text-center"),
+                              dbc.ListGroup([make_list_item(x, f) for x, f in result[key].items()], flush=True)]
+                    )
+            for key in ["key_phrases", "emotional_traits", "behavioral_traits"]
+        ], justify="center", style={"maxHeight": "400px", "overflow": "scroll"})
+    ]
+
+
+def create_wordcloud(source: str, key: str, d: str, words: Dict[str, float], cache: figure_cache.FigureCache = None):
+    figure_id = '{}-{}-{}-wordcloud'.format(source, key, d)
+    if cache is None:
+        return dcc.Graph(id=figure_id, figure=plotly_wordcloud(words))
+    return dcc.Graph(id=figure_id, figure=cache.get("wordcloud", figure_cache.digest_info({d: {key: words}}),
+                                                    lambda: plotly_wordcloud(words), k=wordcloud.TOP_K))
+
+
+def create_wordcloud_tabs(twitter_info: dict, media_info: dict, key: str, cache: figure_cache.FigureCache = None):
+    """
+    Creates a tab per date with the Twitter and media word clouds. If a cache is given the clouds are read from it
+    whenever the words of that date are unchanged.
+    """
     return [
         dbc.Tab(
             dbc.Card([
                 dbc.CardHeader("Twitter"),
                 dbc.CardBody(
                     dbc.Row([
-                        dbc.Col(dcc.Graph(id='twitter-{}-{}-wordcloud'.format(key, d),
-                                          figure=plotly_wordcloud(x[key])), width="12", lg="auto"),
+                        dbc.Col(create_wordcloud('twitter', key, d, x[key], cache), width="12", lg="auto"),
                         dbc.Col([
                             html.H5("Top Results"),
                             html.Ul(
@@ -241,8 +473,7 @@ def create_wordcloud_tabs(twitter_info: dict, media_info: dict, key: str):
                 dbc.CardHeader("Media"),
                 dbc.CardBody(
                     dbc.Row([
-                        dbc.Col(dcc.Graph(id='media-{}-{}-wordcloud'.format(key, d),
-                                          figure=plotly_wordcloud(y[key])), width="12", lg="auto"),
+                        dbc.Col(create_wordcloud('media', key, d, y[key], cache), width="12", lg="auto"),
                         dbc.Col([
                             html.H5("Top Results"),
                             html.Ul(
@@ -0,0 +1,100 @@
+from typing import Callable, Dict
+
+import hashlib
+import json
+import os
+
+import numpy as np
+import plotly
+import plotly.graph_objs as go
+
+# Bump whenever a figure builder changes its output for the same inputs
+CACHE_VERSION = 2
+
+
+def digest_info(info: Dict[str, Dict[str, any]]) -> str:
+    """
+    Hashes the output of df_by_date (or anything of the same shape) by content, so that equal aggregates give equal
+    digests in every process.
+    """
+    h = hashlib.sha256()
+    if hasattr(info, "arrays"):
+        # A PackedInfo is hashed straight from its arrays rather than decoded entry by entry
+        for name in sorted(info.arrays.keys()):
+            h.update(name.encode("utf-8") + b"\x00")
+            h.update(np.ascontiguousarray(info.arrays[name]))
+            h.update(b"\x01")
+        return h.hexdigest()
+    for d, x in info.items():
+        h.update(d.encode("utf-8") + b"\x00")
+        for key in sorted(x.keys()):
+            h.update(key.encode("utf-8") + b"\x00")
+            value = x[key]
+            if isinstance(value, dict):
+                h.update("\x00".join(value.keys()).encode("utf-8") + b"\x01")
+                h.update(np.fromiter(value.values(), dtype=np.float64, count=len(value)).tobytes())
+            elif hasattr(value, "to_arrays"):
+                # Sentiment summaries
+                for array in value.to_arrays():
+                    h.update(np.ascontiguousarray(array).tobytes() + b"\x01")
+            else:
+                h.update(np.ascontiguousarray(value.to_numpy(), dtype=np.float64).tobytes())
+    return h.hexdigest()
+
+
+class FigureCache:
+    """
+    Content-addressed cache of serialized figures in a directory. Entries are keyed by the figure's name, the digest of
+    its inputs and its parameters, written atomically so that workers can share the directory, and evicted least
+    recently used first once the directory grows past max_bytes.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(path, exist_ok=True)
+
+    def key(self, name: str, digest: str, **params) -> str:
+        spec = json.dumps({"name": name, "digest": digest, "params": params, "version": CACHE_VERSION,
+                           "plotly": plotly.__version__}, sort_keys=True)
+        return hashlib.sha256(spec.encode("utf-8")).hexdigest()
+
+    def get(self, name: str, digest: str, build: Callable[[], go.Figure], **params) -> dict:
+        """
+        Returns the cached figure as a dict, building and storing it first on a miss.
+        """
+        f_name = os.path.join(self.path, "{}.json".format(self.key(name, digest, **params)))
+        try:
+            with open(f_name, "r") as f:
+                figure = json.load(f)
+            # The modification time doubles as the last access time for eviction
+            os.utime(f_name)
+            return figure
+        except (FileNotFoundError, ValueError):
+            pass
+        serialized = build().to_json()
+        tmp_name = "{}.{}.tmp".format(f_name, os.getpid())
+        with open(tmp_name, "w") as f:
+            f.write(serialized)
+        os.replace(tmp_name, f_name)
+        self.evict()
+        return json.loads(serialized)
+
+    def evict(self):
+        entries = []
+        for entry in os.scandir(self.path):
+            if entry.name.endswith(".json"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, f_name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(f_name)
+            except FileNotFoundError:
+                pass
+            total -= size
@@ -0,0 +1,166 @@
+from typing import Dict, Tuple
+
+import random
+
+import numpy as np
+import plotly as py
+import plotly.graph_objs as go
+
+TOP_K = 100
+LOWER, UPPER = 15, 45
+# Smallest font size words are scaled down to, words that still do not fit are left out
+MIN_SIZE = 8
+WIDTH, HEIGHT = 640, 400
+# Rough text extents relative to the font size, in pixels
+CHAR_WIDTH = 0.6
+LINE_HEIGHT = 1.1
+CELL_SIZE = 4
+# Share of the canvas the words' boxes may cover before their sizes are scaled down to fit
+FILL = 0.45
+
+
+def scale_sizes(scores: np.ndarray, lower=LOWER, upper=UPPER) -> np.ndarray:
+    """
+    Linearly maps the scores onto font sizes between lower and upper. A lone word gets size 100 and words whose scores
+    are all equal get size upper.
+    """
+    lo, hi = scores.min(), scores.max()
+    if hi == lo:
+        return np.full(len(scores), 100.0 if len(scores) == 1 else float(upper))
+    return (scores - lo) / (hi - lo) * (upper - lower) + lower
+
+
+def fit_sizes(sizes: np.ndarray, lengths: np.ndarray, width=WIDTH, height=HEIGHT, fill=FILL) -> np.ndarray:
+    """
+    Scales the font sizes down, but not below MIN_SIZE, so that the boxes of all words cover at most fill of the
+    canvas.
+    """
+    area = (CHAR_WIDTH * lengths * sizes * LINE_HEIGHT * sizes).sum()
+    if area <= fill * width * height:
+        return sizes
+    return np.maximum(sizes * np.sqrt(fill * width * height / area), min(MIN_SIZE, sizes.min()))
+
+
+def top_words(words: Dict[str, float], k=TOP_K) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the k highest scoring words and their scores by descending score.
+    """
+    items = np.fromiter(words.keys(), dtype=object, count=len(words))
+    scores = np.fromiter(words.values(), dtype=np.float64, count=len(words))
+    if len(items) > k:
+        top = np.argpartition(-scores, k - 1)[:k]
+        items, scores = items[top], scores[top]
+    order = np.argsort(-scores, kind='stable')
+    return items[order], scores[order]
+
+
+class OccupancyGrid:
+    """
+    Marks which cells of the canvas are covered by placed words and keeps a summed-area table over them, so that
+    whether a box is free can be answered for every candidate position at once in constant time per position.
+    """
+
+    def __init__(self, width: int, height: int, cell_size=CELL_SIZE):
+        self.cell_size = cell_size
+        self.occupied = np.zeros((int(np.ceil(height / cell_size)), int(np.ceil(width / cell_size))), dtype=np.int32)
+        self.table = np.zeros((self.occupied.shape[0] + 1, self.occupied.shape[1] + 1), dtype=np.int32)
+
+    def find(self, points: np.ndarray, w: float, h: float):
+        """
+        Returns the top left cell of the first of the (x, y) centre points, in pixels, at which a w x h box fits
+        inside the canvas without covering an occupied cell, or None.
+        """
+        bw, bh = int(np.ceil(w / self.cell_size)), int(np.ceil(h / self.cell_size))
+        rows, cols = self.occupied.shape
+        if bw > cols or bh > rows:
+            return None
+        x0 = np.round(points[:, 0] / self.cell_size - bw / 2).astype(np.int64)
+        y0 = np.round(points[:, 1] / self.cell_size - bh / 2).astype(np.int64)
+        inside = (x0 >= 0) & (y0 >= 0) & (x0 + bw <= cols) & (y0 + bh <= rows)
+        x0, y0 = x0[inside], y0[inside]
+        t = self.table
+        covered = t[y0 + bh, x0 + bw] - t[y0, x0 + bw] - t[y0 + bh, x0] + t[y0, x0]
+        free = np.flatnonzero(covered == 0)
+        if len(free) == 0:
+            return None
+        return int(x0[free[0]]), int(y0[free[0]]), bw, bh
+
+    def occupy(self, x0: int, y0: int, bw: int, bh: int):
+        self.occupied[y0:y0 + bh, x0:x0 + bw] = 1
+        np.cumsum(np.cumsum(self.occupied, axis=0), axis=1, out=self.table[1:, 1:])
+
+
+def spiral(width=WIDTH, height=HEIGHT, spacing=CELL_SIZE) -> np.ndarray:
+    """
+    Points along an Archimedean spiral from the centre of the canvas, roughly spacing pixels apart along the curve and
+    between turns, stretched to the canvas' aspect ratio until it leaves the canvas.
+    """
+    b = spacing / (2 * np.pi)
+    aspect = width / height
+    # For r = b * theta the arc length up to theta is about b * theta^2 / 2
+    max_r = np.hypot(width / aspect, height) / 2
+    steps = int(max_r ** 2 / (2 * spacing * b)) + 1
+    theta = np.sqrt(2 * spacing * np.arange(steps) / b)
+    r = b * theta
+    return np.stack([width / 2 + aspect * r * np.cos(theta), height / 2 + r * np.sin(theta)], axis=1)
+
+
+def place(widths: np.ndarray, heights: np.ndarray, width=WIDTH, height=HEIGHT):
+    """
+    Places the boxes in the given order at the first point of the spiral where they fit. Returns the box centres in
+    pixels and which boxes found a place; the rest do not fit on the canvas.
+    """
+    grid = OccupancyGrid(width, height)
+    points = spiral(width, height)
+    xs, ys = np.zeros(len(widths)), np.zeros(len(widths))
+    placed = np.zeros(len(widths), dtype=bool)
+    for i, (w, h) in enumerate(zip(widths.tolist(), heights.tolist())):
+        found = grid.find(points, w, h)
+        if found is None:
+            continue
+        grid.occupy(*found)
+        x0, y0, bw, bh = found
+        xs[i], ys[i], placed[i] = (x0 + bw / 2) * grid.cell_size, (y0 + bh / 2) * grid.cell_size, True
+    return xs, ys, placed
+
+
+def wordcloud_figure(words: Dict[str, float], k=TOP_K, width=WIDTH, height=HEIGHT) -> go.Figure:
+    """
+    Lays out the top k words on a fixed width x height pixel canvas without overlaps, largest first. Sizes are scaled
+    down when the words would crowd the canvas and words that still do not fit are left out, so the figure stays the
+    same size whatever the size of the dict.
+    """
+    items, scores = top_words(words, k) if len(words) > 0 else (np.zeros(0, dtype=object), np.zeros(0))
+    lengths = np.array([len(w) for w in items.tolist()], dtype=np.float64)
+    sizes = fit_sizes(scale_sizes(scores), lengths, width, height) if len(scores) > 0 else np.zeros(0)
+    widths = CHAR_WIDTH * lengths * sizes
+    xs, ys, placed = place(widths, LINE_HEIGHT * sizes, width, height)
+    percent = sizes / sizes.sum() if len(sizes) > 0 else sizes
+    items, sizes, percent, xs, ys = items[placed], sizes[placed], percent[placed], xs[placed], ys[placed]
+    colors = [py.colors.DEFAULT_PLOTLY_COLORS[random.randrange(1, 10)] for _ in range(len(items))]
+
+    data = go.Scatter(
+        x=xs.tolist(),
+        y=ys.tolist(),
+        mode='text',
+        text=items.tolist(),
+        hovertext=['{0} ({1})'.format(w, format(p, '.2%')) for w, p in zip(items.tolist(), percent.tolist())],
+        hoverinfo='text',
+        textfont={'size': sizes.tolist(), 'color': colors}
+    )
+    layout = go.Layout({
+        'xaxis': {'showgrid': False, 'showticklabels': False, 'zeroline': False, 'fixedrange': True},
+        'yaxis': {'showgrid': False, 'showticklabels': False, 'zeroline': False, 'fixedrange': True}
+    },
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        width=width,
+        height=height,
+        margin={'t': 0, 'b': 0, 'l': 0, 'r': 0},
+    )
+    return go.Figure(
+        data=[data],
+        layout=layout,
+        layout_xaxis_range=[0, width],
+        layout_yaxis_range=[0, height]
+    )
@@ -0,0 +1,32 @@
+import config as conf
+
+shm = None
+owner = None
+
+
+def on_starting(server):
+    """
+    Builds the dashboard aggregates once in the master and shares them with every worker. With live refresh the
+    master instead starts the one process that keeps the snapshot up to date, which the workers load.
+    """
+    global shm, owner
+    from analysis import dashboard_data, live, shared_data, snapshot
+    if conf.REFRESH_SECONDS > 0:
+        server.log.info("Starting the live refresh of the dashboard snapshot")
+        owner = live.start()
+        return
+    if not conf.SHARED_DATA or snapshot.current(conf.SNAPSHOT_PATH):
+        # Workers memory-map the snapshot, which the page cache already shares between them
+        return
+    server.log.info("Building shared dashboard data")
+    shm = shared_data.publish(dashboard_data.to_arrays(dashboard_data.load()))
+    server.log.info("Published {} bytes of shared dashboard data".format(shm.size))
+
+
+def on_exit(server):
+    if owner is not None:
+        owner.terminate()
+        owner.wait()
+    if shm is not None:
+        from analysis import shared_data
+        shared_data.release(shm)
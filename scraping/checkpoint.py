@@ -0,0 +1,193 @@
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from scraping.segments import SegmentWriter
+
+import json
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+def fsync_file(f_name: str):
+    fd = os.open(f_name, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def slice_key(window: Tuple[str, str]) -> str:
+    return "{}/{}".format(*window)
+
+
+class Checkpoint:
+    """
+    Durable pagination progress of every query: the time window it was started with, the next_token after its last
+    committed page and whether it is done, together with the sizes of the output files at that commit. A page counts
+    as pulled only once its commit() is durable, so on open anything written to the output files after the last
+    commit is truncated away and every query resumes right after its last committed page. Segment writers are
+    synced on every commit and their index is kept with the progress, so that they roll back the same way. Committing
+    every commit_pages pages rather than every page lets the writers compress several pages into one frame, at the
+    cost of pulling the pages since the last commit again after a crash, so it defaults to every page. A query
+    that is paginated in time slices also keeps the window and next_token of each of its unfinished slices.
+    """
+
+    def __init__(self, path: str, files: List[str], writers: List[SegmentWriter] = (), commit_pages=1):
+        self.path = path
+        self.files = files
+        self.writers = writers
+        self.commit_pages = commit_pages
+        self.pending_pages = 0
+        self.queries = {}
+        self.sizes = {}
+        self.stores = {}
+        # A single thread makes the commits durable, so they are written in order
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    @staticmethod
+    def open(path: str, files: List[str], writers: List[SegmentWriter] = (), queries: Iterable[str] = None,
+             commit_pages=1) -> 'Checkpoint':
+        """
+        Loads the checkpoint and rolls the output back to its last commit if any of the given queries, or of all
+        recorded queries if none are given, was interrupted.
+        """
+        checkpoint = Checkpoint(path, files, writers, commit_pages)
+        if os.path.isfile(path):
+            with open(path, "r") as f:
+                state = json.load(f)
+            checkpoint.queries, checkpoint.sizes = state["queries"], state["sizes"]
+            checkpoint.stores = state.get("stores", {})
+            checkpoint.rollback(queries)
+        return checkpoint
+
+    def rollback(self, queries: Iterable[str] = None):
+        """
+        Truncates the output files to their sizes at the last commit if a pull of the given queries was interrupted.
+        Unfinished queries that are no longer requested, e.g. those of an earlier set of hashtags, are not resumed and
+        so do not force a rollback.
+        """
+        requested = set(self.queries.keys()) if queries is None else set(queries)
+        if all(q["done"] for name, q in self.queries.items() if name in requested):
+            return
+        for writer in self.writers:
+            if writer.path in self.stores.keys():
+                writer.restore(self.stores[writer.path])
+        for f_name, size in self.sizes.items():
+            actual = os.path.getsize(f_name) if os.path.isfile(f_name) else 0
+            if actual > size:
+                print("Discarding {} uncommitted bytes of {}".format(actual - size, f_name))
+                os.truncate(f_name, size)
+            elif actual < size:
+                print("Warning, {} is smaller than at the last checkpoint and was left as is".format(f_name))
+
+    def start(self, query: str, window: Tuple[Optional[str], Optional[str]]) -> dict:
+        """
+        Returns the progress of the query. An unfinished query continues with the window it was started with, since its
+        next_token is only valid for that search, while a finished one is only pulled again for a different window.
+        """
+        progress = self.queries.get(query)
+        if progress is None or (progress["done"] and tuple(progress["window"]) != tuple(window)):
+            progress = {"window": list(window), "next_token": None, "pages": 0, "done": False}
+            self.queries[query] = progress
+        return progress
+
+    def slices(self, query: str, initial: List[Tuple[str, str]]) -> List[Tuple[Tuple[str, str], Optional[str]]]:
+        """
+        Returns the window and next_token of every unfinished slice of a started query. The first time the initial
+        slices are recorded, unless the query was already being paginated as a whole, which then continues as one slice.
+        """
+        progress = self.queries[query]
+        if "slices" not in progress.keys():
+            if progress["next_token"] is not None:
+                pending = [(progress["window"], progress["next_token"])]
+            else:
+                pending = [(window, None) for window in initial]
+            progress["slices"] = {slice_key(window): {"window": list(window), "next_token": next_token}
+                                  for window, next_token in pending}
+            self.save()
+        return [(tuple(s["window"]), s["next_token"]) for s in progress["slices"].values()]
+
+    def commit(self, query: str, next_token: Optional[str], window: Tuple[str, str] = None,
+               children: Sequence[Tuple[str, str]] = ()) -> Future:
+        """
+        Records that the page before next_token was written. For a sliced query the window of the slice is given, along
+        with any slices it was split into after this page. Pages are committed in groups of commit_pages, see flush();
+        until then the page is only recorded in memory and the returned future is done right away.
+        """
+        progress = self.queries[query]
+        progress["pages"] += 1
+        if window is None:
+            progress["next_token"] = next_token
+            progress["done"] = next_token is None
+        else:
+            slices = progress["slices"]
+            if next_token is None:
+                del slices[slice_key(window)]
+            else:
+                slices[slice_key(window)]["next_token"] = next_token
+            for child in children:
+                slices[slice_key(child)] = {"window": list(child), "next_token": None}
+            progress["done"] = len(slices) == 0
+        self.pending_pages += 1
+        if self.pending_pages < self.commit_pages:
+            done = Future()
+            done.set_result(None)
+            return done
+        return self.flush()
+
+    def flush(self) -> Future:
+        """
+        Commits the pages recorded since the last commit. The progress and the output as of this call are staged right
+        away, while fsyncing and saving them is left to a background thread so that the caller is not blocked on the
+        disk. Commits become durable one after the other in the order they were made, and the returned future is done
+        once this one is.
+        """
+        self.pending_pages = 0
+        return self.executor.submit(self.persist, self.stage_output(), self.state())
+
+    def stage_output(self) -> list:
+        for f_name in self.files:
+            if os.path.isfile(f_name):
+                self.sizes[f_name] = os.path.getsize(f_name)
+        staged = []
+        for writer in self.writers:
+            index, files = writer.stage()
+            self.stores[writer.path] = index
+            staged.append((writer, index, files))
+        return staged
+
+    def persist(self, staged: list, state: str):
+        for f_name in self.files:
+            if os.path.isfile(f_name):
+                fsync_file(f_name)
+        for writer, index, files in staged:
+            writer.persist(index, files)
+        self.write(state)
+
+    def rebase(self):
+        """
+        Records the output as it is now as that of the last commit, after it was rewritten outside of a pull, e.g. by
+        compacting the stores. A later rollback would otherwise restore indexes whose segments no longer exist, which
+        removes every segment that replaced them.
+        """
+        self.save()
+
+    def state(self) -> str:
+        return json.dumps({"queries": self.queries, "sizes": self.sizes, "stores": self.stores})
+
+    def save(self):
+        # The progress may include pages recorded since the last commit, so the output is committed along with it
+        self.flush().result()
+
+    def write(self, state: str):
+        tmp_path = "{}.{}.tmp".format(self.path, os.getpid())
+        with open(tmp_path, "w") as f:
+            f.write(state)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def close(self):
+        """
+        Waits for the outstanding commits to become durable.
+        """
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,76 @@
+from typing import Callable, Iterable, Iterator, List
+
+import heapq
+import os
+import tempfile
+
+from scraping import jsonl
+
+RUN_RECORDS = 200000
+
+
+def write_runs(entries: Iterable[list], key: Callable[[list], any], tmp_dir: str, name: str,
+               run_records: int) -> List[str]:
+    """
+    Cuts the entries into runs of run_records, sorts each run in memory by key and writes it to a file in tmp_dir.
+    """
+    paths = []
+    run = []
+
+    def spill():
+        run.sort(key=key)
+        path = os.path.join(tmp_dir, "{}-{:06d}.jsonl".format(name, len(paths)))
+        with open(path, "wb") as f:
+            jsonl.write(f, run)
+        paths.append(path)
+        run.clear()
+
+    for entry in entries:
+        run.append(entry)
+        if len(run) >= run_records:
+            spill()
+    if len(run) > 0:
+        spill()
+    return paths
+
+
+def merge_runs(paths: List[str], key: Callable[[list], any]) -> Iterator[list]:
+    """
+    k-way merge of sorted runs, holding one entry per run in memory.
+    """
+    files = [open(path, "rb") for path in paths]
+    try:
+        yield from heapq.merge(*[(jsonl.loads(line) for line in f) for f in files], key=key)
+    finally:
+        for f in files:
+            f.close()
+
+
+def dedup(records: Iterable[dict], key="id", run_records=RUN_RECORDS, tmp_dir: str = None) -> Iterator[dict]:
+    """
+    Yields the last record of every key in the order each key was first seen, the same result as filling a dict, with
+    at most run_records records in memory. Records are numbered and externally sorted by (key, number), so that the
+    duplicates of a key are adjacent, and the surviving records are then externally sorted back by the number of their
+    key's first occurrence. All records are read before the first is yielded.
+    """
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as tmp:
+        by_key = write_runs(([r[key], i, r] for i, r in enumerate(records)), lambda e: (e[0], e[1]), tmp, "by-key",
+                            run_records)
+
+        def survivors() -> Iterator[list]:
+            first, last = None, None
+            for k, i, record in merge_runs(by_key, lambda e: (e[0], e[1])):
+                if last is not None and k != last[0]:
+                    yield [first, last[2]]
+                    first = None
+                if first is None:
+                    first = i
+                last = (k, i, record)
+            if last is not None:
+                yield [first, last[2]]
+
+        by_first = write_runs(survivors(), lambda e: e[0], tmp, "by-first", run_records)
+        for path in by_key:
+            os.remove(path)
+        for _, record in merge_runs(by_first, lambda e: e[0]):
+            yield record
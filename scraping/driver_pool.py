@@ -0,0 +1,90 @@
+from typing import Callable
+
+import contextlib
+import threading
+
+
+class DriverPool:
+    """
+    Keeps up to size warm browser drivers made by factory and lends them out to as many threads at once. A returned
+    driver is reset to a blank page without cookies for the next page, and it is quit and replaced by a fresh one once
+    it has loaded max_pages pages, or when it stops responding after an error, e.g. because the browser crashed.
+    """
+
+    def __init__(self, factory: Callable[[], any], size: int, max_pages: int):
+        self.factory = factory
+        self.size = size
+        self.max_pages = max_pages
+        self.slots = threading.BoundedSemaphore(size)
+        self.lock = threading.Lock()
+        self.idle = []
+        self.started = 0
+        self.recycled = 0
+
+    @contextlib.contextmanager
+    def driver(self):
+        """
+        Lends a driver for one page, blocking while all size drivers are in use.
+        """
+        with self.slots:
+            with self.lock:
+                entry = self.idle.pop() if len(self.idle) > 0 else None
+            if entry is None:
+                entry = [self.factory(), 0]
+                with self.lock:
+                    self.started += 1
+            driver = entry[0]
+            try:
+                yield driver
+            except BaseException:
+                self.give_back(entry, healthy=self.alive(driver))
+                raise
+            self.give_back(entry, healthy=True)
+
+    def give_back(self, entry: list, healthy: bool):
+        entry[1] += 1
+        if healthy and entry[1] < self.max_pages and self.reset(entry[0]):
+            with self.lock:
+                self.idle.append(entry)
+            return
+        with self.lock:
+            self.recycled += 1
+        # A crashed browser usually fails to quit as well
+        self.quit(entry[0], warn=healthy)
+
+    @staticmethod
+    def alive(driver) -> bool:
+        try:
+            driver.current_url
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def reset(driver) -> bool:
+        try:
+            driver.delete_all_cookies()
+            driver.get("about:blank")
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def quit(driver, warn=True):
+        try:
+            driver.quit()
+        except Exception as e:
+            if warn:
+                print("Warning, could not quit driver ({})".format(e))
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for driver, _ in idle:
+            self.quit(driver)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
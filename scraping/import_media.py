@@ -1,4 +1,5 @@
-from typing import Set, List, Dict, Tuple
+from typing import Set, List, Dict, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
 import requests
 import datetime as dt
 from bs4 import BeautifulSoup as bs
@@ -9,6 +10,8 @@ from selenium.common.exceptions import TimeoutException
 
 import config as conf
 import pickle as pk
+from scraping import jsonl
+from scraping.driver_pool import DriverPool
 import os.path
 from selenium import webdriver
 from selenium.webdriver.firefox.options import Options as FirefoxOptions
@@ -43,7 +46,36 @@ def configure_firefox_driver():
     return driver
 
 
-def scrape_media_text(url: str) -> str:
+def driver_pool() -> DriverPool:
+    return DriverPool(configure_firefox_driver, conf.MEDIA_DRIVERS, conf.MEDIA_DRIVER_PAGES)
+
+
+def ap_text(driver, url: str) -> str:
+    out = ""
+    driver.get(url)
+    WebDriverWait(driver, 180).until(
+        lambda h: h.find_element_by_class_name('Article').is_displayed()
+    )
+    ps = driver.find_elements_by_tag_name('p')
+    for p in ps:
+        out += " {}".format(p.text)
+    return out
+
+
+def ap_date(driver, url: str) -> dt.datetime:
+    driver.get(url)
+    WebDriverWait(driver, 60).until(
+        lambda h: h.find_element_by_class_name('CardHeadline').is_displayed()
+    )
+    p = driver.find_element_by_css_selector('span[data-key="timestamp"]')
+    gs = re.match(r"^(\w+)[ ](\d+)[, ]+(\d+).*$", p.text)
+    month_num = list(calendar.month_name).index(gs.group(1))
+    day_num = gs.group(2)
+    year_num = gs.group(3)
+    return dt.datetime(int(year_num), int(month_num), int(day_num))
+
+
+def scrape_media_text(url: str, pool: DriverPool) -> str:
     blacklist = [
         'style',
         'script',
@@ -51,17 +83,8 @@ def scrape_media_text(url: str) -> str:
     ]
     out = ""
     if "https://apnews.com/" in url:
-        driver = configure_firefox_driver()
-        try:
-            driver.get(url)
-            WebDriverWait(driver, 180).until(
-                lambda h: h.find_element_by_class_name('Article').is_displayed()
-            )
-            ps = driver.find_elements_by_tag_name('p')
-            for p in ps:
-                out += " {}".format(p.text)
-        finally:
-            driver.close()
+        with pool.driver() as driver:
+            out = ap_text(driver, url)
     else:
         page = requests.get(url)
         html = page.text
@@ -74,47 +97,40 @@ def scrape_media_text(url: str) -> str:
     return out
 
 
-def parse_dates(urls: Set[str]) -> Dict[dt.datetime, Dict[str, List[str]]]:
+def parse_date(url: str, pool: DriverPool) -> Optional[Tuple[dt.datetime, str]]:
+    print("Scraping " + url)
+    if "https://ewn.co.za/" in url:
+        raw_dt = url.strip("https://ewn.co.za/")[:10].split('/')
+        return dt.datetime(int(raw_dt[0]), int(raw_dt[1]), int(raw_dt[2])), "EWN"
+    elif "https://apnews.com/" in url:
+        with pool.driver() as driver:
+            return ap_date(driver, url), "Associated Press"
+    elif "https://www.bbc.com/" in url:
+        page = requests.get(url)
+        soup = bs(page.text, 'html.parser')
+        match = soup.select('time[data-testid="timestamp"]')[0]
+        gs = re.match(r"^.*datetime=\"(\d+)-(\d+)-(\d+)T.*$", str(match))
+        day_num = gs.group(3)
+        month_num = gs.group(2)
+        year_num = gs.group(1)
+        return dt.datetime(int(year_num), int(month_num), int(day_num)), "BBC"
+    elif "https://www.theguardian.com/" in url:
+        gs = re.match(r"^https://www.theguardian.com/[\w\-\/]*/(\d+)/(\w+)/(\d+)/.*$", url)
+        day_num = gs.group(3)
+        month_num = list(calendar.month_name).index(str(gs.group(2)).title())
+        year_num = gs.group(1)
+        return dt.datetime(int(year_num), int(month_num), int(day_num)), "The Guardian"
+    return None
+
+
+def parse_dates(urls: Set[str], pool: DriverPool) -> Dict[dt.datetime, Dict[str, List[str]]]:
     out_dict = {}
-    for url in urls:
-        print("Scraping " + url)
-        if "https://ewn.co.za/" in url:
-            raw_dt = url.strip("https://ewn.co.za/")[:10].split('/')
-            date = dt.datetime(int(raw_dt[0]), int(raw_dt[1]), int(raw_dt[2]))
-            insert_new_url(out_dict, date, "EWN", url)
-        elif "https://apnews.com/" in url:
-            driver = configure_firefox_driver()
-            try:
-                driver.get(url)
-                WebDriverWait(driver, 60).until(
-                    lambda h: h.find_element_by_class_name('CardHeadline').is_displayed()
-                )
-                p = driver.find_element_by_css_selector('span[data-key="timestamp"]')
-                gs = re.match(r"^(\w+)[ ](\d+)[, ]+(\d+).*$", p.text)
-                month_num = list(calendar.month_name).index(gs.group(1))
-                day_num = gs.group(2)
-                year_num = gs.group(3)
-                date = dt.datetime(int(year_num), int(month_num), int(day_num))
-                insert_new_url(out_dict, date, "Associated Press", url)
-            finally:
-                driver.close()
-        elif "https://www.bbc.com/" in url:
-            page = requests.get(url)
-            soup = bs(page.text, 'html.parser')
-            match = soup.select('time[data-testid="timestamp"]')[0]
-            gs = re.match(r"^.*datetime=\"(\d+)-(\d+)-(\d+)T.*$", str(match))
-            day_num = gs.group(3)
-            month_num = gs.group(2)
-            year_num = gs.group(1)
-            date = dt.datetime(int(year_num), int(month_num), int(day_num))
-            insert_new_url(out_dict, date, "BBC", url)
-        elif "https://www.theguardian.com/" in url:
-            gs = re.match(r"^https://www.theguardian.com/[\w\-\/]*/(\d+)/(\w+)/(\d+)/.*$", url)
-            day_num = gs.group(3)
-            month_num = list(calendar.month_name).index(str(gs.group(2)).title())
-            year_num = gs.group(1)
-            date = dt.datetime(int(year_num), int(month_num), int(day_num))
-            insert_new_url(out_dict, date, "The Guardian", url)
+    # The URLs are visited by as many threads as the pool has drivers, the results are collected here in order
+    urls = list(urls)
+    with ThreadPoolExecutor(pool.size) as executor:
+        for url, parsed in zip(urls, executor.map(lambda u: parse_date(u, pool), urls)):
+            if parsed is not None:
+                insert_new_url(out_dict, parsed[0], parsed[1], url)
     return out_dict
 
 
@@ -128,7 +144,7 @@ def deserialize(path: str) -> any:
         return pk.load(mu)
 
 
-def get_data() -> Dict[dt.datetime, Dict[str, List[str]]]:
+def get_data(pool: DriverPool) -> Dict[dt.datetime, Dict[str, List[str]]]:
     """
     Reads the URLs from "./resources/media_articles.txt" and organizes these by date and news outlet.
     :return a dictionary with keys being datetime and values being strings to lists of URLs.
@@ -139,61 +155,69 @@ def get_data() -> Dict[dt.datetime, Dict[str, List[str]]]:
         out_dict = deserialize(mu_pickle)
     else:
         urls = read_files(conf.MEDIA_URLS_PATH)
-        out_dict = parse_dates(urls)
+        out_dict = parse_dates(urls, pool)
         serialize(mu_pickle, out_dict)
     print("Success!")
     return out_dict
 
 
-def get_scraped_text(media_data: Dict[dt.datetime, Dict[str, List[str]]]) -> Dict[dt.datetime, Dict[str, List[
-        Tuple[str, str]]]]:
+def try_scrape(url: str, pool: DriverPool) -> Optional[str]:
+    try:
+        text = scrape_media_text(url, pool)
+        if len(text) < 5:
+            print("Unsuccessful scrape {}".format(url))
+        return text
+    except TimeoutException:
+        print("Unsuccessful scrape {} (timeout)".format(url))
+        return None
+
+
+def get_scraped_text(media_data: Dict[dt.datetime, Dict[str, List[str]]],
+                     pool: DriverPool) -> Dict[dt.datetime, Dict[str, List[Tuple[str, str]]]]:
+    urls = [u for media_map in media_data.values() for urls in media_map.values() for u in urls]
+    with ThreadPoolExecutor(pool.size) as executor:
+        texts = dict(zip(urls, executor.map(lambda u: try_scrape(u, pool), urls)))
     scraped_data = {}
     for (date, media_map) in media_data.items():
         data_per_media_outlet = {}
         for (media_outlet, urls) in media_map.items():
-            data_per_media_outlet[media_outlet] = []
-            for u in urls:
-                try:
-                    text = scrape_media_text(u)
-                    if len(text) < 5:
-                        print("Unsuccessful scrape {}".format(u))
-                    data_per_media_outlet[media_outlet].append((u, text))
-                except TimeoutException:
-                    print("Unsuccessful scrape {} (timeout)".format(u))
+            data_per_media_outlet[media_outlet] = [(u, texts[u]) for u in urls if texts[u] is not None]
         scraped_data[date] = data_per_media_outlet
     return scraped_data
 
 
-def scraped_data(media_data: Dict[dt.datetime, Dict[str, List[str]]]) -> Dict[dt.datetime, Dict[str, List[
-        Tuple[str, str]]]]:
+def scraped_data(media_data: Dict[dt.datetime, Dict[str, List[str]]],
+                 pool: DriverPool) -> Dict[dt.datetime, Dict[str, List[Tuple[str, str]]]]:
     mu_pickle = "./scraped_data.pickle"
     print("Scraping media objects... ", end="")
     if os.path.isfile(mu_pickle):
         scraped_data = deserialize(mu_pickle)
     else:
-        scraped_data = get_scraped_text(media_data)
+        scraped_data = get_scraped_text(media_data, pool)
         serialize(mu_pickle, scraped_data)
     print("Success!")
     return scraped_data
 
 
 def export_to_csv(scraped_data: Dict[dt.datetime, Dict[str, List[Tuple[str, str]]]]):
-    import json
-    with open('../media.json', 'w') as f:
+    def payloads():
         for (date, media_data) in scraped_data.items():
             for (media, articles) in media_data.items():
                 for (u, a) in articles:
-                    payload = {
+                    yield {
                         'date': date.strftime('%Y-%m-%d'),
                         'media_outlet': media,
                         'url': u,
                         'text': a.strip()
                     }
-                    f.write(json.dumps(payload) + "\n")
+
+    with open('../media.json', 'wb') as f:
+        jsonl.write(f, payloads())
 
 
 if __name__ == "__main__":
-    media_data = get_data()
-    scraped_data = scraped_data(media_data)
+    with driver_pool() as pool:
+        media_data = get_data(pool)
+        scraped_data = scraped_data(media_data, pool)
     export_to_csv(scraped_data)
 
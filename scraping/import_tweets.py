@@ -1,10 +1,14 @@
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 import config as conf
 import requests
 import time
-import json
+import os
 import re
 
+from scraping import dedup, jsonl, segments
+from scraping.checkpoint import Checkpoint
+from scraping.tags import TagMatcher
+
 URL = "https://api.twitter.com/2"
 REQUEST_CAP = 300
 REQUEST_WINDOW = 15 * 60.0  # 15 minute window
@@ -12,6 +16,10 @@ SECONDS_PER_REQUEST = (REQUEST_WINDOW + 1) / REQUEST_CAP  # Add a bit of slack
 MAX_RESULTS = 500
 TWEETS_FILE = "./tweets.json"
 USERS_FILE = "./users.json"
+# Segment directories written by the puller, read together with the plain files above
+TWEETS_STORE = "./tweets"
+USERS_STORE = "./users"
+BLACKLISTED_AUTHORS = {"1390401696329871363"}
 
 
 def headers() -> Dict[str, str]:
@@ -25,14 +33,20 @@ def get(endpoint: str, params: Dict):
     return requests.get("{}/{}".format(URL, endpoint), params=params, headers=headers()).json()
 
 
-def pull_data(query):
+def pull_data(query, checkpoint: Checkpoint = None):
+    window = default_window()
+    next_token = None
+    if checkpoint is not None:
+        progress = checkpoint.start(query, window)
+        if progress["done"]:
+            return
+        window, next_token = tuple(progress["window"]), progress["next_token"]
     flag = False
     i = 0
-    next_token = None
     while not flag:
         if conf.DEBUG:
             print("Query {}".format(i))
-        res = get_recent_tweets(query, next_token)
+        res = get_recent_tweets(query, next_token, window)
         result_count = int(res['meta']['result_count'])
 
         try:
@@ -60,10 +74,20 @@ def pull_data(query):
             print("Next token: {}".format(next_token))
         if result_count < MAX_RESULTS:
             flag = True
+        if checkpoint is not None:
+            checkpoint.commit(query, None if flag else next_token).result()
         time.sleep(SECONDS_PER_REQUEST)
 
 
-def get_recent_tweets(query: str, next_token=None):
+def get_recent_tweets(query: str, next_token=None, window: Tuple[Optional[str], Optional[str]] = None):
+    return get("tweets/search/all", search_params(query, next_token, window))
+
+
+def default_window() -> Tuple[Optional[str], Optional[str]]:
+    return conf.TWEETS_FROM, conf.TWEETS_TO
+
+
+def search_params(query: str, next_token=None, window: Tuple[Optional[str], Optional[str]] = None) -> Dict:
     params = {
         'query': query,
         'max_results': MAX_RESULTS,
@@ -74,11 +98,12 @@ def get_recent_tweets(query: str, next_token=None):
     }
     if next_token is not None:
         params['next_token'] = next_token
-    if conf.TWEETS_FROM is not None:
-        params['start_time'] = conf.TWEETS_FROM
-    if conf.TWEETS_TO is not None:
-        params['end_time'] = conf.TWEETS_TO
-    return get("tweets/search/all", params)
+    start_time, end_time = window if window is not None else default_window()
+    if start_time is not None:
+        params['start_time'] = start_time
+    if end_time is not None:
+        params['end_time'] = end_time
+    return params
 
 
 def get_hashtags(f_name: str) -> List[str]:
@@ -86,36 +111,58 @@ def get_hashtags(f_name: str) -> List[str]:
         return f.read().splitlines()
 
 
-def write_to_file(f_name: str, input_collection, w_flag='a+'):
+def tag_matcher() -> TagMatcher:
+    """
+    Matches the hashtags of all three stances, as the puller tags the tweets it pulls.
+    """
+    return TagMatcher.of_files({
+        "n": "./assets/{}".format(conf.NEUTRAL_HASHTAGS),
+        "i": "./assets/{}".format(conf.PRO_ISRAEL_HASHTAGS),
+        "p": "./assets/{}".format(conf.PRO_PALESTINE_HASHTAGS)
+    })
+
+
+def write_to_file(f_name: str, input_collection, w_flag='ab'):
     with open(f_name, w_flag) as f:
-        for i in input_collection:
-            f.write(json.dumps(i) + "\n")
+        jsonl.write(f, input_collection)
+
+
+def tweet_date(d: dict) -> str:
+    return d["created_at"][:10]
+
+
+def open_writers(tweets_store=TWEETS_STORE, users_store=USERS_STORE) -> Tuple[segments.SegmentWriter,
+                                                                              segments.SegmentWriter]:
+    return segments.SegmentWriter(tweets_store, "tweets", conf.SEGMENT_CODEC, conf.SEGMENT_BYTES,
+                                  partition=tweet_date if conf.SEGMENT_BY_DATE else None), \
+        segments.SegmentWriter(users_store, "users", conf.SEGMENT_CODEC, conf.SEGMENT_BYTES)
 
 
 def dedup_datasets():
-    blacklisted_authors = ["1390401696329871363"]
-    with open(TWEETS_FILE, 'r') as f:
-        l = {}
-        for line in f.readlines():
-            skip = False
+    def tweets():
+        for j in segments.iter_records(TWEETS_FILE, TWEETS_STORE):
             # Some authors just post noise
-            for a in blacklisted_authors:
-                if '"author_id": "{}"'.format(a) in line:
-                    skip = True
-            if skip:
-                continue
-            j = json.loads(remove_unicode(line))
-            if j["lang"] != "en":
-                skip = True
-            if not skip:
-                l[j["id"]] = j
-    write_to_file(TWEETS_FILE, l.values(), 'w+')
-    with open(USERS_FILE, 'r') as f:
-        l = {}
-        for line in f.readlines():
-            j = json.loads(line)
-            l[j["id"]] = j
-    write_to_file(USERS_FILE, l.values(), 'w+')
+            if j["author_id"] not in BLACKLISTED_AUTHORS and j["lang"] == "en":
+                j["text"] = remove_non_ascii(j["text"])
+                yield j
+
+    # Both stores are rewritten in place with the deduplicated records, plain files included, which are sorted on disk
+    tweets_writer, users_writer = open_writers()
+    checkpoint = None
+    if conf.PULL_CHECKPOINT_PATH and os.path.isfile(conf.PULL_CHECKPOINT_PATH):
+        # Rolls back whatever an interrupted pull wrote after its last commit before that is deduplicated
+        checkpoint = Checkpoint.open(conf.PULL_CHECKPOINT_PATH, [], [tweets_writer, users_writer])
+    users = segments.iter_records(USERS_FILE, USERS_STORE)
+    tweets_writer.compact(dedup.dedup(tweets(), run_records=conf.DEDUP_RUN_RECORDS))
+    users_writer.compact(dedup.dedup(users, run_records=conf.DEDUP_RUN_RECORDS))
+    if checkpoint is not None:
+        # The compacted segments are what an unfinished query resumes from
+        checkpoint.rebase()
+    tweets_writer.close()
+    users_writer.close()
+    for f_name in [TWEETS_FILE, USERS_FILE]:
+        if os.path.isfile(f_name):
+            os.remove(f_name)
 
 
 def remove_unicode(text):
@@ -123,12 +170,26 @@ def remove_unicode(text):
     return text
 
 
+def remove_non_ascii(text):
+    """
+    remove_unicode for decoded text: the stores hold UTF-8 rather than \\u escapes, so the characters those escapes
+    stood for are removed instead.
+    """
+    return re.sub(r'[^\x00-\x7f]', "", text)
+
+
 if __name__ == "__main__":
     tags = []
     tags.extend(get_hashtags(conf.NEUTRAL_HASHTAGS))
     tags.extend(get_hashtags(conf.PRO_ISRAEL_HASHTAGS))
     tags.extend(get_hashtags(conf.PRO_PALESTINE_HASHTAGS))
-    for i, tag in enumerate(tags):
-        print("({}/{}) Pulling data for {}".format(i + 1, len(tags), tag))
-        pull_data(tag)
+    # Imported here as the puller itself builds on this module
+    from scraping import puller
+    from scraping.tags import batch_queries
+    # A tweet carrying several tags is pulled once by a query that ORs them, its tags are then matched locally
+    queries = batch_queries(tags, conf.QUERY_MAX_LENGTH)
+    matcher = tag_matcher()
+    print("Pulling data for {} hashtags in {} queries".format(len(tags), len(queries)))
+    for query, pages in puller.pull_all(queries, matcher=matcher).items():
+        print("{}: {} pages".format(query, pages))
     dedup_datasets()
@@ -0,0 +1,161 @@
+from typing import BinaryIO, Callable, Iterable, Iterator, List, Sequence, Union
+
+import contextlib
+import gc
+import json
+import threading
+
+import config as conf
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+# Preferred first, "auto" picks the first one installed
+BACKENDS = ["orjson", "simdjson", "json"]
+BATCH_BYTES = 1024 * 1024
+BATCH_RECORDS = 10000
+
+_parsers = threading.local()
+
+
+def available() -> List[str]:
+    installed = {"orjson": orjson is not None, "simdjson": simdjson is not None, "json": True}
+    return [name for name in BACKENDS if installed[name]]
+
+
+def _parser():
+    # A simdjson parser reuses its buffers between documents and must not be shared between threads
+    parser = getattr(_parsers, "parser", None)
+    if parser is None:
+        parser = _parsers.parser = simdjson.Parser()
+    return parser
+
+
+def _simdjson_loads(data: Union[bytes, str]):
+    return _parser().parse(data.encode("utf-8") if isinstance(data, str) else data, True)
+
+
+def _simdjson_project(data: Union[bytes, str], fields: Sequence[str]) -> dict:
+    # Only the projected values are turned into Python objects, the rest of the document is skipped over
+    doc = _parser().parse(data.encode("utf-8") if isinstance(data, str) else data)
+    out = {}
+    for k in fields:
+        if k in doc:
+            v = doc[k]
+            out[k] = v.as_dict() if isinstance(v, simdjson.Object) else v.as_list() if isinstance(v, simdjson.Array) \
+                else v
+    return out
+
+
+def _stdlib_dumps(obj) -> bytes:
+    return json.dumps(obj).encode("utf-8")
+
+
+def use(name: str):
+    """
+    Switches the backend behind loads, dumps and project: "orjson", "simdjson" or "json", or "auto" for the first one
+    installed. simdjson only parses, so it writes with orjson if that is installed. As it skips over the values it is
+    not asked for, "auto" also projects with simdjson whenever it is installed.
+    """
+    global BACKEND, loads, dumps, project
+    auto = name == "auto"
+    if auto:
+        name = available()[0]
+    if name not in available():
+        print("Warning, JSON backend {} is not installed, using {} instead".format(name, available()[0]))
+        name = available()[0]
+    BACKEND = name
+    if name == "simdjson":
+        loads, project = _simdjson_loads, _simdjson_project
+    else:
+        loads = orjson.loads if name == "orjson" else json.loads
+
+        def project(data: Union[bytes, str], fields: Sequence[str]) -> dict:
+            d = loads(data)
+            return {k: d[k] for k in fields if k in d}
+    if auto and simdjson is not None:
+        project = _simdjson_project
+    dumps = orjson.dumps if orjson is not None and name != "json" else _stdlib_dumps
+
+
+# Set by use(): loads(line) -> object, dumps(object) -> bytes without a newline and project(line, fields) -> dict of
+# the fields present in the line
+BACKEND: str = None
+loads: Callable[[Union[bytes, str]], any] = None
+dumps: Callable[[any], bytes] = None
+project: Callable[[Union[bytes, str], Sequence[str]], dict] = None
+use(conf.JSON_BACKEND)
+
+
+# Threads decoding at the same time share the one garbage collector: the first to start pauses it and the last to
+# finish resumes it, and only if it was enabled before
+_gc_lock = threading.Lock()
+_gc_depth = 0
+_gc_resume = False
+
+
+@contextlib.contextmanager
+def _gc_paused():
+    global _gc_depth, _gc_resume
+    with _gc_lock:
+        if _gc_depth == 0:
+            _gc_resume = gc.isenabled()
+            gc.disable()
+        _gc_depth += 1
+    try:
+        yield
+    finally:
+        with _gc_lock:
+            _gc_depth -= 1
+            if _gc_depth == 0 and _gc_resume:
+                gc.enable()
+
+
+def decode(lines: Iterable[bytes], fields: Sequence[str] = None) -> List[dict]:
+    """
+    Parses JSON lines, skipping blank ones. If fields are given only those keys are kept.
+    """
+    # Parsing only allocates new containers without cycles, so rather than having the cyclic garbage collector
+    # traverse them over and over while a batch is built it is paused until the batch is done
+    with _gc_paused():
+        if fields is None:
+            return [loads(line) for line in lines if line.strip()]
+        return [project(line, fields) for line in lines if line.strip()]
+
+
+def read_batches(f: BinaryIO, fields: Sequence[str] = None, batch_bytes=BATCH_BYTES) -> Iterator[List[dict]]:
+    """
+    Streams the records of a JSONL file opened in binary mode, reading and parsing about batch_bytes of lines at once.
+    """
+    while True:
+        lines = f.readlines(batch_bytes)
+        if len(lines) == 0:
+            return
+        yield decode(lines, fields)
+
+
+def read_file(f_name: str, fields: Sequence[str] = None) -> Iterator[dict]:
+    with open(f_name, "rb") as f:
+        for batch in read_batches(f, fields):
+            yield from batch
+
+
+def write(f: BinaryIO, records: Iterable, batch_records=BATCH_RECORDS):
+    """
+    Writes records as JSON lines to a file opened in binary mode, encoding batch_records of them per write call.
+    """
+    batch = []
+    for record in records:
+        batch.append(dumps(record))
+        if len(batch) >= batch_records:
+            f.write(b"\n".join(batch) + b"\n")
+            batch = []
+    if len(batch) > 0:
+        f.write(b"\n".join(batch) + b"\n")
@@ -0,0 +1,321 @@
+from typing import Callable, Dict, List, Optional, Tuple
+
+import asyncio
+import datetime as dt
+import math
+import time
+
+import aiohttp
+
+import config as conf
+from scraping import import_tweets, jsonl
+from scraping.checkpoint import Checkpoint
+from scraping.segments import SegmentWriter
+from scraping.tags import TagMatcher
+from scraping.import_tweets import REQUEST_CAP, REQUEST_WINDOW, URL
+
+# The full-archive search also allows at most one request per second per token
+MIN_INTERVAL = 1.0
+MAX_RETRIES = 5
+BACKOFF_SECONDS = 2.0
+# Slices are not split below a minute or into more than MAX_SPLIT parts at once
+MIN_SLICE_SECONDS = 60
+MAX_SPLIT = 16
+# The search rejects an end_time less than 10 seconds in the past
+END_SLACK_SECONDS = 30
+
+
+class TokenBucket:
+    """
+    Request budget of one bearer token for the current rate limit window. Requests are counted locally as they are
+    sent and the count is corrected from the x-rate-limit-* headers of every response, so requests of other processes
+    sharing the token are accounted for and a new window is picked up as soon as the server reports it.
+    """
+
+    def __init__(self, token: str, cap=REQUEST_CAP, window=REQUEST_WINDOW, min_interval=MIN_INTERVAL):
+        self.token = token
+        self.cap = cap
+        self.window = window
+        self.min_interval = min_interval
+        self.remaining = cap
+        self.reset_at = time.monotonic() + window
+        self.next_at = 0.0
+        self.in_flight = 0
+
+    def wait(self, now: float) -> float:
+        """
+        Seconds until the next request may be sent with this token, 0 if it may be sent now.
+        """
+        if now >= self.reset_at:
+            self.remaining = self.cap
+            self.reset_at = now + self.window
+        if self.remaining >= 1:
+            return max(self.next_at - now, 0.0)
+        return max(self.reset_at - now, self.next_at - now)
+
+    def take(self, now: float):
+        self.remaining -= 1
+        self.next_at = now + self.min_interval
+        self.in_flight += 1
+
+    def finish(self, headers: Optional[Dict[str, str]], now: float, wall: float):
+        self.in_flight -= 1
+        if headers is None:
+            return
+        try:
+            limit = int(headers["x-rate-limit-limit"])
+            remaining = int(headers["x-rate-limit-remaining"])
+            reset = float(headers["x-rate-limit-reset"])
+        except (KeyError, ValueError):
+            return
+        reset_at = now + max(reset - wall, 0.0)
+        # Requests still in flight were taken locally but are not yet counted by the server
+        estimate = remaining - self.in_flight
+        if reset_at > self.reset_at + 1.0:
+            # The server started a new window since the last response
+            self.remaining = estimate
+        else:
+            self.remaining = min(self.remaining, estimate)
+        self.cap = limit
+        self.reset_at = reset_at
+
+    def block(self, now: float):
+        """
+        Spends the rest of the window after a 429. Without a reset header the full window is waited out.
+        """
+        self.remaining = 0
+        if self.reset_at <= now:
+            self.reset_at = now + self.window
+
+
+class TokenPool:
+    """
+    Hands out the bearer token with the most requests left among those that may send now, sleeping until one may.
+    """
+
+    def __init__(self, buckets: List[TokenBucket]):
+        self.buckets = buckets
+
+    async def acquire(self) -> TokenBucket:
+        while True:
+            now = time.monotonic()
+            waits = [b.wait(now) for b in self.buckets]
+            ready = [b for b, w in zip(self.buckets, waits) if w == 0.0]
+            if len(ready) > 0:
+                bucket = max(ready, key=lambda b: b.remaining)
+                bucket.take(now)
+                return bucket
+            await asyncio.sleep(min(waits))
+
+
+def parse_time(s: str) -> int:
+    return int(dt.datetime.fromisoformat(s.replace("Z", "+00:00")).timestamp())
+
+
+def format_time(t: int) -> str:
+    return dt.datetime.fromtimestamp(t, dt.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def split_window(lo: int, hi: int, n: int) -> List[Tuple[str, str]]:
+    edges = [lo + (hi - lo) * i // n for i in range(n + 1)]
+    return [(format_time(a), format_time(b)) for a, b in zip(edges, edges[1:]) if a < b]
+
+
+def page_writer(tweets: SegmentWriter, users: SegmentWriter, matcher: TagMatcher = None) -> Callable[[str, dict], None]:
+    def write_page(query: str, res: dict):
+        data = res.get("data", [])
+        if matcher is not None:
+            # A query covers several tags, so the tags each tweet matches are found in its text
+            data = [matcher.annotate(d) for d in data]
+        tweets.write(data)
+        users.write(res.get("includes", {}).get("users", []))
+    return write_page
+
+
+class Puller:
+    """
+    Paginates several search queries concurrently over one pooled HTTP session, spreading the requests over the given
+    bearer tokens within their rate limits. Each page is handed to on_page as it arrives and, if a checkpoint is given,
+    committed right after without yielding to the other queries, so that every commit covers whole pages only. A slice
+    waits for its commit to become durable before it requests its next page.
+
+    As pagination itself is sequential, the time window of every query is cut into slices that are paginated
+    independently. A slice whose first page suggests more than slice_pages pages is split further: the page is kept
+    down to the oldest second it reaches, which is left to the rest of the slice, and that rest is divided into new
+    slices. Slices never overlap, since start_time is inclusive and end_time exclusive, so every tweet is pulled once.
+    """
+
+    def __init__(self, tokens: List[str], concurrency: int, on_page: Callable[[str, dict], None], base_url=URL,
+                 min_interval=MIN_INTERVAL, checkpoint: Checkpoint = None, slices=1, slice_pages=0,
+                 window: Tuple[Optional[str], Optional[str]] = None):
+        self.pool = TokenPool([TokenBucket(t, min_interval=min_interval) for t in tokens])
+        self.concurrency = concurrency
+        self.base_url = base_url
+        self.on_page = on_page
+        self.checkpoint = checkpoint
+        self.slices = slices
+        self.slice_pages = slice_pages
+        self.window = window
+        self.failed = False
+        self.requests = 0
+        self.throttled = 0
+
+    async def get(self, session: aiohttp.ClientSession, endpoint: str, params: Dict) -> dict:
+        for attempt in range(MAX_RETRIES):
+            bucket = await self.pool.acquire()
+            self.requests += 1
+            headers = {"Authorization": "Bearer {}".format(bucket.token)}
+            finished = False
+            try:
+                async with session.get("{}/{}".format(self.base_url, endpoint), params=params, headers=headers) as r:
+                    bucket.finish(r.headers, time.monotonic(), time.time())
+                    finished = True
+                    if r.status == 429:
+                        self.throttled += 1
+                        bucket.block(time.monotonic())
+                        continue
+                    if r.status < 500:
+                        r.raise_for_status()
+                        return await r.json(loads=jsonl.loads)
+                    print("Warning, server error {} for {}, retrying".format(r.status, params["query"]))
+            except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) as e:
+                if not finished:
+                    bucket.finish(None, time.monotonic(), time.time())
+                print("Warning, request for {} failed ({}), retrying".format(params["query"], e))
+            await asyncio.sleep(BACKOFF_SECONDS * 2 ** attempt)
+        raise RuntimeError("Giving up on {} after {} attempts".format(params["query"], MAX_RETRIES))
+
+    def initial_slices(self, window: Tuple[Optional[str], Optional[str]]) -> List[Tuple[str, str]]:
+        start, end = window
+        if start is None:
+            return [window]
+        hi = parse_time(end) if end is not None else int(time.time()) - END_SLACK_SECONDS
+        return split_window(parse_time(start), hi, self.slices)
+
+    def pending(self, query: str) -> List[Tuple[Tuple[str, str], Optional[str]]]:
+        """
+        The slices of the query still to be pulled, with the next_token to continue each from.
+        """
+        window = self.window if self.window is not None else import_tweets.default_window()
+        if self.checkpoint is None:
+            return [(w, None) for w in self.initial_slices(window)]
+        progress = self.checkpoint.start(query, window)
+        if progress["done"]:
+            return []
+        return self.checkpoint.slices(query, self.initial_slices(tuple(progress["window"])))
+
+    def subdivide(self, window: Tuple[str, str], res: dict) -> Tuple[dict, List[Tuple[str, str]]]:
+        """
+        Judges from the first page of a slice whether the slice is dense enough to split. If so, returns the page
+        without its oldest second together with the slices that divide the rest of the window, otherwise the page as
+        is and no slices.
+        """
+        data = res.get("data", [])
+        if self.slice_pages <= 0 or res.get("meta", {}).get("next_token") is None or None in window or len(data) == 0:
+            return res, []
+        lo, hi = parse_time(window[0]), parse_time(window[1])
+        cut = min(parse_time(d["created_at"]) for d in data) + 1
+        if cut >= hi:
+            # The whole page falls within one second, which cannot be divided any further
+            return res, []
+        # Expected pages left in the slice if it is as dense as the part this page covered
+        pages = (cut - lo) / (hi - cut)
+        n = min(math.ceil(pages / self.slice_pages), MAX_SPLIT, (cut - lo) // MIN_SLICE_SECONDS)
+        if n < 2:
+            return res, []
+        kept = [d for d in data if parse_time(d["created_at"]) >= cut]
+        authors = set(d.get("author_id") for d in kept)
+        includes = dict(res.get("includes", {}))
+        if "users" in includes.keys():
+            includes["users"] = [u for u in includes["users"] if u["id"] in authors]
+        return dict(res, data=kept, includes=includes), split_window(lo, cut, n)
+
+    async def paginate(self, session: aiohttp.ClientSession, queue: asyncio.Queue, query: str,
+                       window: Tuple[str, str], next_token: Optional[str]) -> int:
+        pages = 0
+        while True:
+            res = await self.get(session, "tweets/search/all", import_tweets.search_params(query, next_token, window))
+            if self.failed:
+                # Another slice failed, possibly halfway through writing a page that the next commit would include
+                return pages
+            children = []
+            if pages == 0 and next_token is None:
+                res, children = self.subdivide(window, res)
+            self.on_page(query, res)
+            pages += 1
+            next_token = None if len(children) > 0 else res.get("meta", {}).get("next_token")
+            committed = None
+            if self.checkpoint is not None:
+                committed = self.checkpoint.commit(query, next_token, window, children)
+            for child in children:
+                queue.put_nowait((query, child, None))
+            if committed is not None:
+                # The other slices go on while the commit is made durable
+                await asyncio.wrap_future(committed)
+            if next_token is None:
+                return pages
+
+    async def work(self, session: aiohttp.ClientSession, queue: asyncio.Queue, pages: Dict[str, int]):
+        while True:
+            query, window, next_token = await queue.get()
+            try:
+                pages[query] += await self.paginate(session, queue, query, window, next_token)
+            except BaseException:
+                self.failed = True
+                raise
+            finally:
+                queue.task_done()
+
+    async def run(self, queries: List[str]) -> Dict[str, int]:
+        """
+        Pulls every query to its last page and returns the number of pages read per query. concurrency workers take
+        the slices of all queries from one queue, to which split slices are added.
+        """
+        pages = {q: 0 for q in queries}
+        queue = asyncio.Queue()
+        for query in queries:
+            for window, next_token in self.pending(query):
+                queue.put_nowait((query, window, next_token))
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            workers = [asyncio.ensure_future(self.work(session, queue, pages)) for _ in range(self.concurrency)]
+            finished = asyncio.ensure_future(queue.join())
+            try:
+                # A worker only returns by raising, in which case the pull is given up
+                await asyncio.wait(workers + [finished], return_when=asyncio.FIRST_COMPLETED)
+                for w in workers:
+                    if w.done():
+                        w.result()
+                if self.checkpoint is not None:
+                    # The last pages may not have made up a whole group of commit_pages
+                    await asyncio.wrap_future(self.checkpoint.flush())
+            finally:
+                for w in workers + [finished]:
+                    w.cancel()
+        return pages
+
+
+def pull_all(queries: List[str], tokens: List[str] = None, concurrency: int = None,
+             matcher: TagMatcher = None) -> Dict[str, int]:
+    if tokens is None:
+        tokens = [conf.TWITTER_BEARER_TOKEN] + list(conf.TWITTER_BEARER_TOKENS)
+    # Unset tokens are left empty in the config template
+    tokens = [t for t in tokens if t]
+    if len(tokens) == 0:
+        raise ValueError("No Twitter bearer token configured, set TWITTER_BEARER_TOKEN or TWITTER_BEARER_TOKENS in "
+                         "config.py")
+    if concurrency is None:
+        concurrency = conf.PULL_CONCURRENCY
+    tweets, users = import_tweets.open_writers()
+    checkpoint = None
+    if conf.PULL_CHECKPOINT_PATH:
+        checkpoint = Checkpoint.open(conf.PULL_CHECKPOINT_PATH, [], [tweets, users], queries, conf.PULL_COMMIT_PAGES)
+    try:
+        return asyncio.run(Puller(tokens, concurrency, page_writer(tweets, users, matcher), checkpoint=checkpoint,
+                                  slices=conf.PULL_SLICES, slice_pages=conf.PULL_SLICE_PAGES).run(queries))
+    finally:
+        if checkpoint is not None:
+            # Commits still in flight publish older indexes of the writers, so they have to finish before closing them
+            checkpoint.close()
+        tweets.close()
+        users.close()
@@ -0,0 +1,254 @@
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import gzip
+import io
+import json
+import os
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from scraping import jsonl
+
+INDEX_FILE = "index.json"
+EXTENSIONS = {"gzip": ".jsonl.gz", "zstd": ".jsonl.zst"}
+SEGMENT_BYTES = 64 * 1024 * 1024
+BATCH_BYTES = 1024 * 1024
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+
+def compress(data: bytes, codec: str) -> bytes:
+    """
+    Compresses data into one self-contained frame: a gzip member or a zstd frame. Frames are simply appended to a
+    segment, both formats decode a sequence of them as the concatenated data.
+    """
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+
+class LimitedReader(io.RawIOBase):
+    """
+    Reads at most limit bytes of a file, so that frames written after the last index update are not seen.
+    """
+
+    def __init__(self, f, limit: int):
+        self.f = f
+        self.left = limit
+
+    def readable(self):
+        return True
+
+    def readinto(self, b) -> int:
+        data = self.f.read(min(len(b), self.left))
+        self.left -= len(data)
+        b[:len(data)] = data
+        return len(data)
+
+
+def open_segment(f, segment: dict) -> io.BufferedIOBase:
+    """
+    Decodes the committed frames of a segment from its open binary file.
+    """
+    raw = io.BufferedReader(LimitedReader(f, segment["bytes"]))
+    if segment["codec"] == "zstd":
+        if zstandard is None:
+            raise ImportError("zstandard is needed to read {}".format(segment["name"]))
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True))
+    return gzip.GzipFile(fileobj=raw, mode="rb")
+
+
+def read_index(path: str) -> dict:
+    index_path = os.path.join(path, INDEX_FILE)
+    if not os.path.isfile(index_path):
+        return {"segments": []}
+    with open(index_path, "r") as f:
+        return json.load(f)
+
+
+def iter_batches(*paths: str, fields: Sequence[str] = None) -> Iterator[List[dict]]:
+    """
+    Streams the records of each path in turn in batches, where a path is either a plain JSONL file or a segment
+    directory of which the committed part of every indexed segment is read. Missing paths are skipped. If fields are
+    given only those keys are decoded.
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            for segment in read_index(path)["segments"]:
+                with open(os.path.join(path, segment["name"]), "rb") as raw, open_segment(raw, segment) as f:
+                    yield from jsonl.read_batches(f, fields)
+        elif os.path.isfile(path):
+            with open(path, "rb") as f:
+                yield from jsonl.read_batches(f, fields)
+
+
+def iter_records(*paths: str, fields: Sequence[str] = None) -> Iterator[dict]:
+    for batch in iter_batches(*paths, fields=fields):
+        yield from batch
+
+
+class SegmentWriter:
+    """
+    Appends JSON records to a directory of compressed segments. Records are buffered and written as one frame per
+    batch through a file handle kept open per segment. A segment is closed once it reaches segment_bytes and, if a
+    partition function is given, every partition (e.g. day) gets segments of its own. sync() makes the written frames
+    durable and publishes them in index.json; readers only read up to the sizes it lists, and opening a writer drops
+    anything written after the last sync. Segments are numbered from a counter kept in the index, so the names of
+    new segments never clash with those of earlier ones.
+    """
+
+    def __init__(self, path: str, prefix: str, codec="gzip", segment_bytes=SEGMENT_BYTES, batch_bytes=BATCH_BYTES,
+                 partition: Callable[[dict], str] = None):
+        if codec == "zstd" and zstandard is None:
+            print("Warning, zstandard is not installed, writing gzip segments instead")
+            codec = "gzip"
+        self.path = path
+        self.prefix = prefix
+        self.codec = codec
+        self.segment_bytes = segment_bytes
+        self.batch_bytes = batch_bytes
+        self.partition = partition
+        self.buffers = {}
+        self.handles = {}
+        os.makedirs(path, exist_ok=True)
+        self.restore(read_index(path))
+
+    def restore(self, index: dict):
+        """
+        Rolls the directory back to the given index: segments are truncated to their listed sizes and unlisted ones
+        removed.
+        """
+        for f in self.handles.values():
+            f.close()
+        self.handles, self.buffers = {}, {}
+        self.segments = [dict(s) for s in index["segments"]]
+        self.next_seq = index.get("next_seq", len(self.segments))
+        listed = {s["name"]: s for s in self.segments}
+        for name in os.listdir(self.path):
+            if not name.startswith(self.prefix + "-"):
+                continue
+            f_name = os.path.join(self.path, name)
+            if name not in listed.keys():
+                os.remove(f_name)
+            elif os.path.getsize(f_name) > listed[name]["bytes"]:
+                os.truncate(f_name, listed[name]["bytes"])
+        self.publish()
+
+    def open_segment(self, partition: Optional[str]) -> dict:
+        for segment in self.segments:
+            if segment["partition"] == partition and not segment["closed"]:
+                return segment
+        name = "{}-{}{:06d}{}".format(self.prefix, "" if partition is None else partition + "-", self.next_seq,
+                                      EXTENSIONS[self.codec])
+        self.next_seq += 1
+        segment = {"name": name, "codec": self.codec, "partition": partition, "records": 0, "bytes": 0,
+                   "closed": False}
+        self.segments.append(segment)
+        return segment
+
+    def write(self, records: Iterable[dict]):
+        for record in records:
+            partition = self.partition(record) if self.partition is not None else None
+            buffer = self.buffers.setdefault(partition, [[], 0])
+            line = jsonl.dumps(record) + b"\n"
+            buffer[0].append(line)
+            buffer[1] += len(line)
+            if buffer[1] >= self.batch_bytes:
+                self.flush_partition(partition)
+
+    def flush_partition(self, partition: Optional[str]):
+        lines, _ = self.buffers.pop(partition, ([], 0))
+        if len(lines) == 0:
+            return
+        segment = self.open_segment(partition)
+        f = self.handles.get(segment["name"])
+        if f is None:
+            f = open(os.path.join(self.path, segment["name"]), "ab")
+            self.handles[segment["name"]] = f
+        f.write(compress(b"".join(lines), segment["codec"]))
+        segment["records"] += len(lines)
+        segment["bytes"] = f.tell()
+        if segment["bytes"] >= self.segment_bytes:
+            segment["closed"] = True
+
+    def flush(self):
+        for partition in list(self.buffers.keys()):
+            self.flush_partition(partition)
+
+    def sync(self) -> dict:
+        """
+        Writes out the buffered records, makes the segments durable and publishes the index, which is returned.
+        """
+        index, files = self.stage()
+        self.persist(index, files)
+        return index
+
+    def stage(self) -> Tuple[dict, List[Tuple[io.BufferedWriter, bool]]]:
+        """
+        The part of sync that must not overlap with write(): writes out the buffered records and returns the index as
+        of now together with the segment files to make durable, each with whether it is to be closed after. Handles of
+        closed segments are given up here.
+        """
+        self.flush()
+        files = []
+        for name, f in list(self.handles.items()):
+            f.flush()
+            closed = next(s for s in self.segments if s["name"] == name)["closed"]
+            files.append((f, closed))
+            if closed:
+                del self.handles[name]
+        return {"next_seq": self.next_seq, "segments": [dict(s) for s in self.segments]}, files
+
+    def persist(self, index: dict, files: List[Tuple[io.BufferedWriter, bool]]):
+        """
+        The rest of sync, which may run on another thread while records are written: makes the staged files durable
+        and publishes the staged index. Calls must be made in the order of the stage() calls they complete.
+        """
+        for f, closed in files:
+            os.fsync(f.fileno())
+            if closed:
+                f.close()
+        self.publish(index)
+
+    def publish(self, index: dict = None):
+        if index is None:
+            index = {"next_seq": self.next_seq, "segments": self.segments}
+        index_path = os.path.join(self.path, INDEX_FILE)
+        tmp_path = "{}.{}.tmp".format(index_path, os.getpid())
+        with open(tmp_path, "w") as f:
+            json.dump(index, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, index_path)
+
+    def compact(self, records: Iterable[dict]):
+        """
+        Replaces the contents of the directory with records in place. They are written to new segments which are
+        published in one index update, after which the old segments are removed; until then readers and a restarted
+        writer only see the old ones. records may be read from this directory as long as they are all read before the
+        first one is produced, e.g. by an external sort.
+        """
+        self.sync()
+        old = self.segments
+        for f in self.handles.values():
+            f.close()
+        self.handles, self.segments = {}, []
+        self.write(records)
+        self.sync()
+        for segment in old:
+            os.remove(os.path.join(self.path, segment["name"]))
+
+    def close(self):
+        self.sync()
+        for f in self.handles.values():
+            f.close()
+        self.handles = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,103 @@
+from typing import Dict, List
+
+from collections import deque
+
+# Stance codes as stored on tweets and used by the dashboard: neutral, pro-Israel and pro-Palestine
+STANCES = ["n", "i", "p"]
+
+
+def batch_queries(tags: List[str], max_length: int) -> List[str]:
+    """
+    Packs the tags into as few "a OR b OR ..." queries of at most max_length characters as it can, in order. A tag that
+    is longer on its own gets a query of its own.
+    """
+    queries = []
+    batch = []
+    for tag in tags:
+        if len(batch) > 0 and len(" OR ".join(batch + [tag])) > max_length:
+            queries.append(" OR ".join(batch))
+            batch = []
+        batch.append(tag)
+    if len(batch) > 0:
+        queries.append(" OR ".join(batch))
+    return queries
+
+
+def is_word_char(c: str) -> bool:
+    return c.isalnum() or c == "_"
+
+
+class TagMatcher:
+    """
+    Finds which of a set of tags a text contains as whole words, ignoring case, the way the search matches keywords
+    (so "israel" matches "#Israel" but not "#IsraelUnderAttack"). All tags are found in a single pass over the text
+    with an Aho-Corasick automaton: a trie of the tags whose states also link to the longest proper suffix that is a
+    trie state, so that a mismatch falls back without rescanning.
+    """
+
+    def __init__(self, stances: Dict[str, List[str]]):
+        self.stances = {tag.lower(): list(s) for tag, s in stances.items()}
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+        for tag in self.stances.keys():
+            state = 0
+            for c in tag:
+                if c not in self.goto[state].keys():
+                    self.goto[state][c] = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                state = self.goto[state][c]
+            self.out[state].append(tag)
+        # Breadth first, so that the failure state of every state is final before its children are linked
+        queue = deque(self.goto[0].values())
+        while len(queue) > 0:
+            state = queue.popleft()
+            for c, child in self.goto[state].items():
+                queue.append(child)
+                f = self.fail[state]
+                while f != 0 and c not in self.goto[f].keys():
+                    f = self.fail[f]
+                self.fail[child] = self.goto[f].get(c, 0)
+                self.out[child] = self.out[child] + self.out[self.fail[child]]
+
+    @staticmethod
+    def of_files(files: Dict[str, str]) -> 'TagMatcher':
+        """
+        Builds a matcher from tag files, one tag per line, given by stance code.
+        """
+        stances = {}
+        for stance, f_name in files.items():
+            with open(f_name, "r") as f:
+                for tag in f.read().splitlines():
+                    if tag.strip() and stance not in stances.setdefault(tag.strip(), []):
+                        stances[tag.strip()].append(stance)
+        return TagMatcher(stances)
+
+    def match(self, text: str) -> List[str]:
+        """
+        The tags in the text, in the order they first occur.
+        """
+        text = text.lower()
+        found = []
+        state = 0
+        for i, c in enumerate(text):
+            while state != 0 and c not in self.goto[state].keys():
+                state = self.fail[state]
+            state = self.goto[state].get(c, 0)
+            for tag in self.out[state]:
+                start = i - len(tag) + 1
+                if (start == 0 or not is_word_char(text[start - 1])) and \
+                        (i + 1 == len(text) or not is_word_char(text[i + 1])) and tag not in found:
+                    found.append(tag)
+        return found
+
+    def annotate(self, tweet: dict) -> dict:
+        """
+        Stores the tags the tweet's text matches and their stances on the tweet.
+        """
+        tweet["tags"] = self.match(tweet.get("text", ""))
+        stances = set(s for tag in tweet["tags"] for s in self.stances[tag])
+        tweet["stances"] = [s for s in STANCES if s in stances]
+        return tweet
@@ -1,6 +1,100 @@
+from typing import Optional
+
+import gzip
+import hashlib
+import json
+
+import flask
+import plotly
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 from app import app
 
 server = app.server
 
+
+def serialize_layout():
+    """
+    Serializes the layout once and keeps an identity, gzip and (if available) brotli variant of it in memory, each
+    with its own strong ETag.
+    """
+    body = json.dumps(app.layout, cls=plotly.utils.PlotlyJSONEncoder).encode("utf-8")
+    digest = hashlib.sha256(body).hexdigest()[:32]
+    variants = {"identity": (digest, body), "gzip": ("{}-gz".format(digest), gzip.compress(body, 9))}
+    if brotli is not None:
+        variants["br"] = ("{}-br".format(digest), brotli.compress(body, quality=11))
+    return variants
+
+
+layout_variants = serialize_layout()
+
+
+# Variants in order of preference between equal q-values
+PREFERENCE = ["br", "gzip", "identity"]
+
+
+def choose_encoding(accept_encodings) -> Optional[str]:
+    """
+    Picks the layout variant the client accepts with the highest q-value, or None if it accepts none of them. Encodings
+    not listed take the q-value of "*" if given, and identity stays acceptable unless it, or "*" while it is not
+    listed, has q=0 (RFC 7231, section 5.3.4).
+    """
+    listed = {value.lower(): q for value, q in accept_encodings}
+
+    def quality(e: str) -> float:
+        if e in listed.keys():
+            return listed[e]
+        if "*" in listed.keys():
+            return listed["*"]
+        return 1 if e == "identity" else 0
+
+    q, encoding = max(((quality(e), e) for e in PREFERENCE if e in layout_variants.keys()),
+                      key=lambda x: (x[0], -PREFERENCE.index(x[1])))
+    return encoding if q > 0 else None
+
+
+def layout_response(request: flask.Request) -> flask.Response:
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        response = flask.Response("None of the encodings of the layout is acceptable", status=406)
+        response.headers["Vary"] = "Accept-Encoding"
+        return response
+    etag, body = layout_variants[encoding]
+
+    if request.if_none_match.contains(etag):
+        response = flask.Response(status=304)
+    else:
+        response = flask.Response(body, mimetype="application/json")
+        if encoding != "identity":
+            response.headers["Content-Encoding"] = encoding
+    response.set_etag(etag)
+    response.headers["Vary"] = "Accept-Encoding"
+    # Browsers keep the layout but revalidate it on every load, which costs a 304 while the data is unchanged
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+def serve_cached_layout(wsgi_app):
+    """
+    Answers layout requests from the pre-serialized variants before they reach Flask, whose response compression
+    would otherwise encode the identity variant again under its own ETag, and passes every other request on.
+    """
+    path = "{}_dash-layout".format(app.config.routes_pathname_prefix)
+
+    def middleware(environ, start_response):
+        if environ.get("PATH_INFO") != path:
+            return wsgi_app(environ, start_response)
+        return layout_response(flask.Request(environ))(environ, start_response)
+
+    return middleware
+
+
+server.wsgi_app = serve_cached_layout(server.wsgi_app)
+
+
 if __name__ == "__main__":
     app.run()